@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Offline throughput benchmark for batch caption generation.
+
+Runs BatchCaptionGenerator against StubCaptionLLM (no network, no API key) at
+several concurrency limits and reports captions/sec and latency percentiles.
+
+    pip install -e wakamate_common -e wakamate_ai_caption
+    python benchmarks/caption_batch_throughput.py --products 40 --latency 0.5
+"""
+
+import argparse
+import asyncio
+import logging
+import statistics
+import time
+
+from wakamate_ai_caption.batch_captions import BatchCaptionGenerator, StubCaptionLLM
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def run(concurrency: int, products: list, platforms: list, args) -> dict:
+    llm = StubCaptionLLM(latency=args.latency, jitter=args.latency * 0.2,
+                         failure_rate=args.failure_rate, seed=42)
+    batcher = BatchCaptionGenerator(llm, concurrency=concurrency, max_retries=2, retry_backoff=0.05)
+
+    start = time.perf_counter()
+    first_result = None
+    results = []
+    async for result in batcher.stream(products, platforms):
+        if first_result is None:
+            first_result = time.perf_counter() - start
+        results.append(result)
+    wall = time.perf_counter() - start
+
+    return {
+        "concurrency": concurrency,
+        "jobs": len(results),
+        "failed": sum(1 for r in results if not r.ok),
+        "llm_calls": llm.calls,
+        "wall_s": wall,
+        "captions_per_s": len(results) / wall,
+        "first_result_s": first_result or 0.0,
+        "p50_s": statistics.median(r.elapsed for r in results),
+        "p99_s": _percentile([r.elapsed for r in results], 99),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=40)
+    parser.add_argument("--platforms", default="instagram,facebook")
+    parser.add_argument("--latency", type=float, default=0.5, help="Simulated seconds per LLM call")
+    parser.add_argument("--failure-rate", type=float, default=0.05)
+    parser.add_argument("--concurrency", default="1,2,4,8,16")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+
+    products = [{"_id": str(i), "name": f"Product {i}", "sellingPrice": 10 + i} for i in range(args.products)]
+    platforms = args.platforms.split(",")
+
+    print(f"{'conc':>5} {'jobs':>5} {'fail':>5} {'calls':>6} {'wall s':>8} {'cap/s':>8} {'first s':>8} {'p50 s':>7} {'p99 s':>7}")
+    for concurrency in (int(c) for c in args.concurrency.split(",")):
+        r = asyncio.run(run(concurrency, products, platforms, args))
+        print(f"{r['concurrency']:>5} {r['jobs']:>5} {r['failed']:>5} {r['llm_calls']:>6} {r['wall_s']:>8.2f} "
+              f"{r['captions_per_s']:>8.1f} {r['first_result_s']:>8.2f} {r['p50_s']:>7.2f} {r['p99_s']:>7.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,21 @@
 #!/usr/bin/env python3
 """
-Simple CORS proxy server to test your delivery agent
-Run this on port 3001 to proxy requests to your agent on port 8000
+The original Flask CORS proxy, kept unchanged as the baseline for
+benchmarks/proxy_benchmark.py. Production uses the async cors_proxy.py.
+
+    python benchmarks/flask_cors_proxy.py --port 3001 --upstream http://localhost:8000
 """
 
 from flask import Flask, request, jsonify, Response
 from flask_cors import CORS
 import requests
 import json
+import argparse
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
 
-AGENT_BASE_URL = "http://localhost:6000"
+AGENT_BASE_URL = "http://localhost:8000"
 
 @app.route('/api/<path:path>', methods=['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS'])
 def proxy(path):
@@ -58,8 +61,15 @@ def test():
     return jsonify({"status": "CORS proxy server is running", "agent_url": AGENT_BASE_URL})
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=3001)
+    parser.add_argument("--upstream", default=AGENT_BASE_URL)
+    parser.add_argument("--debug", action="store_true", help="Run as the old proxies did, with the debugger and reloader")
+    args = parser.parse_args()
+    AGENT_BASE_URL = args.upstream
+    
     print(f"🚀 CORS Proxy Server starting...")
-    print(f"📡 Proxying requests from http://localhost:3002/api/* to {AGENT_BASE_URL}/*")
-    print(f"🔧 Test the proxy: http://localhost:3002/test")
+    print(f"📡 Proxying requests from http://localhost:{args.port}/api/* to {AGENT_BASE_URL}/*")
+    print(f"🔧 Test the proxy: http://localhost:{args.port}/test")
     
-    app.run(host='0.0.0.0', port=3002, debug=True)
+    app.run(host='0.0.0.0', port=args.port, debug=args.debug)
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Greedy tour construction on the route spatial index.
+
+Scatters stops over Lagos (uniform plus a few dense markets), then times
+building the grid index, a full nearest-neighbour tour that deletes each stop
+as it is visited, and the 2-opt candidate lists. With --brute the same tour
+is also built by scanning every unvisited stop, as the optimizer used to.
+
+    pip install -e wakamate_common -e wakamate_deliver_route
+    python benchmarks/greedy_tour.py
+    python benchmarks/greedy_tour.py --stops 5000 --brute --check
+"""
+
+import argparse
+import random
+import sys
+import time
+
+from wakamate_deliver_route.spatial_index import SpatialIndex, candidate_lists, greedy_tour
+
+# Seconds allowed for a 5000-stop greedy tour
+TARGET_SECONDS = 1.0
+
+# Rough Lagos bounding box and a few dense delivery areas (lat, lon)
+BBOX = ((6.40, 6.65), (3.25, 3.55))
+HOTSPOTS = ((6.6018, 3.3515), (6.5095, 3.3711), (6.4474, 3.4723), (6.4541, 3.3947))
+
+
+def scatter(n: int, seed: int):
+    rng = random.Random(seed)
+    points = []
+    for i in range(n):
+        if i % 3 == 0:
+            lat, lon = rng.choice(HOTSPOTS)
+            points.append((rng.gauss(lat, 0.004), rng.gauss(lon, 0.004)))
+        else:
+            points.append((rng.uniform(*BBOX[0]), rng.uniform(*BBOX[1])))
+    return points
+
+
+def brute_tour(points):
+    index = SpatialIndex(points)  # only for its distance()
+    unvisited = set(range(1, len(points)))
+    tour = [0]
+    while unvisited:
+        nearest = min(unvisited, key=lambda j: index.distance(tour[-1], j))
+        unvisited.remove(nearest)
+        tour.append(nearest)
+    return tour
+
+
+def timed(fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stops", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--k", type=int, default=10, help="Candidate list length")
+    parser.add_argument("--brute", action="store_true", help="Also time the O(n²) scan and compare tours")
+    parser.add_argument("--check", action="store_true", help="Exit non-zero when the tour misses its target")
+    args = parser.parse_args()
+
+    points = scatter(args.stops, args.seed)
+    _, build_s = timed(SpatialIndex, points)
+    tour, tour_s = timed(greedy_tour, points)
+    _, cand_s = timed(candidate_lists, points, args.k)
+
+    print(f"{args.stops} stops")
+    print(f"  index build      {build_s * 1000:8.1f} ms")
+    print(f"  greedy tour      {tour_s * 1000:8.1f} ms  (target {TARGET_SECONDS:.1f}s)")
+    print(f"  candidate lists  {cand_s * 1000:8.1f} ms  (k={args.k})")
+    if args.brute:
+        brute, brute_s = timed(brute_tour, points)
+        print(f"  brute-force tour {brute_s * 1000:8.1f} ms  ({brute_s / tour_s:.0f}x slower, "
+              f"{'same tour' if brute == tour else 'different tour'})")
+
+    if args.check and tour_s > TARGET_SECONDS:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
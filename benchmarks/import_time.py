@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Cold-start import profile for the three workflow packages.
+
+Imports each package's register module in a fresh interpreter with
+`-X importtime`, repeats a few times and keeps the fastest run, then prints
+the cumulative import time, the packages it spends that time in, and whether the
+package stays within its cold-start target. Modules listed in DEFERRED must
+not be imported at registration time; they are loaded on first use.
+
+    pip install -e wakamate_common -e wakamate_inventory_summary -e wakamate_ai_caption -e wakamate_deliver_route
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --repeat 5 --top 15 --check
+"""
+
+import argparse
+import re
+import subprocess
+import sys
+from dataclasses import dataclass, field
+from typing import Dict, Tuple
+
+# Cold-start budget per package in seconds, measured on the register module
+# (which is what `aiq` imports for every configured workflow)
+TARGETS: Dict[str, float] = {
+    "wakamate_inventory_summary": 1.5,
+    "wakamate_ai_caption": 1.2,
+    "wakamate_deliver_route": 1.5,
+}
+
+# Heavy dependencies that registration must not pull in
+DEFERRED: Dict[str, Tuple[str, ...]] = {
+    "wakamate_inventory_summary": ("pandas",),
+    "wakamate_ai_caption": ("pandas", "numpy"),
+    "wakamate_deliver_route": ("pandas", "numpy", "geopy", "faiss", "fastapi", "pypdf",
+                               "langchain_community", "langchain_nvidia_ai_endpoints",
+                               "langchain.agents", "langchain.hub"),
+}
+
+LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+@dataclass
+class ImportProfile:
+    package: str
+    total_us: int = 0
+    modules: Dict[str, int] = field(default_factory=dict)
+    by_package: Dict[str, int] = field(default_factory=dict)
+    error: str = ""
+
+
+def profile(package: str) -> ImportProfile:
+    """One cold import of <package>.register"""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {package}.register"],
+                          capture_output=True, text=True)
+    result = ImportProfile(package)
+    if proc.returncode != 0:
+        result.error = proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "import failed"
+        return result
+    for line in proc.stderr.splitlines():
+        match = LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative, name = int(match.group(1)), int(match.group(2)), match.group(4)
+        result.modules[name] = cumulative
+        root = name.split(".")[0]
+        result.by_package[root] = result.by_package.get(root, 0) + self_us
+    # Interpreter startup (site, encodings) is excluded; only the workflow import counts
+    result.total_us = result.modules.get(f"{package}.register", 0)
+    return result
+
+
+def best_of(package: str, repeat: int) -> ImportProfile:
+    runs = [profile(package) for _ in range(repeat)]
+    ok = [run for run in runs if not run.error]
+    return min(ok, key=lambda run: run.total_us) if ok else runs[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--packages", default=",".join(TARGETS))
+    parser.add_argument("--repeat", type=int, default=3, help="Fresh interpreters per package; the fastest is kept")
+    parser.add_argument("--top", type=int, default=10, help="Heaviest distributions to list")
+    parser.add_argument("--check", action="store_true", help="Exit non-zero when a target or deferral is missed")
+    args = parser.parse_args()
+
+    failed = False
+    for package in args.packages.split(","):
+        result = best_of(package, args.repeat)
+        if result.error:
+            print(f"{package}: {result.error}")
+            failed = True
+            continue
+
+        target = TARGETS.get(package)
+        seconds = result.total_us / 1e6
+        status = "ok" if target is None or seconds <= target else "OVER TARGET"
+        print(f"\n{package}: {seconds:.3f}s cold import (target {target}s) {status}")
+        for name, self_us in sorted(result.by_package.items(), key=lambda item: -item[1])[:args.top]:
+            print(f"  {self_us / 1000:>9.1f} ms  {name}")
+
+        eager = [name for name in DEFERRED.get(package, ()) if name in result.modules]
+        if eager:
+            print(f"  imported at registration but should be deferred: {', '.join(eager)}")
+        failed |= status != "ok" or bool(eager)
+
+    if args.check and failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Compare the async cors_proxy.py with the original Flask proxy.
+
+Starts a fake agent upstream (fixed latency, markdown response of a given
+size), then each proxy in its own process, and drives both with the same
+concurrent POST load. Reports requests/sec, latency percentiles and time to
+first byte; "direct" hits the upstream without a proxy for reference. With
+--chunks the upstream streams its body over the latency window, the way a
+streaming agent endpoint does.
+
+    pip install aiohttp uvicorn starlette flask flask-cors requests
+    python benchmarks/proxy_benchmark.py --requests 2000 --concurrency 64
+    python benchmarks/proxy_benchmark.py --latency 2 --chunks 20
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+import aiohttp
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def serve_upstream(port: int, latency: float, size: int, chunks: int):
+    """Fake agent: answers any path with `size` bytes of markdown after `latency` seconds"""
+    import uvicorn
+    from starlette.applications import Starlette
+    from starlette.responses import Response, StreamingResponse
+    from starlette.routing import Route
+
+    line = "🚚 **Stop 1:** Ikeja GRA → Allen Avenue, 4.2 km, ~18 min in moderate traffic\n"
+    text = (line * (size // len(line.encode()) + 1))[:size]
+    body = json.dumps({"value": text}).encode()
+    step = len(body) // max(chunks, 1) + 1
+
+    async def stream_body():
+        for offset in range(0, len(body), step):
+            await asyncio.sleep(latency / chunks)
+            yield body[offset:offset + step]
+
+    async def agent(request):
+        await request.body()
+        if chunks > 1:
+            return StreamingResponse(stream_body(), media_type="application/json")
+        await asyncio.sleep(latency)
+        return Response(body, media_type="application/json")
+
+    app = Starlette(routes=[Route("/{path:path}", agent, methods=["GET", "POST", "PUT", "DELETE"])])
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="error")
+
+
+def _wait_ready(url: str, timeout: float = 20.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(url, timeout=1.0).read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up")
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def load(url: str, total: int, concurrency: int) -> dict:
+    latencies = []
+    first_bytes = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+    connector = aiohttp.TCPConnector(limit=concurrency)
+
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=60)) as client:
+        async def one(i: int):
+            nonlocal errors
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    async with client.post(url, json={"input_message": f"optimize route {i}"}) as resp:
+                        await resp.content.readany()
+                        first_bytes.append(time.perf_counter() - start)
+                        await resp.read()
+                        if resp.status != 200:
+                            errors += 1
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    errors += 1
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(total)))
+        wall = time.perf_counter() - start
+
+    return {
+        "req_per_s": total / wall,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": _percentile(latencies, 99) * 1000,
+        "ttfb_ms": statistics.median(first_bytes) * 1000 if first_bytes else 0.0,
+        "errors": errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--latency", type=float, default=0.05, help="Upstream seconds per request")
+    parser.add_argument("--size", type=int, default=20000, help="Upstream response bytes")
+    parser.add_argument("--chunks", type=int, default=1, help="Stream the upstream body in this many chunks")
+    parser.add_argument("--serve-upstream", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve_upstream:
+        serve_upstream(args.serve_upstream, args.latency, args.size, args.chunks)
+        return
+
+    upstream_port, flask_port, async_port = _free_port(), _free_port(), _free_port()
+    upstream_url = f"http://127.0.0.1:{upstream_port}"
+    procs = [subprocess.Popen([sys.executable, __file__, "--serve-upstream", str(upstream_port),
+                               "--latency", str(args.latency), "--size", str(args.size),
+                               "--chunks", str(args.chunks)])]
+    try:
+        _wait_ready(upstream_url)
+        proxies = {
+            "direct": None,
+            "flask": [sys.executable, os.path.join(ROOT, "benchmarks", "flask_cors_proxy.py"),
+                      "--port", str(flask_port), "--upstream", upstream_url],
+            "async": [sys.executable, os.path.join(ROOT, "cors_proxy.py"),
+                      "--routes", f"{async_port}={upstream_url}"],
+        }
+        urls = {
+            "direct": f"{upstream_url}/generate",
+            "flask": f"http://127.0.0.1:{flask_port}/api/generate",
+            "async": f"http://127.0.0.1:{async_port}/api/generate",
+        }
+
+        print(f"upstream latency {args.latency * 1000:.0f} ms, body {args.size} bytes, "
+              f"{args.requests} requests at concurrency {args.concurrency}")
+        print(f"{'proxy':>6} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'ttfb ms':>8} {'errors':>7}")
+        for name, cmd in proxies.items():
+            if cmd:
+                proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                procs.append(proc)
+                _wait_ready(urls[name].replace("/api/generate", "/test"))
+            r = asyncio.run(load(urls[name], args.requests, args.concurrency))
+            print(f"{name:>6} {r['req_per_s']:>8.1f} {r['p50_ms']:>8.1f} {r['p99_ms']:>8.1f} "
+                  f"{r['ttfb_ms']:>8.1f} {r['errors']:>7}")
+            if cmd:
+                proc.terminate()
+    finally:
+        for proc in procs:
+            proc.terminate()
+            proc.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Seeded end-to-end solves of the route optimizer.
+
+Scatters stops over Lagos, solves them with a fixed seed and departure time,
+and prints the time, distance, optimality gap and result fingerprint of each
+size. Equal fingerprints mean bit-identical tours, so --expect catches any
+change in solver output (bump fingerprint.SOLVER_VERSION when one is meant).
+
+    pip install -e wakamate_common -e wakamate_deliver_route
+    python benchmarks/route_solver.py
+    python benchmarks/route_solver.py --sizes 50 400 --expect 50=<fingerprint>
+"""
+
+import argparse
+import random
+import sys
+import time
+from datetime import datetime
+
+from wakamate_deliver_route.wakamate_deliver_route_function import (EnhancedRouteOptimizer, Location,
+                                                                     OptimizerSettings)
+
+BBOX = ((6.40, 6.65), (3.25, 3.55))
+
+
+def manifest(n: int, seed: int):
+    rng = random.Random(seed)
+    return [
+        # Plain addresses: no district, so large manifests cluster by k-means
+        Location(name=f"Stop {i + 1}", address=f"{i + 1} Delivery Street",
+                 latitude=rng.uniform(*BBOX[0]), longitude=rng.uniform(*BBOX[1]))
+        for i in range(n)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[20, 100, 400])
+    parser.add_argument("--seed", type=int, default=7, help="Seed for the manifest and the solver")
+    parser.add_argument("--departure", default="08:30", help="HH:MM departure")
+    parser.add_argument("--expect", nargs="*", default=[], metavar="SIZE=FINGERPRINT",
+                        help="Exit non-zero when a size's fingerprint differs")
+    args = parser.parse_args()
+
+    expected = dict(item.split("=", 1) for item in args.expect)
+    settings = OptimizerSettings(solver_seed=args.seed, solver_departure=args.departure)
+    hour, minute = (int(part) for part in args.departure.split(":"))
+    departure = datetime(2026, 1, 5, hour, minute)
+
+    mismatches = 0
+    for n in args.sizes:
+        locations = manifest(n, args.seed)
+        optimizer = EnhancedRouteOptimizer(settings)
+        started = time.perf_counter()
+        _, distance, _ = optimizer.advanced_tsp_optimization(locations, departure)
+        elapsed = time.perf_counter() - started
+        solve = optimizer.last_solve
+        status = ""
+        if str(n) in expected:
+            same = expected[str(n)] == solve["fingerprint"]
+            mismatches += not same
+            status = "  ok" if same else "  CHANGED"
+        print(f"{n:6d} stops  {elapsed:7.2f}s  {distance:9.1f} km  gap {solve['quality']['gap']:6.1%}  "
+              f"{solve['fingerprint']}{status}")
+
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
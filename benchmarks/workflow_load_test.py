@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Load test for the inventory workflow's request path under concurrency.
+
+Starts a local fake Wakamate backend with a fixed per-call latency, then drives
+many concurrent turns through fetch -> prompt assembly -> simulated LLM call.
+Two modes are compared:
+
+  blocking  the old path: one shared analyzer, requests.get on the event loop
+  async     per-request analyzers, fetches in worker threads, identical
+            concurrent fetches coalesced into one backend call
+
+    pip install -e wakamate_common -e wakamate_inventory_summary
+    python benchmarks/workflow_load_test.py --requests 200 --concurrency 1,8,32,64
+    python benchmarks/workflow_load_test.py --uvloop
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from wakamate_common.prompt_budget import PromptBudgeter
+from wakamate_inventory_summary import wakamate_inventory_summary_function as workflow
+from wakamate_inventory_summary.demand_forecast import DemandForecaster
+
+
+class FakeBackend:
+    """Threaded HTTP server serving canned products after a fixed delay"""
+
+    def __init__(self, products: int, latency: float):
+        self.latency = latency
+        self.hits = 0
+        self._lock = threading.Lock()
+        self.products_body = json.dumps([
+            {"_id": str(i), "name": f"Product {i}", "category": "General", "stock": i % 40,
+             "costPrice": 5 + i % 7, "sellingPrice": 9 + i % 11, "minStock": 5, "lowStock": i % 40 < 5,
+             "unitsSold": i % 90, "sales": [{"quantity": 1 + i % 3, "date": f"2025-01-{1 + i % 28:02d}"}]}
+            for i in range(products)
+        ]).encode()
+        backend = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with backend._lock:
+                    backend.hits += 1
+                time.sleep(backend.latency)
+                body = backend.products_body if self.path.endswith("getAll") else b"{}"
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def run(mode: str, concurrency: int, args, backend: FakeBackend) -> dict:
+    forecaster = DemandForecaster()
+    shared = workflow.InventoryAnalyzer(forecaster=forecaster)
+    budgeter = PromptBudgeter(max_tokens=1500, workflow="load_test")
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def turn(i: int):
+        async with semaphore:
+            start = time.perf_counter()
+            if mode == "blocking":
+                analyzer = shared
+                analyzer.fetch_all_data()
+            else:
+                analyzer = workflow.InventoryAnalyzer(forecaster=forecaster)
+                await analyzer.fetch_all_data_async()
+            intents = workflow.classify_question("what should I restock?")
+            budgeter.assemble(f"Current Request: turn {i}", analyzer.get_prompt_sections(intents))
+            await asyncio.sleep(args.llm_latency)
+            latencies.append(time.perf_counter() - start)
+
+    hits_before = backend.hits
+    start = time.perf_counter()
+    await asyncio.gather(*(turn(i) for i in range(args.requests)))
+    wall = time.perf_counter() - start
+    return {
+        "mode": mode,
+        "concurrency": concurrency,
+        "wall_s": wall,
+        "req_per_s": args.requests / wall,
+        "p50_s": statistics.median(latencies),
+        "p99_s": _percentile(latencies, 99),
+        "backend_calls": backend.hits - hits_before,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--products", type=int, default=200)
+    parser.add_argument("--backend-latency", type=float, default=0.05, help="Seconds per backend call")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="Simulated seconds per LLM call")
+    parser.add_argument("--concurrency", default="1,8,32,64")
+    parser.add_argument("--modes", default="blocking,async")
+    parser.add_argument("--uvloop", action="store_true", help="Run on uvloop if installed")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+
+    if args.uvloop:
+        try:
+            import uvloop
+            asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+        except ImportError:
+            print("uvloop not installed; using the default event loop")
+
+    backend = FakeBackend(args.products, args.backend_latency)
+    workflow.API_BASE_URL = backend.url
+    workflow.set_global_auth_token("load-test")
+
+    print(f"{'mode':>9} {'conc':>5} {'wall s':>8} {'req/s':>8} {'p50 s':>7} {'p99 s':>7} {'backend':>8}")
+    try:
+        for mode in args.modes.split(","):
+            for concurrency in (int(c) for c in args.concurrency.split(",")):
+                r = asyncio.run(run(mode, concurrency, args, backend))
+                print(f"{r['mode']:>9} {r['concurrency']:>5} {r['wall_s']:>8.2f} {r['req_per_s']:>8.1f} "
+                      f"{r['p50_s']:>7.3f} {r['p99_s']:>7.3f} {r['backend_calls']:>8}")
+    finally:
+        backend.close()
+
+
+if __name__ == "__main__":
+    main()
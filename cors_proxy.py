@@ -1,65 +1,487 @@
 #!/usr/bin/env python3
 """
-Simple CORS proxy server to test your delivery agent
-Run this on port 3001 to proxy requests to your agent on port 8000
+Async CORS proxy for the Wakamate agents.
+
+One process listens on every port in the routing table and forwards
+/api/<path> to <upstream>/<path>:
+
+    3001 -> http://localhost:8000
+    3002 -> http://localhost:6000
+    3003 -> http://localhost:5000
+
+Request and response bodies are streamed chunk by chunk, upstream connections
+are pooled and kept alive, and the client's HTTP method is forwarded as-is.
+Hop-by-hop headers are dropped in both directions, text responses above
+COMPRESS_MIN_SIZE are compressed with brotli (if installed) or gzip, and GET
+responses carry an ETag so clients can revalidate. Responses the upstream
+marks as shared-cacheable (public, max-age or s-maxage, never private) are
+kept in a small in-memory cache and answered (or 304'd) without touching the
+agent until they expire or any write to the same upstream purges them.
+
+    python cors_proxy.py
+    python cors_proxy.py --routes 3001=http://localhost:8000,3002=http://localhost:6000
 """
 
-from flask import Flask, request, jsonify, Response
-from flask_cors import CORS
-import requests
-import json
-
-app = Flask(__name__)
-CORS(app)  # Enable CORS for all routes
-
-AGENT_BASE_URL = "http://localhost:8000"
-
-@app.route('/api/<path:path>', methods=['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS'])
-def proxy(path):
-    """Proxy requests to your delivery agent"""
-    
-    if request.method == 'OPTIONS':
-        # Handle preflight requests
-        response = Response()
-        response.headers['Access-Control-Allow-Origin'] = '*'
-        response.headers['Access-Control-Allow-Methods'] = 'GET, POST, PUT, DELETE, OPTIONS'
-        response.headers['Access-Control-Allow-Headers'] = '*'
-        return response
-    
-    url = f"{AGENT_BASE_URL}/{path}"
-    
-    try:
-        # Forward the request to your agent
-        if request.method == 'GET':
-            resp = requests.get(url, params=request.args)
+import argparse
+import asyncio
+import contextlib
+import hashlib
+import logging
+import re
+import time
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+import aiohttp
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger("cors_proxy")
+
+# Listen port -> agent base URL
+ROUTES: Dict[int, str] = {
+    3001: "http://localhost:8000",
+    3002: "http://localhost:6000",
+    3003: "http://localhost:5000",
+}
+
+CORS_HEADERS = {
+    "Access-Control-Allow-Origin": "*",
+    "Access-Control-Allow-Methods": "GET, POST, PUT, PATCH, DELETE, OPTIONS",
+    "Access-Control-Allow-Headers": "*",
+    "Access-Control-Expose-Headers": "ETag, Content-Encoding",
+}
+
+# RFC 7230 hop-by-hop headers; any header named in Connection is dropped as well
+HOP_BY_HOP_HEADERS = {
+    "connection", "keep-alive", "proxy-authenticate", "proxy-authorization",
+    "te", "trailer", "transfer-encoding", "upgrade",
+}
+# The proxy negotiates encoding with the client itself and asks upstreams for identity
+# (aiohttp's default Accept-Encoding is skipped on the session as well)
+SKIP_REQUEST_HEADERS = HOP_BY_HOP_HEADERS | {"host", "accept-encoding"}
+
+# Agent turns can run for minutes; only connecting should fail fast
+UPSTREAM_TIMEOUT = aiohttp.ClientTimeout(total=None, sock_connect=5.0, sock_read=300.0)
+UPSTREAM_MAX_CONNECTIONS = 200
+UPSTREAM_KEEPALIVE_SECONDS = 30.0
+
+# Compression
+COMPRESS_MIN_SIZE = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+COMPRESSIBLE_TYPES = re.compile(r"^(text/(?!event-stream)|application/(json|javascript|xml|[\w.+-]+\+(json|xml)))")
+
+# GET response cache
+CACHE_MAX_ENTRIES = 256
+CACHE_MAX_BODY = 1024 * 1024
+# Lifetime of a `public` response that gives no max-age/s-maxage
+CACHE_DEFAULT_TTL = 5.0
+
+
+def strip_hop_by_hop(headers: Iterable[Tuple[str, str]], extra: Iterable[str] = ()) -> List[Tuple[str, str]]:
+    """End-to-end headers only, preserving repeated headers such as Set-Cookie"""
+    headers = list(headers)
+    skip = set(HOP_BY_HOP_HEADERS) | set(extra)
+    for name, value in headers:
+        if name.lower() == "connection":
+            skip.update(token.strip().lower() for token in value.split(","))
+    return [(name, value) for name, value in headers if name.lower() not in skip]
+
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """Pick br or gzip from an Accept-Encoding header, honouring q=0"""
+    accepted = {}
+    for item in accept_encoding.lower().split(","):
+        name, _, params = item.strip().partition(";")
+        q = 1.0
+        match = re.search(r"q=([0-9.]+)", params)
+        if match:
+            q = float(match.group(1))
+        accepted[name.strip()] = q
+    for encoding in (("br", "gzip") if brotli else ("gzip",)):
+        if accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+
+def _header(headers: List[Tuple[str, str]], name: str) -> Optional[str]:
+    name = name.lower()
+    return next((value for key, value in headers if key.lower() == name), None)
+
+
+def _cache_control(headers: List[Tuple[str, str]]) -> Dict[str, Optional[str]]:
+    directives = {}
+    for item in (_header(headers, "cache-control") or "").split(","):
+        key, _, value = item.strip().partition("=")
+        if key:
+            directives[key.lower()] = value.strip('"') or None
+    return directives
+
+
+def _content_length(headers: List[Tuple[str, str]]) -> Optional[int]:
+    """Declared body size, or None when absent or malformed (the body is then streamed)"""
+    value = _header(headers, "content-length")
+    if value is None or not value.strip().isdigit():
+        return None
+    return int(value)
+
+
+def shared_ttl(headers: List[Tuple[str, str]]) -> Optional[float]:
+    """
+    Seconds a response may be served from the shared cache, or None. Only
+    responses the upstream explicitly allows a shared cache to keep qualify:
+    `public`, `max-age` or `s-maxage`, without private/no-store/no-cache and
+    without Set-Cookie.
+    """
+    directives = _cache_control(headers)
+    if {"private", "no-store", "no-cache"} & directives.keys() or _header(headers, "set-cookie"):
+        return None
+    for name in ("s-maxage", "max-age"):
+        if name in directives:
+            try:
+                ttl = float(directives[name] or "")
+            except ValueError:
+                return None
+            return ttl if ttl > 0 else None
+    return CACHE_DEFAULT_TTL if "public" in directives else None
+
+
+def is_compressible(headers: List[Tuple[str, str]]) -> bool:
+    return (_header(headers, "content-encoding") is None
+            and bool(COMPRESSIBLE_TYPES.match((_header(headers, "content-type") or "").lower())))
+
+
+class StreamEncoder:
+    """Incremental gzip/brotli encoder; every chunk is flushed so streamed replies stay live"""
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=BROTLI_QUALITY)
         else:
-            resp = requests.post(url, 
-                               json=request.get_json() if request.is_json else None,
-                               data=request.get_data() if not request.is_json else None,
-                               headers={'Content-Type': 'application/json'})
-        
-        # Return the response
-        response = Response(
-            resp.content,
-            status=resp.status_code,
-            headers=dict(resp.headers)
-        )
-        
-        # Add CORS headers
-        response.headers['Access-Control-Allow-Origin'] = '*'
-        return response
-        
-    except Exception as e:
-        return jsonify({"error": f"Proxy error: {str(e)}"}), 500
-
-@app.route('/test')
-def test():
-    """Test endpoint"""
-    return jsonify({"status": "CORS proxy server is running", "agent_url": AGENT_BASE_URL})
-
-if __name__ == '__main__':
+            self._gzip = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._brotli.process(data) + self._brotli.flush()
+        return self._gzip.compress(data) + self._gzip.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self._brotli.finish()
+        return self._gzip.flush()
+
+
+def compress_body(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    encoder = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+    return encoder.compress(body) + encoder.flush()
+
+
+@dataclass
+class CachedResponse:
+    """A complete GET response, with its encoded variants built on first use"""
+    status: int
+    headers: List[Tuple[str, str]]
+    body: bytes
+    etag: str
+    created: float
+    expires: float
+    encoded: Dict[str, bytes] = field(default_factory=dict)
+
+    @property
+    def fresh(self) -> bool:
+        return time.monotonic() < self.expires
+
+    def variant(self, encoding: Optional[str]) -> Tuple[Optional[str], bytes, str]:
+        """(content-encoding, body, etag) for the client's negotiated encoding"""
+        if not encoding or len(self.body) < COMPRESS_MIN_SIZE or not is_compressible(self.headers):
+            return None, self.body, self.etag
+        if encoding not in self.encoded:
+            self.encoded[encoding] = compress_body(self.body, encoding)
+        # Encoded bytes differ, so the validator must too
+        return encoding, self.encoded[encoding], f'{self.etag[:-1]}-{encoding}"'
+
+
+class ResponseCache:
+    """
+    Small LRU of complete GET responses, keyed by upstream, URL and
+    credentials. Requests carrying cookies are never cached, and any
+    non-GET request purges its upstream's entries.
+    """
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str, str], CachedResponse]" = OrderedDict()
+
+    @staticmethod
+    def key(base_url: str, request: Request) -> Optional[Tuple[str, str, str]]:
+        """Cache key for a GET, or None when the request must not be cached (it carries cookies)"""
+        if request.method != "GET" or "cookie" in request.headers:
+            return None
+        auth = request.headers.get("authorization", "")
+        return base_url, f"{request.url.path}?{request.url.query}", hashlib.sha256(auth.encode()).hexdigest()[:16]
+
+    def get(self, key) -> Optional[CachedResponse]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if not entry.fresh:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key, entry: CachedResponse):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def purge(self, base_url: str):
+        """Drop every entry of an upstream: a write may change any of its resources (a list as well as an item)"""
+        for key in [key for key in self._entries if key[0] == base_url]:
+            del self._entries[key]
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison, as RFC 7232 requires for If-None-Match
+    bare = etag[2:] if etag.startswith("W/") else etag
+    return any((tag.strip()[2:] if tag.strip().startswith("W/") else tag.strip()) == bare
+               for tag in if_none_match.split(","))
+
+
+def _build_response(status: int, headers: List[Tuple[str, str]], body: bytes = b"",
+                    stream: Optional[AsyncIterator[bytes]] = None) -> Response:
+    if stream is not None:
+        response = StreamingResponse(stream, status_code=status)
+    else:
+        response = Response(body, status_code=status)
+        # Response computed its own Content-Length
+        headers = [(k, v) for k, v in headers if k.lower() != "content-length"]
+    response.raw_headers.extend((k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers)
+    return response
+
+
+def cached_response(entry: CachedResponse, request: Request, encoding: Optional[str], age: bool) -> Response:
+    """200 or 304 for a complete GET response, negotiated for this client"""
+    content_encoding, body, etag = entry.variant(encoding)
+    # A body the upstream already encoded is served as-is, so it keeps its label
+    content_encoding = content_encoding or _header(entry.headers, "content-encoding")
+    headers = [(k, v) for k, v in entry.headers if k.lower() not in ("etag", "content-encoding", "content-length")]
+    headers.append(("ETag", etag))
+    if is_compressible(entry.headers):
+        headers.append(("Vary", "Accept-Encoding"))
+    if age:
+        headers.append(("Age", str(int(time.monotonic() - entry.created))))
+    headers.extend(CORS_HEADERS.items())
+
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return _build_response(304, [(k, v) for k, v in headers if k.lower() != "content-type"])
+    if content_encoding:
+        headers.append(("Content-Encoding", content_encoding))
+    return _build_response(entry.status, headers, body if request.method == "GET" else b"")
+
+
+def create_app(routes: Optional[Dict[int, str]] = None) -> Starlette:
+    """Build the proxy app; the upstream is chosen by the port a request arrived on"""
+    routes = dict(routes or ROUTES)
+    session: Optional[aiohttp.ClientSession] = None
+    cache = ResponseCache()
+
+    def upstream_for(request: Request) -> Optional[str]:
+        server = request.scope.get("server")
+        port = server[1] if server else None
+        if port in routes:
+            return routes[port]
+        # Single-route deployments (or unknown ports behind a load balancer)
+        return next(iter(routes.values())) if len(routes) == 1 else None
+
+    def upstream_session() -> aiohttp.ClientSession:
+        # One pooled session for every upstream; it must be created inside the running loop
+        nonlocal session
+        if session is None:
+            session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=UPSTREAM_MAX_CONNECTIONS,
+                                               keepalive_timeout=UPSTREAM_KEEPALIVE_SECONDS),
+                timeout=UPSTREAM_TIMEOUT,
+                # Otherwise aiohttp sends its own "gzip, deflate" and upstreams may answer encoded
+                skip_auto_headers=("Accept-Encoding",),
+                # Pass compressed bodies through untouched
+                auto_decompress=False,
+            )
+        return session
+
+    async def relay(upstream: aiohttp.ClientResponse, prefix: bytes = b"",
+                    encoder: Optional[StreamEncoder] = None) -> AsyncIterator[bytes]:
+        try:
+            if prefix:
+                yield encoder.compress(prefix) if encoder else prefix
+            async for chunk in upstream.content.iter_any():
+                yield encoder.compress(chunk) if encoder else chunk
+            if encoder:
+                yield encoder.finish()
+        finally:
+            # Also runs when the client disconnects mid-stream
+            upstream.release()
+
+    async def read_prefix(upstream: aiohttp.ClientResponse, limit: int) -> Tuple[bytes, bool]:
+        """Buffer up to `limit` bytes; True when that was the whole body"""
+        buffer = bytearray()
+        while len(buffer) < limit:
+            chunk = await upstream.content.readany()
+            if not chunk:
+                return bytes(buffer), True
+            buffer += chunk
+        return bytes(buffer), upstream.content.at_eof()
+
+    async def proxy(request: Request) -> Response:
+        """Proxy requests to the agent behind this port"""
+        if request.method == "OPTIONS":
+            # Handle preflight requests
+            return Response(headers=CORS_HEADERS)
+
+        base_url = upstream_for(request)
+        if base_url is None:
+            return JSONResponse({"error": f"No upstream configured for port {request.scope['server'][1]}"},
+                                status_code=404, headers=CORS_HEADERS)
+
+        encoding = negotiate_encoding(request.headers.get("accept-encoding", ""))
+        cache_key = ResponseCache.key(base_url, request)
+        writes = request.method not in ("GET", "HEAD")
+        if writes:
+            cache.purge(base_url)
+        if cache_key:
+            entry = cache.get(cache_key)
+            if entry is not None:
+                return cached_response(entry, request, encoding, age=True)
+
+        headers = strip_hop_by_hop(request.headers.items(), extra=SKIP_REQUEST_HEADERS)
+        has_body = "content-length" in request.headers or "transfer-encoding" in request.headers
+
+        try:
+            upstream = await upstream_session().request(
+                request.method,
+                f"{base_url}/{request.path_params['path']}",
+                params=request.query_params.multi_items(),
+                headers=headers,
+                data=request.stream() if has_body else None,
+                allow_redirects=False,
+            )
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.warning(f"Upstream {base_url} failed: {e!r}")
+            return JSONResponse({"error": f"Proxy error: {str(e) or type(e).__name__}"},
+                                status_code=502, headers=CORS_HEADERS)
+        if writes:
+            # Again, for GETs that were filled while the write was in flight
+            cache.purge(base_url)
+
+        response_headers = strip_hop_by_hop(upstream.headers.items())
+        prefix = b""
+
+        length = _content_length(response_headers)
+        # Only sized bodies are buffered for the cache; chunked replies keep streaming
+        if cache_key and upstream.status == 200 and length is not None and length <= CACHE_MAX_BODY:
+            prefix, complete = await read_prefix(upstream, CACHE_MAX_BODY)
+            if complete:
+                upstream.release()
+                ttl = shared_ttl(response_headers)
+                if "cache-control" not in (k.lower() for k, _ in response_headers):
+                    # Clients keep the body but revalidate, which costs a 304 instead of a download
+                    response_headers.append(("Cache-Control", "private, no-cache" if "authorization" in request.headers
+                                              else "no-cache"))
+                now = time.monotonic()
+                entry = CachedResponse(
+                    status=upstream.status,
+                    headers=response_headers,
+                    body=prefix,
+                    etag=_header(response_headers, "etag") or f'"{hashlib.blake2b(prefix, digest_size=12).hexdigest()}"',
+                    created=now,
+                    expires=now + (ttl or 0.0),
+                )
+                if ttl is not None:
+                    cache.put(cache_key, entry)
+                return cached_response(entry, request, encoding, age=False)
+
+        response_headers.extend(CORS_HEADERS.items())
+        if not (encoding and is_compressible(response_headers) and request.method != "HEAD"):
+            return _build_response(upstream.status, response_headers, stream=relay(upstream, prefix))
+
+        # Chunked replies are compressed without waiting for bytes, so streamed turns stay live
+        if length is not None and length < COMPRESS_MIN_SIZE:
+            return _build_response(upstream.status, response_headers, stream=relay(upstream, prefix))
+
+        response_headers = [(k, v) for k, v in response_headers if k.lower() != "content-length"]
+        response_headers += [("Content-Encoding", encoding), ("Vary", "Accept-Encoding")]
+        return _build_response(upstream.status, response_headers,
+                               stream=relay(upstream, prefix, StreamEncoder(encoding)))
+
+    async def test(request: Request) -> Response:
+        """Test endpoint"""
+        return JSONResponse({"status": "CORS proxy server is running", "agent_url": upstream_for(request),
+                             "routes": {str(port): url for port, url in routes.items()},
+                             "compression": ["br", "gzip"] if brotli else ["gzip"]})
+
+    @contextlib.asynccontextmanager
+    async def lifespan(app):
+        yield
+        if session is not None:
+            await session.close()
+
+    return Starlette(
+        routes=[
+            Route("/api/{path:path}", proxy, methods=["GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"]),
+            Route("/test", test),
+        ],
+        lifespan=lifespan,
+    )
+
+
+async def serve(routes: Dict[int, str], host: str = "0.0.0.0", log_level: str = "warning"):
+    """Run one uvicorn server per listen port, all sharing one app and its upstream pools"""
+    app = create_app(routes)
+    servers = [
+        uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level=log_level, lifespan="on" if i == 0 else "off"))
+        for i, port in enumerate(routes)
+    ]
+    await asyncio.gather(*(server.serve() for server in servers))
+
+
+def parse_routes(value: str) -> Dict[int, str]:
+    routes = {}
+    for item in value.split(","):
+        port, _, url = item.partition("=")
+        routes[int(port)] = url.rstrip("/")
+    return routes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--routes", type=parse_routes, default=ROUTES, help="port=url pairs, comma separated")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--log-level", default="warning")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
     print(f"🚀 CORS Proxy Server starting...")
-    print(f"📡 Proxying requests from http://localhost:3001/api/* to {AGENT_BASE_URL}/*")
-    print(f"🔧 Test the proxy: http://localhost:3001/test")
-    
-    app.run(host='0.0.0.0', port=3001, debug=True)
\ No newline at end of file
+    for port, url in args.routes.items():
+        print(f"📡 Proxying requests from http://localhost:{port}/api/* to {url}/*")
+    print(f"🔧 Test the proxy: http://localhost:{next(iter(args.routes))}/test")
+
+    asyncio.run(serve(args.routes, host=args.host, log_level=args.log_level))
@@ -0,0 +1,209 @@
+import asyncio
+import logging
+import random
+import time
+import weakref
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+from wakamate_ai_caption.caption_cache import CaptionCache
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_PLATFORMS = ["instagram", "facebook", "twitter", "linkedin", "tiktok"]
+TONES = ["professional", "casual", "trendy", "funny"]
+
+# Caption cache reads/writes in worker threads at once, per generator
+CACHE_IO_CONCURRENCY = 4
+
+
+def detect_platforms(message: str, default: List[str]) -> List[str]:
+    """Platforms named in the message, or the configured defaults"""
+    message_lower = message.lower()
+    found = [p for p in SUPPORTED_PLATFORMS if p in message_lower]
+    if " x " in f" {message_lower} " and "twitter" not in found:
+        found.append("twitter")
+    return found or list(default)
+
+
+def detect_tone(message: str, default: str = "engaging") -> str:
+    message_lower = message.lower()
+    return next((tone for tone in TONES if tone in message_lower), default)
+
+
+@dataclass
+class CaptionResult:
+    """Outcome of one product/platform caption job"""
+    product_id: str
+    product_name: str
+    platform: str
+    tone: str
+    caption: str = ""
+    error: Optional[str] = None
+    attempts: int = 0
+    elapsed: float = 0.0
+    cached: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def to_markdown(self) -> str:
+        header = f"### {self.product_name} — {self.platform.title()}"
+        if not self.ok:
+            return f"{header}\n⚠️ Could not generate caption: {self.error}"
+        return f"{header}\n{self.caption.strip()}"
+
+
+class StubCaptionLLM:
+    """
+    Offline stand-in for the caption chain, for throughput testing without an
+    LLM endpoint. `ainvoke` mirrors the LangChain Runnable interface.
+    """
+
+    def __init__(self, latency: float = 0.5, jitter: float = 0.1, failure_rate: float = 0.0,
+                 seed: Optional[int] = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.calls = 0
+        self._random = random.Random(seed)
+
+    async def ainvoke(self, inputs: Dict[str, Any]) -> str:
+        self.calls += 1
+        await asyncio.sleep(max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter)))
+        if self._random.random() < self.failure_rate:
+            raise RuntimeError("stub LLM failure")
+        first_line = str(inputs.get("input", "")).splitlines()[0][:60]
+        return f"✨ Stub caption #{self.calls} for: {first_line} #wakamate"
+
+
+def _default_formatter(product: Dict[str, Any]) -> str:
+    return f"Product: {product.get('name', 'Unknown Product')}\n"
+
+
+class BatchCaptionGenerator:
+    """
+    Generate captions for many products and platforms concurrently. Each
+    product/platform pair is one LLM call; a semaphore shared by every batch
+    on the event loop bounds how many calls are in flight, so `concurrency`
+    is a process-wide limit for a shared generator, and failed calls are
+    retried with exponential backoff. Pairs already in the optional caption
+    cache skip the LLM entirely; cache lookups run in worker threads, at most
+    CACHE_IO_CONCURRENCY at a time.
+    """
+
+    def __init__(self,
+                 chain: Any,
+                 formatter: Callable[[Dict[str, Any]], str] = _default_formatter,
+                 concurrency: int = 4,
+                 max_retries: int = 2,
+                 retry_backoff: float = 0.5,
+                 timeout: Optional[float] = 60.0,
+                 cache: Optional[CaptionCache] = None,
+                 min_cached_variations: int = 1):
+        self.chain = chain
+        self.formatter = formatter
+        self.concurrency = max(1, concurrency)
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.timeout = timeout
+        self.cache = cache
+        self.min_cached_variations = min_cached_variations
+        # Jobs started and not yet finished, including those waiting on the semaphore
+        self.pending = 0
+        # Event loop -> (LLM semaphore, cache I/O semaphore); asyncio primitives are bound to one loop
+        self._semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, tuple]" = weakref.WeakKeyDictionary()
+
+    def _limits(self) -> tuple:
+        """The running loop's (LLM, cache I/O) semaphores, created on first use"""
+        loop = asyncio.get_running_loop()
+        limits = self._semaphores.get(loop)
+        if limits is None:
+            limits = self._semaphores[loop] = (asyncio.Semaphore(self.concurrency),
+                                               asyncio.Semaphore(CACHE_IO_CONCURRENCY))
+        return limits
+
+    def build_request(self, product_text: str, platform: str, tone: str) -> str:
+        return (
+            f"Generate 2 {platform.title()} caption variations in a {tone} tone for this product "
+            f"from the seller's inventory:\n\n{product_text}\n"
+            f"Include relevant hashtags and emojis suited to {platform.title()}. "
+            "Return only the captions, numbered."
+        )
+
+    async def _generate_one(self, product: Dict[str, Any], platform: str, tone: str) -> CaptionResult:
+        self.pending += 1
+        try:
+            return await self._generate(product, platform, tone)
+        finally:
+            self.pending -= 1
+
+    async def _generate(self, product: Dict[str, Any], platform: str, tone: str) -> CaptionResult:
+        result = CaptionResult(
+            product_id=str(product.get("_id", "")),
+            product_name=product.get("name", "Unknown Product"),
+            platform=platform,
+            tone=tone,
+        )
+        product_text = self.formatter(product)
+        start = time.perf_counter()
+        semaphore, cache_io = self._limits()
+
+        if self.cache is not None:
+            async with cache_io:
+                cached = await asyncio.to_thread(self.cache.get, product_text, platform, tone,
+                                                 self.min_cached_variations)
+            if cached is not None:
+                result.caption = cached
+                result.cached = True
+                result.elapsed = time.perf_counter() - start
+                return result
+
+        request = self.build_request(product_text, platform, tone)
+
+        for attempt in range(self.max_retries + 1):
+            result.attempts = attempt + 1
+            try:
+                async with semaphore:
+                    result.caption = await asyncio.wait_for(
+                        self.chain.ainvoke({"input": request}), timeout=self.timeout
+                    )
+                result.error = None
+                break
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                result.error = str(e) or type(e).__name__
+                logger.warning(f"Caption attempt {attempt + 1} failed for {result.product_name}/{platform}: {result.error}")
+                if attempt < self.max_retries:
+                    await asyncio.sleep(self.retry_backoff * (2 ** attempt) * (0.5 + random.random()))
+
+        result.elapsed = time.perf_counter() - start
+        if self.cache is not None and result.ok:
+            async with cache_io:
+                await asyncio.to_thread(self.cache.put, result.product_id, product_text, platform, tone,
+                                        result.caption)
+        return result
+
+    async def stream(self, products: List[Dict[str, Any]], platforms: List[str],
+                     tone: str = "engaging") -> AsyncIterator[CaptionResult]:
+        """Yield caption results in completion order"""
+        tasks = [
+            asyncio.ensure_future(self._generate_one(product, platform, tone))
+            for product in products
+            for platform in platforms
+        ]
+        logger.info(f"Batch caption run: {len(tasks)} jobs, concurrency {self.concurrency}")
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            # Consumer stopped early or was cancelled - don't leave calls running
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    async def generate(self, products: List[Dict[str, Any]], platforms: List[str],
+                       tone: str = "engaging") -> List[CaptionResult]:
+        return [result async for result in self.stream(products, platforms, tone)]
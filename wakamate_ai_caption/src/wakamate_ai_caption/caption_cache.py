@@ -0,0 +1,152 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+def content_hash(product_text: str) -> str:
+    return hashlib.sha256(product_text.encode("utf-8")).hexdigest()
+
+
+def request_hash(request: str) -> str:
+    """Digest of a free-text request, ignoring case, punctuation and spacing"""
+    normalised = " ".join(re.sub(r"[^\w\s]", " ", request.lower()).split())
+    return hashlib.sha256(normalised.encode("utf-8")).hexdigest()[:32]
+
+
+def cache_key(product_text: str, platform: str, tone: str, request: str = "") -> str:
+    """
+    Key on the rendered product block, so any field change yields a new key.
+    Chat replies also key on the user's request, so different asks about
+    the same product never share a reply.
+    """
+    raw = f"{content_hash(product_text)}|{platform.lower()}|{tone.lower()}"
+    if request:
+        raw += f"|{request_hash(request)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class CaptionCache:
+    """
+    Persistent caption cache backed by SQLite, keyed on the product's
+    `format_product_for_caption` output plus platform and tone.
+
+    Each entry holds up to `max_variations` captions which are served round
+    robin on repeat requests. Entries expire after `ttl_seconds`, the least
+    recently used are evicted past `max_entries`, and all entries for a product
+    are dropped as soon as it is cached with different content.
+    """
+
+    def __init__(self, path: str = ":memory:", max_entries: int = 5000,
+                 ttl_seconds: float = 7 * 24 * 3600, max_variations: int = 3):
+        self.path = path if path == ":memory:" else os.path.expanduser(path)
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_variations = max_variations
+        self.hits = 0
+        self.misses = 0
+
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS captions (
+                key TEXT PRIMARY KEY,
+                product_id TEXT NOT NULL,
+                content_hash TEXT NOT NULL,
+                platform TEXT NOT NULL,
+                tone TEXT NOT NULL,
+                variations TEXT NOT NULL,
+                served INTEGER NOT NULL DEFAULT 0,
+                created REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS captions_product ON captions (product_id)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS captions_access ON captions (last_access)")
+
+    def get(self, product_text: str, platform: str, tone: str, min_variations: int = 1,
+            request: str = "") -> Optional[str]:
+        """
+        Return a cached caption, rotating through stored variations. Entries with
+        fewer than `min_variations` count as a miss so callers can grow variety.
+        """
+        key = cache_key(product_text, platform, tone, request)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT variations, served, created FROM captions WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            variations, served, created = json.loads(row[0]), row[1], row[2]
+            if now - created > self.ttl_seconds:
+                self._conn.execute("DELETE FROM captions WHERE key = ?", (key,))
+                self.misses += 1
+                return None
+            if len(variations) < min_variations:
+                self.misses += 1
+                return None
+            self._conn.execute(
+                "UPDATE captions SET served = served + 1, last_access = ? WHERE key = ?", (now, key)
+            )
+            self.hits += 1
+            return variations[served % len(variations)]
+
+    def put(self, product_id: str, product_text: str, platform: str, tone: str, caption: str,
+            request: str = ""):
+        """Store a caption variation, invalidating stale entries for the product"""
+        key = cache_key(product_text, platform, tone, request)
+        digest = content_hash(product_text)
+        now = time.time()
+        with self._lock:
+            stale = self._conn.execute(
+                "DELETE FROM captions WHERE product_id = ? AND content_hash != ?", (product_id, digest)
+            ).rowcount
+            if stale:
+                logger.debug(f"Invalidated {stale} cached captions for changed product {product_id}")
+
+            row = self._conn.execute("SELECT variations FROM captions WHERE key = ?", (key,)).fetchone()
+            variations = json.loads(row[0]) if row else []
+            if caption not in variations:
+                variations = (variations + [caption])[-self.max_variations:]
+            self._conn.execute(
+                """
+                INSERT INTO captions (key, product_id, content_hash, platform, tone, variations, served, created, last_access)
+                VALUES (?, ?, ?, ?, ?, ?, 0, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET variations = excluded.variations, last_access = excluded.last_access
+                """,
+                (key, product_id, digest, platform.lower(), tone.lower(), json.dumps(variations), now, now),
+            )
+            self._evict()
+
+    def _evict(self):
+        self._conn.execute("DELETE FROM captions WHERE created < ?", (time.time() - self.ttl_seconds,))
+        overflow = self._conn.execute("SELECT COUNT(*) FROM captions").fetchone()[0] - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM captions WHERE key IN (SELECT key FROM captions ORDER BY last_access LIMIT ?)",
+                (overflow,),
+            )
+
+    def invalidate_product(self, product_id: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM captions WHERE product_id = ?", (product_id,))
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM captions").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,243 @@
+import hashlib
+import heapq
+import itertools
+import logging
+import math
+import re
+import threading
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+# Relative weight of a query term hitting each product field
+FIELD_WEIGHTS = {"name": 3.0, "category": 1.5, "description": 1.0}
+_FIELD_BY_WEIGHT = {weight: field for field, weight in FIELD_WEIGHTS.items()}
+
+# Request phrasing that should never be matched against the catalogue
+STOPWORDS = {
+    "a", "an", "and", "the", "for", "of", "to", "in", "on", "with", "my", "me", "i", "you", "your",
+    "is", "it", "this", "that", "please", "can", "could", "would", "some", "about", "new",
+    "caption", "captions", "generate", "create", "write", "make", "post", "posts", "give",
+    "instagram", "facebook", "twitter", "tiktok", "linkedin", "social", "media",
+}
+
+# Terms appearing in more than this share of products are common: next to rarer
+# hits they only re-rank those candidates, adding at most COMMON_TERM_CAP each.
+# When nothing rarer matched, the rarest common term's products are the candidates,
+# highest field weight first and at most MAX_COMMON_CANDIDATES of them
+MAX_DF_RATIO = 0.05
+COMMON_TERM_CAP = 1.0
+MAX_COMMON_CANDIDATES = 500
+MIN_FUZZY_SIMILARITY = 0.5
+# Trigrams shared by more vocabulary terms than this carry no signal for fuzzy lookup
+MAX_TRIGRAM_POSTINGS = 5000
+
+
+def _normalize(token: str) -> str:
+    """Lowercase token with a light plural strip (shoes -> shoe)"""
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    return [_normalize(t) for t in _WORD.findall(text.lower())]
+
+
+def _trigrams(term: str) -> set:
+    padded = f"  {term} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+@dataclass
+class ProductMatch:
+    """A ranked search hit with a 0-1 confidence"""
+    product: Dict[str, Any]
+    score: float
+    confidence: float
+    matched_field: str
+    fuzzy: bool = False
+
+
+class ProductSearchIndex:
+    """
+    Inverted token index plus a trigram index over the vocabulary, built once per
+    inventory snapshot. Queries touch only the posting lists of their own terms,
+    so lookup cost is independent of catalogue size for selective terms.
+    """
+
+    _cache: "OrderedDict[str, ProductSearchIndex]" = OrderedDict()
+    _cache_lock = threading.Lock()
+    _cache_size = 8
+    # id(list) -> (list, index) for the lists indexes were last requested with
+    _by_identity: "OrderedDict[int, Tuple[List[Dict[str, Any]], ProductSearchIndex]]" = OrderedDict()
+
+    def __init__(self, products: List[Dict[str, Any]]):
+        self.products = products
+        self._postings: Dict[str, Dict[int, float]] = defaultdict(dict)
+        self._name_terms: List[Tuple[str, ...]] = []
+
+        for idx, product in enumerate(products):
+            name_terms = tuple(dict.fromkeys(tokenize(product.get("name", "") or "")))
+            self._name_terms.append(name_terms)
+            for field, weight in FIELD_WEIGHTS.items():
+                terms = name_terms if field == "name" else tokenize(str(product.get(field, "") or ""))
+                for term in terms:
+                    if term in STOPWORDS:
+                        continue
+                    posting = self._postings[term]
+                    if weight > posting.get(idx, 0.0):
+                        posting[idx] = weight
+
+        # Highest field weight first, so capped scans of common terms keep name hits
+        self._postings = {
+            term: dict(sorted(posting.items(), key=lambda item: -item[1]))
+            for term, posting in self._postings.items()
+        }
+        self._trigram_terms: Dict[str, List[str]] = defaultdict(list)
+        for term in self._postings:
+            if len(term) >= 3:
+                for gram in _trigrams(term):
+                    self._trigram_terms[gram].append(term)
+        self._trigram_terms = dict(self._trigram_terms)
+
+    @staticmethod
+    def fingerprint(products: List[Dict[str, Any]]) -> str:
+        """Snapshot key; changes whenever any searchable field changes"""
+        digest = hashlib.blake2b(digest_size=16)
+        for product in products:
+            # Mongo bumps updatedAt on every write, so it stands in for the content
+            keys = ("_id", "updatedAt") if product.get("updatedAt") else ("_id", "name", "category", "description")
+            for key in keys:
+                digest.update(str(product.get(key, "")).encode("utf-8", "ignore"))
+                digest.update(b"\x1f")
+            digest.update(b"\x1e")
+        return digest.hexdigest()
+
+    @classmethod
+    def for_products(cls, products: List[Dict[str, Any]]) -> "ProductSearchIndex":
+        """
+        Return the cached index for this snapshot, building it on first use.
+        The very list an index was built from is recognised by identity in
+        O(1) (a fetch revalidated with 304 returns it again); any other list
+        is fingerprinted.
+        """
+        with cls._cache_lock:
+            entry = cls._by_identity.get(id(products))
+            if entry is not None and entry[0] is products:
+                cls._by_identity.move_to_end(id(products))
+                return entry[1]
+        key = cls.fingerprint(products)
+        with cls._cache_lock:
+            index = cls._cache.get(key)
+            if index is not None:
+                cls._cache.move_to_end(key)
+                cls._remember(index, products)
+                return index
+        index = cls(products)
+        logger.debug(f"Built product index: {len(products)} products, {len(index._postings)} terms")
+        with cls._cache_lock:
+            cls._cache[key] = index
+            cls._remember(index, products)
+            while len(cls._cache) > cls._cache_size:
+                cls._cache.popitem(last=False)
+        return index
+
+    @classmethod
+    def _remember(cls, index: "ProductSearchIndex", products: List[Dict[str, Any]]):
+        """Map a list to its index by identity (caller holds _cache_lock)"""
+        # The list is kept with its index, so its id cannot be reused while mapped
+        cls._by_identity[id(products)] = (products, index)
+        cls._by_identity.move_to_end(id(products))
+        while len(cls._by_identity) > cls._cache_size:
+            cls._by_identity.popitem(last=False)
+
+    def _idf(self, term: str) -> float:
+        return math.log(1 + len(self.products) / len(self._postings[term]))
+
+    def _fuzzy_term(self, token: str) -> Tuple[Optional[str], float]:
+        """Closest vocabulary term by trigram Jaccard similarity"""
+        if len(token) < 4:
+            return None, 0.0
+        grams = _trigrams(token)
+        shared: Dict[str, int] = defaultdict(int)
+        for gram in grams:
+            terms = self._trigram_terms.get(gram)
+            if not terms or len(terms) > MAX_TRIGRAM_POSTINGS:
+                continue
+            for term in terms:
+                shared[term] += 1
+        best, best_sim = None, 0.0
+        for term, count in shared.items():
+            sim = count / (len(grams) + len(term) + 1 - count)
+            if sim > best_sim:
+                best, best_sim = term, sim
+        if best_sim < MIN_FUZZY_SIMILARITY:
+            return None, 0.0
+        return best, best_sim
+
+    def search(self, query: str, limit: int = 1) -> List[ProductMatch]:
+        """Rank products against every term of the query at once"""
+        if not self.products:
+            return []
+
+        resolved = []
+        for token in dict.fromkeys(tokenize(query)):
+            if token in STOPWORDS:
+                continue
+            if token in self._postings:
+                resolved.append((token, 1.0))
+            else:
+                term, sim = self._fuzzy_term(token)
+                if term:
+                    resolved.append((term, sim))
+        if not resolved:
+            return []
+
+        # Rarest terms first: selective terms pick the candidates, common ones
+        # never scan their (long) posting lists
+        resolved.sort(key=lambda item: len(self._postings[item[0]]))
+        max_df = max(1, int(len(self.products) * MAX_DF_RATIO))
+        rare = [(term, sim) for term, sim in resolved if len(self._postings[term]) <= max_df]
+        common = resolved[len(rare):]
+        scores: Dict[int, float] = defaultdict(float)
+        for term, sim in rare:
+            idf = self._idf(term)
+            for idx, weight in self._postings[term].items():
+                scores[idx] += weight * idf * sim
+        if scores:
+            cap = COMMON_TERM_CAP
+        else:
+            cap = math.inf
+            scores = dict.fromkeys(itertools.islice(self._postings[common[0][0]], MAX_COMMON_CANDIDATES), 0.0)
+        for term, sim in common:
+            posting, idf = self._postings[term], self._idf(term)
+            for idx in scores:
+                weight = posting.get(idx)
+                if weight is not None:
+                    scores[idx] += min(weight * idf * sim, cap)
+
+        top = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+        results = []
+        for idx, score in top:
+            hits = [(self._postings[term][idx], sim) for term, sim in resolved if idx in self._postings[term]]
+            # Confidence is the score relative to naming the product exactly
+            ideal = sum(FIELD_WEIGHTS["name"] * self._idf(t) for t in self._name_terms[idx] if t in self._postings)
+            results.append(ProductMatch(
+                product=self.products[idx],
+                score=score,
+                confidence=min(1.0, score / ideal) if ideal else 0.0,
+                matched_field=_FIELD_BY_WEIGHT[max(weight for weight, _ in hits)],
+                fuzzy=any(sim < 1.0 for _, sim in hits),
+            ))
+        return results
+
+    def best_match(self, query: str, min_confidence: float = 0.0) -> Optional[ProductMatch]:
+        results = self.search(query, limit=1)
+        if results and results[0].confidence >= min_confidence:
+            return results[0]
+        return None
@@ -1,3 +1,4 @@
+const mongoose = require("mongoose");
 const Delivery = require("../model/Delivery");
 
 //create new delivery
@@ -14,10 +15,26 @@ exports.createDelivery = async (req, res) => {
     }
 };
 
-//get deliveries
+//get deliveries, optionally filtered by ?ids=a,b and/or ?date=YYYY-MM-DD (a UTC day)
 exports.getAllDeliveries = async (req, res) => {
     try {
-        const deliveries = await Delivery.find();
+        const filter = {};
+        if (req.query.ids) {
+            const ids = String(req.query.ids).split(",").map((id) => id.trim()).filter(Boolean);
+            if (!ids.every((id) => mongoose.Types.ObjectId.isValid(id))) {
+                return res.status(400).json({ success: false, message: "Invalid delivery id in ids" });
+            }
+            filter._id = { $in: ids };
+        }
+        if (req.query.date) {
+            const start = new Date(`${req.query.date}T00:00:00.000Z`);
+            if (!/^\d{4}-\d{2}-\d{2}$/.test(req.query.date) || isNaN(start.getTime())) {
+                return res.status(400).json({ success: false, message: "date must be YYYY-MM-DD" });
+            }
+            const end = new Date(start.getTime() + 24 * 60 * 60 * 1000);
+            filter.deliveryDate = { $gte: start, $lt: end };
+        }
+        const deliveries = await Delivery.find(filter);
         res.status(200).json({ success: true, data: deliveries });
     } catch (err) {
         res.status(500).json({ sucess: false, error: err.message });
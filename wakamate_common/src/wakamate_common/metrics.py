@@ -0,0 +1,352 @@
+import bisect
+import functools
+import json
+import logging
+import math
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Seconds; spans range from sub-millisecond matrix phases to minute-long agent turns
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    """Monotonic counter with optional labels"""
+
+    type_name = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values: str, amount: float = 1.0):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def value(self, *label_values: str) -> float:
+        return self._values.get(label_values, 0.0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labels, values)} {_format_value(v)}" for values, v in items]
+
+
+class Gauge(Counter):
+    """Value that can go up and down"""
+
+    type_name = "gauge"
+
+    def set(self, *label_values: str, value: float):
+        with self._lock:
+            self._values[label_values] = value
+
+    def dec(self, *label_values: str, amount: float = 1.0):
+        self.inc(*label_values, amount=-amount)
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus exposition format"""
+
+    type_name = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts..., +Inf count, sum]
+        self._series: Dict[LabelValues, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, *label_values: str, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def snapshot(self, *label_values: str) -> Tuple[int, float]:
+        """(count, sum) for one series"""
+        series = self._series.get(label_values)
+        if series is None:
+            return 0, 0.0
+        return int(sum(series[:-1])), series[-1]
+
+    def quantile(self, q: float, *label_values: str) -> Optional[float]:
+        """Bucket upper bound below which `q` of the observations fall"""
+        series = self._series.get(label_values)
+        if not series:
+            return None
+        counts = series[:-1]
+        target = q * sum(counts)
+        running = 0
+        for bound, count in zip(self.buckets + (math.inf,), counts):
+            running += count
+            if running >= target:
+                return bound
+        return math.inf
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((values, list(series)) for values, series in self._series.items())
+        lines = []
+        for values, series in items:
+            running = 0
+            for bound, count in zip(self.buckets + (math.inf,), series[:-1]):
+                running += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, values, le)} {running}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, values)} {_format_value(series[-1])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, values)} {running}")
+        return lines
+
+
+class MetricsRegistry:
+    """Process-wide set of metrics, rendered in the Prometheus text format"""
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._collectors: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name: str, help_text: str, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help_text, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} already registered as {metric.type_name}")
+            return metric
+
+    def counter(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, help_text, labels=labels)
+
+    def gauge(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, help_text, labels=labels)
+
+    def histogram(self, name: str, help_text: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, help_text, labels=labels, buckets=buckets)
+
+    def on_collect(self, fn: Callable[[], None]):
+        """Run `fn` before every render, to copy point-in-time values into gauges"""
+        with self._lock:
+            self._collectors.append(fn)
+
+    def remove_collector(self, fn: Callable[[], None]):
+        with self._lock:
+            if fn in self._collectors:
+                self._collectors.remove(fn)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+        for fn in collectors:
+            try:
+                fn()
+            except Exception as e:
+                logger.debug(f"Metrics collector {fn!r} failed: {e}")
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+
+def render_prometheus(registry: MetricsRegistry = REGISTRY) -> str:
+    """Every metric in `registry` in the Prometheus text exposition format"""
+    return registry.render()
+
+
+REQUEST_SECONDS = REGISTRY.histogram("wakamate_request_duration_seconds",
+                                     "Workflow request latency", labels=("workflow", "endpoint"))
+REQUEST_ERRORS = REGISTRY.counter("wakamate_request_errors_total",
+                                  "Workflow requests that failed", labels=("workflow", "endpoint"))
+REQUESTS_IN_FLIGHT = REGISTRY.gauge("wakamate_requests_in_flight",
+                                    "Workflow requests currently being served", labels=("workflow",))
+LLM_CALLS = REGISTRY.counter("wakamate_llm_calls_total", "LLM calls by outcome", labels=("workflow", "outcome"))
+LLM_TOKENS = REGISTRY.counter("wakamate_llm_tokens_total",
+                              "LLM tokens reported by the provider", labels=("workflow", "kind"))
+BACKEND_FETCH_SECONDS = REGISTRY.histogram("wakamate_backend_fetch_seconds",
+                                           "Wakamate backend API latency", labels=("endpoint",))
+BACKEND_FETCH_ERRORS = REGISTRY.counter("wakamate_backend_fetch_errors_total",
+                                        "Wakamate backend API failures", labels=("endpoint",))
+GEOCODER_CALLS = REGISTRY.counter("wakamate_geocoder_calls_total",
+                                  "Geocoder lookups sent upstream, by outcome", labels=("outcome",))
+
+
+class track_request:
+    """Time a workflow request and count it as in flight while it runs"""
+
+    __slots__ = ("workflow", "endpoint", "start")
+
+    def __init__(self, workflow: str, endpoint: str):
+        self.workflow = workflow
+        self.endpoint = endpoint
+
+    def __enter__(self):
+        REQUESTS_IN_FLIGHT.inc(self.workflow)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        REQUEST_SECONDS.observe(self.workflow, self.endpoint, value=time.perf_counter() - self.start)
+        REQUESTS_IN_FLIGHT.dec(self.workflow)
+        if exc_type is not None:
+            REQUEST_ERRORS.inc(self.workflow, self.endpoint)
+        return False
+
+
+def export_flight_stats(stats_fn: Callable[[], List[Dict[str, Any]]]):
+    """Publish singleflight counters (see singleflight.flight_stats) at every scrape"""
+    calls = REGISTRY.gauge("wakamate_singleflight_calls",
+                           "Calls per coalescing layer; collapsed calls reused an in-flight result",
+                           labels=("layer", "result"))
+
+    def collect():
+        for stats in stats_fn():
+            calls.set(stats["name"], "executed", value=stats["calls"])
+            calls.set(stats["name"], "collapsed", value=stats["collapsed"])
+
+    REGISTRY.on_collect(collect)
+
+
+@functools.lru_cache(maxsize=None)
+def _usage_handler_class():
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    class LLMUsageHandler(BaseCallbackHandler):
+        """Counts LLM calls and the token usage providers report with each result"""
+
+        def __init__(self, workflow: str):
+            self.workflow = workflow
+
+        def on_llm_end(self, response: Any, **kwargs: Any):
+            LLM_CALLS.inc(self.workflow, "ok")
+            usage = (getattr(response, "llm_output", None) or {}).get("token_usage") or {}
+            prompt_tokens = usage.get("prompt_tokens", 0)
+            completion_tokens = usage.get("completion_tokens", 0)
+            if not usage:
+                for generations in getattr(response, "generations", []):
+                    for generation in generations:
+                        metadata = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                        prompt_tokens += metadata.get("input_tokens", 0)
+                        completion_tokens += metadata.get("output_tokens", 0)
+            if prompt_tokens:
+                LLM_TOKENS.inc(self.workflow, "prompt", amount=prompt_tokens)
+            if completion_tokens:
+                LLM_TOKENS.inc(self.workflow, "completion", amount=completion_tokens)
+
+        def on_llm_error(self, error: BaseException, **kwargs: Any):
+            LLM_CALLS.inc(self.workflow, "error")
+
+    return LLMUsageHandler
+
+
+def llm_usage_callback(workflow: str):
+    """LangChain callback handler feeding wakamate_llm_calls_total and wakamate_llm_tokens_total"""
+    return _usage_handler_class()(workflow)
+
+
+class LogSampler(logging.Filter):
+    """
+    Let through one in `every` records below WARNING from each call site, so
+    per-request debug logging stays affordable when it is switched on under load.
+    """
+
+    def __init__(self, every: int = 100):
+        super().__init__()
+        self.every = max(1, every)
+        self._seen: Dict[Tuple[str, int], int] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or self.every == 1:
+            return True
+        site = (record.pathname, record.lineno)
+        count = self._seen.get(site, 0)
+        self._seen[site] = count + 1
+        return count % self.every == 0
+
+
+_servers: Dict[int, ThreadingHTTPServer] = {}
+_servers_lock = threading.Lock()
+_started = time.time()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry: MetricsRegistry = REGISTRY
+
+    def do_GET(self):
+        path = self.path.split("?", 1)[0]
+        if path == "/metrics":
+            body = self.registry.render().encode("utf-8")
+            content_type = "text/plain; version=0.0.4; charset=utf-8"
+        elif path == "/healthz":
+            body = json.dumps({"status": "ok", "uptime_seconds": round(time.time() - _started, 1)}).encode()
+            content_type = "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_metrics_server(port: int, host: str = "127.0.0.1") -> Optional[ThreadingHTTPServer]:
+    """Serve /metrics and /healthz from a daemon thread; once per port, port 0 disables"""
+    if port <= 0:
+        return None
+    with _servers_lock:
+        if port in _servers:
+            return _servers[port]
+        try:
+            server = ThreadingHTTPServer((host, port), _MetricsHandler)
+        except OSError as e:
+            logger.warning(f"Metrics server not started on {host}:{port}: {e}")
+            return None
+        server.daemon_threads = True
+        _servers[port] = server
+    threading.Thread(target=server.serve_forever, name=f"metrics-{port}", daemon=True).start()
+    logger.info(f"Serving /metrics and /healthz on http://{host}:{port}")
+    return server
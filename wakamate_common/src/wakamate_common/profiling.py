@@ -0,0 +1,232 @@
+import asyncio
+import contextlib
+import heapq
+import importlib.util
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Request headers that switch profiling on for one request, and that name it
+PROFILE_HEADER = "x-wakamate-profile"
+REQUEST_ID_HEADERS = ("x-request-id", "x-correlation-id")
+
+
+def _request_headers() -> Dict[str, str]:
+    try:
+        from aiq.builder.context import AIQContext
+        return getattr(AIQContext.get().metadata, "headers", None) or {}
+    except Exception:
+        return {}
+
+
+def request_id() -> str:
+    """Caller-supplied request id when there is one, else a fresh short id"""
+    headers = _request_headers()
+    for name in REQUEST_ID_HEADERS:
+        value = headers.get(name)
+        if value:
+            return re.sub(r"[^A-Za-z0-9_.-]", "_", str(value))[:64]
+    return uuid.uuid4().hex[:12]
+
+
+def profile_requested() -> bool:
+    return str(_request_headers().get(PROFILE_HEADER, "")).lower() in ("1", "true", "yes")
+
+
+class StackSampler:
+    """
+    Fallback when pyinstrument is not installed: one daemon thread samples every
+    thread's Python stack at `interval` and appends to each active recording.
+    Samples are process-wide, so concurrent requests show up in each other's
+    profiles, but work in executor threads (sync tools, solver pools) is seen.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self._recordings: List["_Recording"] = []
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "_Recording":
+        recording = _Recording()
+        with self._lock:
+            self._recordings.append(recording)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="wakamate-stack-sampler", daemon=True)
+                self._thread.start()
+        return recording
+
+    def stop(self, recording: "_Recording"):
+        recording.end = time.perf_counter()
+        with self._lock:
+            if recording in self._recordings:
+                self._recordings.remove(recording)
+
+    def _run(self):
+        me = threading.get_ident()
+        last = time.perf_counter()
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                recordings = list(self._recordings)
+                if not recordings:
+                    self._thread = None
+                    return
+            now = time.perf_counter()
+            weight, last = now - last, now
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+                    frame = frame.f_back
+                stack.reverse()
+                for recording in recordings:
+                    recording.add(names.get(ident, str(ident)), stack, weight)
+
+
+class _Recording:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.end = self.start
+        self.frames: Dict[Tuple[str, str, int], int] = {}
+        self.threads: Dict[str, Tuple[List[List[int]], List[float]]] = {}
+
+    def add(self, thread_name: str, stack: List[Tuple[str, str, int]], weight: float):
+        indices = [self.frames.setdefault(frame, len(self.frames)) for frame in stack]
+        samples, weights = self.threads.setdefault(thread_name, ([], []))
+        samples.append(indices)
+        weights.append(weight)
+
+    def to_speedscope(self, name: str) -> str:
+        frames = [{"name": fn, "file": file, "line": line} for (fn, file, line) in self.frames]
+        profiles = [
+            {
+                "type": "sampled",
+                "name": f"{name} [{thread}]",
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": sum(weights),
+                "samples": samples,
+                "weights": weights,
+            }
+            for thread, (samples, weights) in self.threads.items()
+        ]
+        return json.dumps({
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "shared": {"frames": frames},
+            "profiles": profiles,
+            "name": name,
+            "exporter": "wakamate StackSampler",
+        })
+
+
+class RequestProfiler:
+    """
+    Profiles workflow requests and writes speedscope JSON files named after the
+    request id. A request is profiled when the caller sends
+    `X-Wakamate-Profile: 1`, when `always` is set, or, with `slow_seconds` > 0,
+    always, keeping only the `keep_slowest` profiles above that latency.
+
+    pyinstrument (when installed) samples only the event-loop thread that
+    started it, so work a request hands to executor threads appears as one
+    opaque await. Workflows whose time is spent in threads pass
+    `all_threads=True` to sample every thread with StackSampler instead.
+    """
+
+    def __init__(self, output_dir: str, always: bool = False, slow_seconds: float = 0.0,
+                 keep_slowest: int = 10, interval: float = 0.005, all_threads: bool = False):
+        self.output_dir = os.path.expanduser(output_dir)
+        self.always = always
+        self.slow_seconds = slow_seconds
+        self.keep_slowest = keep_slowest
+        self.interval = interval
+        # (latency, path) min-heap of automatically kept profiles
+        self._slowest: List[Tuple[float, str]] = []
+        self._lock = threading.Lock()
+        self._sampler: Optional[StackSampler] = None
+        self.backend = ("pyinstrument" if not all_threads and importlib.util.find_spec("pyinstrument")
+                        else "stack-sampler")
+
+    def slowest(self) -> List[Tuple[float, str]]:
+        """Automatically kept profiles, slowest first"""
+        with self._lock:
+            return sorted(self._slowest, reverse=True)
+
+    @contextlib.asynccontextmanager
+    async def profile(self, label: str) -> AsyncIterator[None]:
+        requested = self.always or profile_requested()
+        if not requested and self.slow_seconds <= 0:
+            yield
+            return
+
+        rid = request_id()
+        try:
+            stop = self._start()
+        except Exception as e:
+            logger.warning(f"Profiling {label}-{rid} could not start: {e}")
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            render = stop()
+            if requested or elapsed >= self.slow_seconds:
+                # Rendering a long profile takes a while; keep it off the event loop
+                await asyncio.to_thread(self._save, render, f"{label}-{rid}", elapsed, not requested)
+
+    def _start(self):
+        if self.backend == "pyinstrument":
+            from pyinstrument import Profiler
+            from pyinstrument.renderers import SpeedscopeRenderer
+
+            profiler = Profiler(interval=self.interval, async_mode="enabled")
+            profiler.start()
+
+            def stop():
+                profiler.stop()
+                return lambda name: profiler.output(SpeedscopeRenderer())
+            return stop
+
+        if self._sampler is None:
+            self._sampler = StackSampler(self.interval)
+        recording = self._sampler.start()
+
+        def stop():
+            self._sampler.stop(recording)
+            return recording.to_speedscope
+        return stop
+
+    def _save(self, render, name: str, elapsed: float, automatic: bool):
+        path = os.path.join(self.output_dir, f"{name}.speedscope.json")
+        evicted = None
+        with self._lock:
+            if automatic:
+                if len(self._slowest) >= self.keep_slowest:
+                    if not self._slowest or elapsed <= self._slowest[0][0]:
+                        return
+                    evicted = heapq.heappop(self._slowest)[1]
+                heapq.heappush(self._slowest, (elapsed, path))
+        try:
+            os.makedirs(self.output_dir, exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(render(name))
+            if evicted and os.path.exists(evicted):
+                os.remove(evicted)
+        except Exception as e:
+            logger.warning(f"Could not write profile {path}: {e}")
+            return
+        logger.info(f"Saved {self.backend} profile of {name} ({elapsed:.2f}s) to {path}")
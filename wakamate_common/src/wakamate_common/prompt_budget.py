@@ -0,0 +1,148 @@
+import logging
+import re
+from dataclasses import dataclass, field
+from typing import Any, List, Optional, Sequence, Tuple
+
+from wakamate_common.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+# Word pieces, single punctuation marks and individual non-ASCII symbols (emoji
+# etc.) each cost roughly one BPE token; long words are split every 4 characters
+_TOKEN_PATTERN = re.compile(r"[A-Za-z]+|\d+|[^\sA-Za-z\d]")
+
+
+PROMPT_TOKENS = REGISTRY.counter("wakamate_prompt_tokens_total",
+                                 "Estimated prompt context tokens sent, and saved by budgeting",
+                                 labels=("workflow", "kind"))
+
+
+def estimate_tokens(text: str) -> int:
+    """Fast local token estimate, close to BPE counts for English and numbers"""
+    if not text:
+        return 0
+    count = 0
+    for piece in _TOKEN_PATTERN.findall(text):
+        count += (len(piece) + 3) // 4 if piece[0].isalnum() else 1
+    return count
+
+
+def _cell(value: Any) -> str:
+    if isinstance(value, float):
+        value = f"{value:.2f}".rstrip("0").rstrip(".")
+    text = str(value)
+    if any(ch in text for ch in ',"\n'):
+        text = '"' + text.replace('"', "'").replace("\n", " ") + '"'
+    return text
+
+
+def compact_rows(header: Sequence[str], rows: Sequence[Sequence[Any]]) -> List[str]:
+    """Render tabular data as CSV-like lines (header first)"""
+    return [",".join(header)] + [",".join(_cell(v) for v in row) for row in rows]
+
+
+@dataclass
+class PromptSection:
+    """
+    One block of prompt context. Tabular sections keep their rows separate so
+    the budgeter can drop trailing rows instead of the whole section; rows
+    should therefore be ordered most relevant first.
+    """
+    name: str
+    title: str = ""
+    text: str = ""
+    header: Sequence[str] = ()
+    rows: Sequence[Sequence[Any]] = ()
+    priority: int = 0
+
+    def render(self, max_rows: Optional[int] = None) -> str:
+        parts = [f"## {self.title or self.name}"] if (self.title or self.name) else []
+        if self.text:
+            parts.append(self.text)
+        if self.header:
+            rows = self.rows if max_rows is None else self.rows[:max_rows]
+            parts.extend(compact_rows(self.header, rows))
+            if len(rows) < len(self.rows):
+                parts.append(f"(+{len(self.rows) - len(rows)} more rows omitted)")
+        return "\n".join(parts)
+
+
+@dataclass
+class BudgetReport:
+    """
+    Token accounting for one assembled prompt. `baseline` is the caller's
+    full-context text when one was given, else the preamble plus every
+    section in full (so `saved` counts the dropped and truncated rows).
+    """
+    budget: int
+    used: int
+    baseline: int = 0
+    included: List[str] = field(default_factory=list)
+    truncated: List[str] = field(default_factory=list)
+    dropped: List[str] = field(default_factory=list)
+
+    @property
+    def saved(self) -> int:
+        return max(0, self.baseline - self.used)
+
+
+class PromptBudgeter:
+    """
+    Assemble prompt sections by priority under a fixed token budget. Tokens
+    used and saved per turn are counted in wakamate_prompt_tokens_total
+    under `workflow`.
+    """
+
+    def __init__(self, max_tokens: int = 1500, workflow: str = ""):
+        self.max_tokens = max_tokens
+        self.workflow = workflow
+
+    def assemble(self, preamble: str, sections: List[PromptSection],
+                 baseline_text: str = "") -> Tuple[str, BudgetReport]:
+        used = estimate_tokens(preamble)
+        # Each section is rendered in full anyway, so the full-context size comes for free
+        full = used
+        report = BudgetReport(budget=self.max_tokens, used=used)
+        parts = [preamble]
+
+        for section in sorted(sections, key=lambda s: s.priority, reverse=True):
+            remaining = self.max_tokens - used
+            rendered = section.render()
+            cost = estimate_tokens(rendered)
+            full += cost
+            if cost > remaining and section.rows:
+                rendered, cost = self._fit_rows(section, remaining)
+                if rendered:
+                    report.truncated.append(section.name)
+            if not rendered or cost > remaining:
+                report.dropped.append(section.name)
+                continue
+            parts.append(rendered)
+            used += cost
+            report.included.append(section.name)
+
+        report.used = used
+        report.baseline = estimate_tokens(baseline_text) if baseline_text else full
+        PROMPT_TOKENS.inc(self.workflow, "used", amount=report.used)
+        PROMPT_TOKENS.inc(self.workflow, "saved", amount=report.saved)
+        logger.debug(
+            f"Prompt assembled: {report.used}/{report.budget} tokens, "
+            f"saved {report.saved} vs full context (sections: {', '.join(report.included) or 'none'})"
+        )
+        return "\n\n".join(p for p in parts if p), report
+
+    @staticmethod
+    def _fit_rows(section: PromptSection, remaining: int) -> Tuple[str, int]:
+        """Binary search the largest row prefix of a tabular section that fits"""
+        lo, hi = 0, len(section.rows)
+        best, best_cost = "", 0
+        while lo <= hi:
+            mid = (lo + hi) // 2
+            rendered = section.render(max_rows=mid)
+            cost = estimate_tokens(rendered)
+            if cost <= remaining:
+                best, best_cost = rendered, cost
+                lo = mid + 1
+            else:
+                hi = mid - 1
+        return best, best_cost
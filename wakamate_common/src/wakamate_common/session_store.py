@@ -0,0 +1,305 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Any, Deque, Dict, List
+
+logger = logging.getLogger(__name__)
+
+# Request headers that pick a conversation within one caller, most specific first
+SESSION_HEADERS = ("x-session-id", "x-conversation-id", "x-user-id")
+
+# Prefix of per-request ids for callers without a bearer token or a client session id
+EPHEMERAL_PREFIX = "anon-"
+
+# Header a tokenless client uses to name its own session
+CLIENT_SESSION_HEADER = "x-session-id"
+
+# Client session ids must be long random values (a UUIDv4 qualifies), so one client cannot guess another's
+CLIENT_SESSION_ID = re.compile(r"^[A-Za-z0-9_-]{32,128}$")
+
+
+def resolve_session_id() -> str:
+    """
+    Session key for the current request. Callers are identified by a hash of
+    their bearer token; a session header only selects a conversation within
+    that caller, so one client can never name another's history. Without a
+    token, a client-generated X-Session-Id (at least 32 random characters,
+    e.g. a UUIDv4) is the identity. Requests with neither get an ephemeral
+    id, so they share no history at all.
+    """
+    try:
+        from aiq.builder.context import AIQContext
+        headers = getattr(AIQContext.get().metadata, "headers", None) or {}
+    except Exception:
+        logger.warning("Could not read request headers; using an ephemeral session", exc_info=True)
+        headers = {}
+
+    auth = headers.get("authorization")
+    if not auth:
+        client_id = str(headers.get(CLIENT_SESSION_HEADER) or "").strip()
+        if CLIENT_SESSION_ID.match(client_id):
+            return "client-" + hashlib.sha256(client_id.encode("utf-8")).hexdigest()[:32]
+        if client_id:
+            logger.warning("Ignoring an X-Session-Id that is too short or malformed; using an ephemeral session")
+        return EPHEMERAL_PREFIX + uuid.uuid4().hex
+    session_id = "auth-" + hashlib.sha256(auth.encode("utf-8")).hexdigest()[:32]
+    for name in SESSION_HEADERS:
+        value = headers.get(name)
+        if value:
+            conversation = hashlib.sha256(str(value).encode("utf-8")).hexdigest()[:16]
+            return f"{session_id}:{conversation}"
+    return session_id
+
+
+def is_ephemeral(session_id: str) -> bool:
+    return session_id.startswith(EPHEMERAL_PREFIX)
+
+
+class InMemorySessionBackend:
+    """
+    Bounded per-session deques in an LRU map. Least recently used sessions are
+    evicted beyond `max_sessions`, and sessions idle past `idle_ttl` are dropped.
+    """
+
+    # Calls only take an uncontended lock, so async callers run them inline
+    blocking = False
+
+    def __init__(self, max_messages: int, max_sessions: int = 10000, idle_ttl: float = 7200):
+        self.max_messages = max_messages
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self._sessions: "OrderedDict[str, Deque[Dict[str, Any]]]" = OrderedDict()
+        self._last_seen: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def _expire(self, now: float):
+        # Sessions are in access order, so idle ones sit at the front
+        while self._sessions:
+            oldest = next(iter(self._sessions))
+            if now - self._last_seen[oldest] <= self.idle_ttl and len(self._sessions) <= self.max_sessions:
+                break
+            self._sessions.popitem(last=False)
+            del self._last_seen[oldest]
+
+    def append(self, session_id: str, messages: List[Dict[str, Any]]):
+        now = time.time()
+        with self._lock:
+            history = self._sessions.get(session_id)
+            if history is None:
+                history = self._sessions[session_id] = deque(maxlen=self.max_messages)
+            else:
+                self._sessions.move_to_end(session_id)
+            history.extend(messages)
+            self._last_seen[session_id] = now
+            self._expire(now)
+
+    def history(self, session_id: str) -> List[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            history = self._sessions.get(session_id)
+            if history is None:
+                return []
+            self._sessions.move_to_end(session_id)
+            self._last_seen[session_id] = now
+            return list(history)
+
+    def clear(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+            self._last_seen.pop(session_id, None)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+
+class SqliteSessionBackend:
+    """On-disk backend; histories survive restarts and can be shared by workers on one host"""
+
+    blocking = True
+
+    def __init__(self, path: str, max_messages: int, max_sessions: int = 10000, idle_ttl: float = 7200):
+        self.path = os.path.expanduser(path)
+        self.max_messages = max_messages
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS session_messages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id TEXT NOT NULL,
+                payload TEXT NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS session_messages_sid ON session_messages (session_id, id)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS sessions (session_id TEXT PRIMARY KEY, last_seen REAL NOT NULL)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS sessions_seen ON sessions (last_seen)")
+
+    def _expire(self, now: float):
+        expired = [row[0] for row in self._conn.execute(
+            "SELECT session_id FROM sessions WHERE last_seen < ?", (now - self.idle_ttl,))]
+        overflow = self._conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0] - len(expired) - self.max_sessions
+        if overflow > 0:
+            expired += [row[0] for row in self._conn.execute(
+                "SELECT session_id FROM sessions WHERE last_seen >= ? ORDER BY last_seen LIMIT ?",
+                (now - self.idle_ttl, overflow))]
+        for session_id in expired:
+            self._conn.execute("DELETE FROM session_messages WHERE session_id = ?", (session_id,))
+            self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    def append(self, session_id: str, messages: List[Dict[str, Any]]):
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                "INSERT INTO session_messages (session_id, payload) VALUES (?, ?)",
+                [(session_id, json.dumps(m)) for m in messages],
+            )
+            self._conn.execute(
+                """
+                DELETE FROM session_messages WHERE session_id = ? AND id NOT IN (
+                    SELECT id FROM session_messages WHERE session_id = ? ORDER BY id DESC LIMIT ?)
+                """,
+                (session_id, session_id, self.max_messages),
+            )
+            self._conn.execute(
+                "INSERT INTO sessions (session_id, last_seen) VALUES (?, ?) "
+                "ON CONFLICT(session_id) DO UPDATE SET last_seen = excluded.last_seen",
+                (session_id, now),
+            )
+            self._expire(now)
+            self._conn.execute("COMMIT")
+
+    def history(self, session_id: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT payload FROM session_messages WHERE session_id = ? ORDER BY id", (session_id,)
+            ).fetchall()
+            if rows:
+                self._conn.execute("UPDATE sessions SET last_seen = ? WHERE session_id = ?", (time.time(), session_id))
+        return [json.loads(row[0]) for row in rows]
+
+    def clear(self, session_id: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM session_messages WHERE session_id = ?", (session_id,))
+            self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class RedisSessionBackend:
+    """
+    Redis-compatible backend (Redis, Valkey, KeyDB...). Each session is a capped
+    list that expires after `idle_ttl`, so the server handles eviction. Any
+    client exposing rpush/ltrim/lrange/expire/delete can be passed in.
+    """
+
+    blocking = True
+
+    def __init__(self, max_messages: int, idle_ttl: float = 7200, url: str = "redis://localhost:6379/0",
+                 client: Any = None, prefix: str = "wakamate:session:"):
+        if client is None:
+            try:
+                import redis
+            except ImportError as e:
+                raise ImportError("session_backend 'redis' requires the redis package: pip install redis") from e
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.max_messages = max_messages
+        self.idle_ttl = int(idle_ttl)
+        self.prefix = prefix
+
+    def append(self, session_id: str, messages: List[Dict[str, Any]]):
+        key = self.prefix + session_id
+        self.client.rpush(key, *[json.dumps(m) for m in messages])
+        self.client.ltrim(key, -self.max_messages, -1)
+        self.client.expire(key, self.idle_ttl)
+
+    def history(self, session_id: str) -> List[Dict[str, Any]]:
+        return [json.loads(item) for item in self.client.lrange(self.prefix + session_id, 0, -1)]
+
+    def clear(self, session_id: str):
+        self.client.delete(self.prefix + session_id)
+
+
+class SessionStore:
+    """
+    Conversation histories keyed by session, bounded per session and in total.
+    Async handlers use the *_async methods, which move file and network backends
+    to a worker thread so a turn never blocks the event loop.
+    """
+
+    def __init__(self, backend: Any):
+        self.backend = backend
+
+    async def _call(self, fn, *args):
+        if getattr(self.backend, "blocking", True):
+            return await asyncio.to_thread(fn, *args)
+        return fn(*args)
+
+    def history(self, session_id: str) -> List[Dict[str, Any]]:
+        return self.backend.history(session_id)
+
+    def record_turn(self, session_id: str, user_message: str, assistant_message: str):
+        # Ephemeral sessions are never read again, so storing them only evicts real ones
+        if is_ephemeral(session_id):
+            return
+        timestamp = datetime.now().isoformat()
+        self.backend.append(session_id, [
+            {"role": "user", "content": user_message, "timestamp": timestamp},
+            {"role": "assistant", "content": assistant_message, "timestamp": timestamp},
+        ])
+
+    def exchange_count(self, session_id: str) -> int:
+        return len(self.history(session_id)) // 2
+
+    async def history_async(self, session_id: str) -> List[Dict[str, Any]]:
+        return await self._call(self.history, session_id)
+
+    async def record_turn_async(self, session_id: str, user_message: str, assistant_message: str):
+        await self._call(self.record_turn, session_id, user_message, assistant_message)
+
+    async def exchange_count_async(self, session_id: str) -> int:
+        return await self._call(self.exchange_count, session_id)
+
+    def clear(self, session_id: str):
+        self.backend.clear(session_id)
+
+    def close(self):
+        close = getattr(self.backend, "close", None)
+        if close:
+            close()
+
+
+def create_session_store(backend: str = "memory",
+                         max_messages: int = 30,
+                         max_sessions: int = 10000,
+                         idle_ttl: float = 7200,
+                         path: str = "~/.wakamate/sessions.sqlite3",
+                         redis_url: str = "redis://localhost:6379/0") -> SessionStore:
+    """Build a session store from workflow config values"""
+    if backend == "memory":
+        return SessionStore(InMemorySessionBackend(max_messages, max_sessions, idle_ttl))
+    if backend == "sqlite":
+        return SessionStore(SqliteSessionBackend(path, max_messages, max_sessions, idle_ttl))
+    if backend == "redis":
+        return SessionStore(RedisSessionBackend(max_messages, idle_ttl, url=redis_url))
+    raise ValueError(f"Unknown session backend '{backend}' (expected memory, sqlite or redis)")
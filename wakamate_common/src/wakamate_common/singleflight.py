@@ -0,0 +1,137 @@
+import asyncio
+import functools
+import hashlib
+import logging
+import threading
+from dataclasses import asdict, dataclass
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_registry: List["FlightStats"] = []
+_registry_lock = threading.Lock()
+
+
+def token_key(token: str) -> str:
+    """Short, non-reversible per-user key for an auth token"""
+    return hashlib.sha256((token or "").strip().encode("utf-8")).hexdigest()[:16]
+
+
+@dataclass
+class FlightStats:
+    """Counters for one coalescing layer; `collapsed` calls never reached the backend"""
+    name: str
+    calls: int = 0
+    collapsed: int = 0
+
+    @property
+    def collapse_ratio(self) -> float:
+        total = self.calls + self.collapsed
+        return self.collapsed / total if total else 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {**asdict(self), "collapse_ratio": round(self.collapse_ratio, 4)}
+
+
+def flight_stats() -> List[Dict[str, Any]]:
+    """Snapshot of every coalescing layer created in this process"""
+    with _registry_lock:
+        return [stats.as_dict() for stats in _registry]
+
+
+def _register(name: str) -> FlightStats:
+    stats = FlightStats(name)
+    with _registry_lock:
+        _registry.append(stats)
+    return stats
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent async calls that share a key. The first caller starts the
+    work; callers arriving while it is in flight await the same task and receive
+    its result or exception. Nothing is cached once the call completes.
+    """
+
+    def __init__(self, name: str = "singleflight"):
+        self._inflight: Dict[Tuple[int, Hashable], asyncio.Task] = {}
+        self.stats = _register(name)
+
+    async def do(self, key: Hashable, fn: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        loop = asyncio.get_running_loop()
+        # Tasks belong to one event loop, so keys are scoped per loop
+        slot = (id(loop), key)
+        task = self._inflight.get(slot)
+        if task is None:
+            self.stats.calls += 1
+            task = loop.create_task(fn(*args, **kwargs))
+            self._inflight[slot] = task
+            task.add_done_callback(functools.partial(self._release, slot))
+        else:
+            self.stats.collapsed += 1
+            logger.debug(f"{self.stats.name}: joined in-flight call for {key!r}")
+        # A cancelled waiter must not cancel the call the others are waiting on
+        return await asyncio.shield(task)
+
+    def _release(self, slot: Tuple[int, Hashable], task: asyncio.Task):
+        if self._inflight.get(slot) is task:
+            del self._inflight[slot]
+
+    async def run_in_thread(self, key: Hashable, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Coalesce a blocking call and run it in the default executor"""
+        return await self.do(key, asyncio.to_thread, fn, *args, **kwargs)
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class ThreadSingleFlight:
+    """
+    Blocking counterpart of SingleFlight for code running in worker threads
+    (LangChain tools, geocoders). Followers block until the leader's call returns.
+    """
+
+    def __init__(self, name: str = "singleflight"):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self.stats = _register(name)
+
+    def do(self, key: Hashable, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.stats.calls += 1
+            else:
+                self.stats.collapsed += 1
+
+        if not leader:
+            logger.debug(f"{self.stats.name}: joined in-flight call for {key!r}")
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def __len__(self) -> int:
+        return len(self._calls)
@@ -0,0 +1,89 @@
+import math
+from typing import Dict, List, Sequence, Tuple
+
+# numpy is imported inside kmeans(): clustering only runs for very large manifests
+
+CLUSTER_MODES = ("auto", "district", "kmeans")
+
+# In auto mode, group by district only when this share of stops has one
+DISTRICT_COVERAGE = 0.8
+
+
+def kmeans(points: Sequence[Tuple[float, float]], k: int, seed: int = 0, iterations: int = 30) -> List[int]:
+    """
+    Lloyd's k-means with k-means++ seeding on locally projected (lat, lon).
+    Returns a cluster label per point; deterministic for a given seed.
+    """
+    import numpy as np
+
+    xy = np.asarray(points, dtype=np.float64)
+    n = len(xy)
+    k = max(1, min(k, n))
+    xy = np.column_stack([xy[:, 1] * math.cos(math.radians(float(xy[:, 0].mean()))), xy[:, 0]])
+    rng = np.random.default_rng(seed)
+
+    centres = np.empty((k, 2))
+    centres[0] = xy[rng.integers(n)]
+    nearest = ((xy - centres[0]) ** 2).sum(axis=1)
+    for c in range(1, k):
+        total = nearest.sum()
+        pick = rng.choice(n, p=nearest / total) if total > 0 else rng.integers(n)
+        centres[c] = xy[pick]
+        nearest = np.minimum(nearest, ((xy - centres[c]) ** 2).sum(axis=1))
+
+    labels = np.zeros(n, dtype=np.int64)
+    for iteration in range(iterations):
+        # [n x k] squared distances; k stays small (n / cluster size)
+        distances = ((xy[:, None, :] - centres[None, :, :]) ** 2).sum(axis=2)
+        new_labels = distances.argmin(axis=1)
+        if iteration and (new_labels == labels).all():
+            break
+        labels = new_labels
+        for c in range(k):
+            members = xy[labels == c]
+            if len(members):
+                centres[c] = members.mean(axis=0)
+    return labels.tolist()
+
+
+def _split(indices: List[int], points: Sequence[Tuple[float, float]], max_size: int, seed: int) -> List[List[int]]:
+    """Break a group into k-means clusters of at most max_size stops"""
+    if len(indices) <= max_size:
+        return [indices]
+    labels = kmeans([points[i] for i in indices], math.ceil(len(indices) / max_size), seed=seed)
+    groups: Dict[int, List[int]] = {}
+    for i, label in zip(indices, labels):
+        groups.setdefault(label, []).append(i)
+    if len(groups) == 1:
+        # Identical coordinates: k-means cannot separate them, so chunk instead
+        return [indices[i:i + max_size] for i in range(0, len(indices), max_size)]
+    result = []
+    for group in groups.values():
+        result.extend(_split(group, points, max_size, seed + 1))
+    return result
+
+
+def cluster_stops(points: Sequence[Tuple[float, float]], districts: Sequence[str],
+                  max_size: int = 150, mode: str = "auto", seed: int = 0) -> List[List[int]]:
+    """
+    Partition stop indices into clusters of at most `max_size`. "district"
+    groups by Location.district first (stops without one, and districts that
+    are too big, are split with k-means); "kmeans" uses coordinates only;
+    "auto" picks district mode when most stops have a district.
+    """
+    if mode not in CLUSTER_MODES:
+        raise ValueError(f"cluster mode must be one of {CLUSTER_MODES}, got {mode!r}")
+    indices = list(range(len(points)))
+    if mode == "auto":
+        covered = sum(1 for district in districts if district)
+        mode = "district" if indices and covered / len(indices) >= DISTRICT_COVERAGE else "kmeans"
+    if mode == "kmeans":
+        return _split(indices, points, max_size, seed)
+
+    groups: Dict[str, List[int]] = {}
+    for i in indices:
+        groups.setdefault(districts[i] or "", []).append(i)
+    clusters = []
+    for group in groups.values():
+        clusters.extend(_split(group, points, max_size, seed))
+    return clusters
@@ -0,0 +1,575 @@
+import argparse
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from typing import Any, AsyncGenerator, Dict, List, Optional, Sequence, Tuple, Union
+
+from pydantic import Field
+
+from aiq.builder.builder import Builder
+from aiq.builder.function_info import FunctionInfo
+from aiq.cli.register_workflow import register_function
+from aiq.data_models.function import FunctionBaseConfig
+
+from wakamate_common.metrics import BACKEND_FETCH_ERRORS, BACKEND_FETCH_SECONDS, REQUEST_ERRORS, track_request
+
+from wakamate_deliver_route import progress, traffic_model
+from wakamate_deliver_route.instrumentation import span
+from wakamate_deliver_route.jobs import JobQueue, JobStore
+from wakamate_deliver_route.route_archive import save_route
+from wakamate_deliver_route.wakamate_deliver_route_function import (EnhancedRouteOptimizer, Location,
+                                                                    OptimizerSettings, _hhmm, load_road_network,
+                                                                    locate_in_lagos)
+
+# Morning dispatch without the chat agent: deliveries come straight from the
+# backend, are geocoded in bulk and optimised, and the plan is returned as
+# JSON. requests is imported on the first backend call.
+
+logger = logging.getLogger(__name__)
+
+DELIVERIES_ENDPOINT = "/api/getdeliveries"
+
+# Failed lookups are retried after a day; addresses that resolved are kept longer
+MISS_TTL_SECONDS = 24 * 3600
+
+
+class DispatchError(Exception):
+    """A dispatch request that cannot be planned (bad input, backend unreachable)"""
+
+
+class DeliveryDispatchConfig(FunctionBaseConfig, name="delivery_route_dispatch"):
+    """
+    Structured dispatch planning: backend deliveries in, optimised tour JSON out, no LLM
+    """
+    backend_url: str = Field(default="http://localhost:1050", description="Wakamate backend base URL")
+    auth_token: Optional[str] = Field(default=None, description="Bearer token for the backend deliveries API")
+    backend_timeout: float = Field(default=30.0, description="Seconds allowed for the deliveries call")
+    max_deliveries: int = Field(default=2000, description="Largest manifest one dispatch request may plan")
+    geocode_cache_path: str = Field(default="~/.wakamate/geocode.sqlite3", description="SQLite cache of geocoded addresses; empty disables")
+    geocode_cache_days: float = Field(default=90, description="Days a geocoded address is reused")
+    geocode_workers: int = Field(default=1, description="Concurrent geocoder lookups")
+    geocode_rate: float = Field(default=1.0, description="Geocoder lookups per second (the public Nominatim allows 1); 0 is unlimited")
+    road_network_dir: str = Field(default="", description="Preprocessed OSM road network; empty uses straight-line distances")
+    road_snap_max_m: float = Field(default=1500.0, description="Stops further than this from any road fall back to straight-line distances")
+    cluster_mode: str = Field(default="auto", description="Large manifests are clustered by: auto, district or kmeans")
+    cluster_threshold: int = Field(default=300, description="Stops above which a manifest is solved cluster by cluster")
+    cluster_max_size: int = Field(default=150, description="Most stops in one cluster")
+    cluster_workers: int = Field(default=4, description="Clusters solved concurrently")
+    solver_seed: int = Field(default=0, description="Seed for the solver's randomised steps (k-means clustering)")
+    solver_departure: str = Field(default="", description="HH:MM departure for requests that give none; empty departs now")
+    job_workers: int = Field(default=2, description="Background jobs solved concurrently")
+    job_store_path: str = Field(default="~/.wakamate/route_jobs.sqlite3", description="SQLite file keeping jobs across restarts; empty keeps them in memory")
+    job_keep_days: float = Field(default=7, description="Days finished jobs and their results are kept")
+    job_max_attempts: int = Field(default=3, description="Times a job interrupted by a crash is restarted before it is marked failed")
+    job_watch_interval: float = Field(default=1.0, description="Seconds between progress events when watching a job")
+    archive_dir: str = Field(default="", description="Directory receiving a route archive (coordinates, leg matrices, tour) per plan; empty disables")
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def _http_session():
+    """One keep-alive connection pool for every backend call from this process"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            import requests
+
+            _session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=16)
+            _session.mount("http://", adapter)
+            _session.mount("https://", adapter)
+        return _session
+
+
+def fetch_deliveries(backend_url: str, token: Optional[str] = None, ids: Sequence[str] = (),
+                     day: Optional[date] = None, timeout: float = 30.0) -> List[Dict[str, Any]]:
+    """
+    Deliveries from one GET of /api/getdeliveries, filtered by id and/or
+    delivery date (a UTC day). The filters go to the backend as query
+    parameters and are applied again here, so a backend that ignores them
+    still yields the right set. With ids, the result follows their order.
+    """
+    import requests
+
+    params = {}
+    if ids:
+        params["ids"] = ",".join(ids)
+    if day:
+        params["date"] = day.isoformat()
+    headers = {"Content-Type": "application/json"}
+    if token and token.strip():
+        headers["Authorization"] = f"Bearer {token.strip()}"
+
+    url = f"{backend_url.rstrip('/')}{DELIVERIES_ENDPOINT}"
+    start = time.perf_counter()
+    try:
+        response = _http_session().get(url, params=params, headers=headers, timeout=timeout)
+        BACKEND_FETCH_SECONDS.observe(DELIVERIES_ENDPOINT, value=time.perf_counter() - start)
+        response.raise_for_status()
+        deliveries = response.json().get("data") or []
+    except (requests.RequestException, ValueError, AttributeError) as e:
+        BACKEND_FETCH_ERRORS.inc(DELIVERIES_ENDPOINT)
+        raise DispatchError(f"Could not load deliveries from {url}: {e}") from e
+
+    if day:
+        deliveries = [d for d in deliveries if str(d.get("deliveryDate", ""))[:10] == day.isoformat()]
+    if ids:
+        by_id = {str(d.get("_id")): d for d in deliveries}
+        deliveries = [by_id[i] for i in ids if i in by_id]
+    return deliveries
+
+
+def _address_key(address: str) -> str:
+    return " ".join(address.lower().split())
+
+
+class GeocodeCache:
+    """Address → (lat, lon) on disk, including known misses, shared by dispatch runs on one host"""
+
+    def __init__(self, path: str, max_age_days: float = 90):
+        self.path = os.path.expanduser(path)
+        self.max_age = max_age_days * 86400
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS geocodes (
+                address TEXT PRIMARY KEY,
+                latitude REAL,
+                longitude REAL,
+                stored REAL NOT NULL
+            )
+        """)
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, Optional[Tuple[float, float]]]:
+        """Cached entries among `keys`; a None value is a recent miss"""
+        now = time.time()
+        found: Dict[str, Optional[Tuple[float, float]]] = {}
+        with self._lock:
+            for offset in range(0, len(keys), 500):
+                chunk = list(keys[offset:offset + 500])
+                rows = self._conn.execute(
+                    f"SELECT address, latitude, longitude, stored FROM geocodes "
+                    f"WHERE address IN ({','.join('?' * len(chunk))})", chunk)
+                for address, lat, lon, stored in rows:
+                    if lat is None:
+                        if now - stored <= MISS_TTL_SECONDS:
+                            found[address] = None
+                    elif now - stored <= self.max_age:
+                        found[address] = (lat, lon)
+        return found
+
+    def put(self, key: str, coordinates: Optional[Tuple[float, float]]):
+        lat, lon = coordinates if coordinates else (None, None)
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO geocodes VALUES (?, ?, ?, ?)", (key, lat, lon, time.time()))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class _RateLimiter:
+    """Spaces calls at least 1/rate seconds apart across threads"""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+# One limiter per rate, so concurrent dispatch jobs share the geocoder's allowance
+_limiters: Dict[float, _RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def _rate_limiter(rate: float) -> _RateLimiter:
+    with _limiters_lock:
+        limiter = _limiters.get(rate)
+        if limiter is None:
+            limiter = _limiters[rate] = _RateLimiter(rate)
+        return limiter
+
+
+def bulk_geocode(addresses: Sequence[str], cache: Optional[GeocodeCache] = None, workers: int = 1,
+                 rate: float = 1.0) -> Dict[str, Optional[Tuple[float, float]]]:
+    """
+    Coordinates for each distinct address (keyed by _address_key), None when
+    it cannot be placed in Lagos. Repeats are looked up once, the cache
+    answers what it can, and the rest go to the geocoder from `workers`
+    threads at no more than `rate` lookups per second.
+    """
+    keys = list(dict.fromkeys(_address_key(a) for a in addresses if a and a.strip()))
+    found = cache.get_many(keys) if cache is not None else {}
+    missing = [key for key in keys if key not in found]
+    if missing:
+        limiter = _rate_limiter(rate)
+        done = [0]
+        done_lock = threading.Lock()
+
+        def lookup(key: str) -> Optional[Tuple[float, float]]:
+            progress.report("geocode", geocoded=done[0], addresses=len(missing))
+            limiter.wait()
+            coordinates = locate_in_lagos(key, max_retries=1)
+            if cache is not None:
+                cache.put(key, coordinates)
+            with done_lock:
+                done[0] += 1
+            return coordinates
+
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            futures = [pool.submit(contextvars.copy_context().run, lookup, key) for key in missing]
+            found.update(zip(missing, (future.result() for future in futures)))
+    logger.info(f"Geocoded {len(keys)} addresses: {len(keys) - len(missing)} cached, {len(missing)} looked up")
+    return found
+
+
+def plan_dispatch(deliveries: Sequence[Dict[str, Any]], departure: Optional[datetime] = None,
+                  seed: Optional[int] = None, cache: Optional[GeocodeCache] = None,
+                  geocode_workers: int = 1, geocode_rate: float = 1.0, archive_dir: str = "",
+                  settings: Optional[OptimizerSettings] = None, network=None) -> Dict[str, Any]:
+    """
+    Geocode and optimise backend delivery records into a JSON-ready plan:
+    the tour with ETAs and per-leg distances and times, deliveries that
+    could not be located, route quality and the solve fingerprint. The solve
+    uses `settings` over the road `network` (None: straight lines). With
+    `archive_dir`, the solve is also saved there as a route archive named
+    after its fingerprint (see route_archive).
+    """
+    started = time.perf_counter()
+    with span("route.dispatch.geocode"):
+        coordinates = bulk_geocode([d.get("deliveryAddress") or "" for d in deliveries], cache,
+                                   geocode_workers, geocode_rate)
+    geocode_seconds = time.perf_counter() - started
+
+    stops: List[Tuple[Dict[str, Any], Location]] = []
+    unlocated = []
+    for delivery in deliveries:
+        address = delivery.get("deliveryAddress") or ""
+        point = coordinates.get(_address_key(address))
+        if point is None:
+            unlocated.append({"delivery_id": str(delivery.get("_id", "")), "address": address})
+            continue
+        stops.append((delivery, Location(name=delivery.get("customerName") or f"Stop {len(stops) + 1}",
+                                         address=address, latitude=point[0], longitude=point[1])))
+
+    optimizer = EnhancedRouteOptimizer(settings, network)
+    departure = optimizer.resolve_departure(departure)
+    solve_started = time.perf_counter()
+    if len(stops) >= 2:
+        route, distance, insights = optimizer.advanced_tsp_optimization([loc for _, loc in stops], departure, seed)
+    else:
+        route, distance, insights = list(range(len(stops))), 0.0, []
+    solve_seconds = time.perf_counter() - solve_started
+
+    archive = None
+    if archive_dir and len(stops) >= 2:
+        with span("route.dispatch.archive"):
+            try:
+                archive = save_route(os.path.join(os.path.expanduser(archive_dir), optimizer.last_solve["fingerprint"]),
+                                     [loc for _, loc in stops], route, optimizer.last_solve, distance,
+                                     optimizer.last_oracle, network=network)
+            except ImportError as e:
+                raise DispatchError(f"archive_dir is set but route archives are unavailable: {e}") from None
+
+    # Arrival at each stop. The van starts at the first stop and leaves it at
+    # the departure time (as the solver times it); every later stop is served
+    # before the next leg
+    tour = []
+    clock = float(traffic_model.minute_of_day(departure))
+    for position, index in enumerate(route):
+        delivery, loc = stops[index]
+        leg = insights[position - 1] if position else None
+        if leg:
+            clock += traffic_model.SERVICE_MINUTES if position > 1 else 0
+            clock += leg["estimated_time"] * 60
+        tour.append({
+            "position": position + 1,
+            "delivery_id": str(delivery.get("_id", "")),
+            "customer": delivery.get("customerName", ""),
+            "phone": delivery.get("phoneNumber", ""),
+            "address": loc.address,
+            "latitude": loc.latitude,
+            "longitude": loc.longitude,
+            "priority": delivery.get("priority", ""),
+            "notes": delivery.get("additionalNotes", ""),
+            "eta": _hhmm(clock),
+            "leg_distance_km": round(leg["distance"], 3) if leg else 0.0,
+            "leg_minutes": round(leg["estimated_time"] * 60, 1) if leg else 0.0,
+        })
+
+    solve = optimizer.last_solve
+    driving_hours = sum(leg["estimated_time"] for leg in insights)
+    return {
+        "deliveries": len(deliveries),
+        "stops": len(stops),
+        "unlocated": unlocated,
+        "departure": departure.strftime("%H:%M"),
+        "finish": _hhmm(clock + (traffic_model.SERVICE_MINUTES if len(tour) > 1 else 0)),
+        "total_distance_km": round(sum(leg["distance"] for leg in insights), 3),
+        "driving_hours": round(driving_hours, 3),
+        "service_hours": round(max(len(tour) - 1, 0) * traffic_model.SERVICE_MINUTES / 60, 3),
+        "tour": tour,
+        "solver": {key: solve.get(key) for key in ("mode", "clusters", "seed", "two_opt_passes")} if solve else {},
+        "quality": solve.get("quality", {}),
+        "fingerprint": solve.get("fingerprint"),
+        "input_fingerprint": solve.get("input_fingerprint"),
+        "timings": {"geocode_s": round(geocode_seconds, 3), "solve_s": round(solve_seconds, 3)},
+        "archive": archive,
+    }
+
+
+def _parse_day(value: Any) -> Optional[date]:
+    if value in (None, ""):
+        return None
+    text = str(value).strip().lower()
+    if text in ("today", "tomorrow"):
+        return date.today() + timedelta(days=1 if text == "tomorrow" else 0)
+    try:
+        return date.fromisoformat(text)
+    except ValueError:
+        raise DispatchError(f"date must be YYYY-MM-DD, today or tomorrow, got {value!r}") from None
+
+
+def parse_body(message: str) -> Dict[str, Any]:
+    try:
+        body = json.loads(message)
+    except ValueError:
+        raise DispatchError('expected a JSON object such as {"date": "today", "departure": "07:30"}') from None
+    if not isinstance(body, dict):
+        raise DispatchError("expected a JSON object")
+    return body
+
+
+def parse_request(body: Union[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    A dispatch request: a JSON object with "ids" (list or comma-separated)
+    and/or "date" (YYYY-MM-DD, "today", "tomorrow") of backend deliveries,
+    or a list of "addresses" to plan without the backend, plus optional
+    "departure" (HH:MM) and "seed".
+    """
+    if isinstance(body, str):
+        body = parse_body(body)
+    ids = body.get("ids") or []
+    if isinstance(ids, str):
+        ids = ids.split(",")
+    if not isinstance(ids, list):
+        raise DispatchError('"ids" must be a list or a comma-separated string')
+    ids = [str(i).strip() for i in ids if str(i).strip()]
+    day = _parse_day(body.get("date"))
+    addresses = body.get("addresses") or []
+    if not isinstance(addresses, list):
+        raise DispatchError('"addresses" must be a list')
+    addresses = [str(a).strip() for a in addresses if str(a).strip()]
+    if addresses and ids:
+        raise DispatchError('give either "addresses" or delivery "ids", not both')
+    if not ids and day is None and not addresses:
+        raise DispatchError('give delivery "ids", a "date", or both (or a list of "addresses")')
+    departure = None
+    if body.get("departure"):
+        try:
+            clock = datetime.strptime(str(body["departure"]).strip(), "%H:%M").time()
+        except ValueError:
+            raise DispatchError(f"departure must be HH:MM, got {body['departure']!r}") from None
+        departure = datetime.combine(day or date.today(), clock)
+    seed = body.get("seed")
+    if seed is not None and (not isinstance(seed, int) or isinstance(seed, bool)):
+        raise DispatchError("seed must be an integer")
+    return {"ids": ids, "day": day, "addresses": addresses, "departure": departure, "seed": seed}
+
+
+def run_dispatch(request: Dict[str, Any], backend_url: str, token: Optional[str] = None, timeout: float = 30.0,
+                 max_deliveries: int = 2000, cache: Optional[GeocodeCache] = None,
+                 geocode_workers: int = 1, geocode_rate: float = 1.0, archive_dir: str = "",
+                 settings: Optional[OptimizerSettings] = None, network=None) -> Dict[str, Any]:
+    """Fetch, geocode and plan one parsed request (see parse_request)"""
+    if request["addresses"]:
+        deliveries = [{"_id": str(i + 1), "customerName": f"Stop {i + 1}", "deliveryAddress": address}
+                      for i, address in enumerate(request["addresses"])]
+    else:
+        progress.report("fetch")
+        with span("route.dispatch.fetch"):
+            deliveries = fetch_deliveries(backend_url, token, request["ids"], request["day"], timeout)
+    if len(deliveries) > max_deliveries:
+        raise DispatchError(f"{len(deliveries)} deliveries match; at most {max_deliveries} can be planned at once")
+    plan = plan_dispatch(deliveries, request["departure"], request["seed"], cache, geocode_workers, geocode_rate,
+                         archive_dir, settings, network)
+    if request["ids"]:
+        found = {stop["delivery_id"] for stop in plan["tour"]} | {d["delivery_id"] for d in plan["unlocated"]}
+        plan["missing_ids"] = [i for i in request["ids"] if i not in found]
+    if request["day"]:
+        plan["date"] = request["day"].isoformat()
+    return plan
+
+
+def _solver(config: DeliveryDispatchConfig) -> Tuple[OptimizerSettings, Any]:
+    """The config's solver settings and road network (None: straight lines)"""
+    network = load_road_network(config.road_network_dir, config.road_snap_max_m) if config.road_network_dir else None
+    return OptimizerSettings.from_config(config), network
+
+
+# Actions on background jobs; a request without "action" is planned inline
+JOB_ACTIONS = ("submit", "status", "result", "cancel", "list", "watch")
+
+# Most jobs one "list" returns
+MAX_LIST_LIMIT = 500
+
+
+def _job_action(jobs: JobQueue, action: str, body: Dict[str, Any]) -> Dict[str, Any]:
+    """Run one non-streaming job action (see delivery_route_dispatch_function)"""
+    if action == "submit":
+        parse_request(body)  # reject bad requests now rather than in the worker
+        return jobs.submit("dispatch", body)
+    if action == "list":
+        limit = body.get("limit", 50)
+        if not isinstance(limit, int) or isinstance(limit, bool) or not 1 <= limit <= MAX_LIST_LIMIT:
+            raise DispatchError(f"limit must be an integer from 1 to {MAX_LIST_LIMIT}, got {limit!r}")
+        return {"jobs": jobs.list(limit)}
+    job_id = str(body.get("job_id") or "")
+    if not job_id:
+        raise DispatchError(f'"{action}" needs a "job_id"')
+    job = jobs.cancel(job_id) if action == "cancel" else jobs.get(job_id, with_result=action == "result")
+    if job is None:
+        raise DispatchError(f"no job {job_id}")
+    return job
+
+
+@register_function(config_type=DeliveryDispatchConfig)
+async def delivery_route_dispatch_function(config: DeliveryDispatchConfig, builder: Builder):
+    """
+    Plan a dispatch from backend deliveries. Input is a JSON request (see
+    parse_request); output is the plan as JSON, or {"error": ...}.
+
+    Large plans can run as background jobs instead of inside the request:
+    {"action": "submit", ...request} returns a job id, then "status"
+    (progress: stage, best_hours, iteration, elapsed_s), "result", "cancel"
+    and "list" take {"job_id": ...}. On the streaming endpoint (SSE),
+    "watch" and "submit" send a job snapshot at each progress change until
+    the job finishes.
+    """
+    settings, network = _solver(config)
+    cache = GeocodeCache(config.geocode_cache_path, config.geocode_cache_days) if config.geocode_cache_path else None
+
+    def run(body: Dict[str, Any]) -> Dict[str, Any]:
+        return run_dispatch(parse_request(body), config.backend_url, config.auth_token, config.backend_timeout,
+                            config.max_deliveries, cache, config.geocode_workers, config.geocode_rate,
+                            config.archive_dir, settings, network)
+
+    jobs = JobQueue(JobStore(config.job_store_path, config.job_keep_days), {"dispatch": run},
+                    workers=config.job_workers, max_attempts=config.job_max_attempts).start()
+
+    async def _dispatch_fn(input_message: str) -> str:
+        with track_request("route", "dispatch"):
+            try:
+                body = parse_body(input_message)
+                action = body.pop("action", None)
+                if action is None:
+                    reply = await asyncio.to_thread(run, body)
+                elif action in JOB_ACTIONS and action != "watch":
+                    reply = await asyncio.to_thread(_job_action, jobs, action, body)
+                else:
+                    raise DispatchError(f"unknown action {action!r} (expected one of {', '.join(JOB_ACTIONS)}; "
+                                        "watch needs the streaming endpoint)")
+            except DispatchError as e:
+                REQUEST_ERRORS.inc("route", "dispatch")
+                logger.warning(f"Dispatch request rejected: {e}")
+                reply = {"error": str(e)}
+            return json.dumps(reply, ensure_ascii=False)
+
+    async def _dispatch_stream(input_message: str) -> AsyncGenerator[str, None]:
+        try:
+            body = parse_body(input_message)
+        except DispatchError as e:
+            yield json.dumps({"error": str(e)})
+            return
+        action = body.get("action")
+        if action not in ("watch", "submit"):
+            yield await _dispatch_fn(input_message)
+            return
+        job_id = body.get("job_id")
+        if action == "submit":
+            submitted = json.loads(await _dispatch_fn(input_message))
+            if "error" in submitted:
+                yield json.dumps(submitted, ensure_ascii=False)
+                return
+            job_id = submitted["job_id"]
+        if not job_id or await asyncio.to_thread(jobs.get, str(job_id), False) is None:
+            yield json.dumps({"error": f"no job {job_id}" if job_id else '"watch" needs a "job_id"'})
+            return
+        async for job in jobs.watch(str(job_id), config.job_watch_interval):
+            yield json.dumps(job, ensure_ascii=False)
+
+    try:
+        yield FunctionInfo.create(single_fn=_dispatch_fn, stream_fn=_dispatch_stream,
+                                  description="Optimise backend deliveries (by ids and/or date) into a JSON dispatch plan")
+    finally:
+        jobs.close()
+        jobs.store.close()
+        if cache is not None:
+            cache.close()
+
+
+def main(argv: Optional[Sequence[str]] = None):
+    parser = argparse.ArgumentParser(description="Plan a delivery dispatch from the Wakamate backend")
+    parser.add_argument("--date", help="Delivery date: YYYY-MM-DD, today or tomorrow")
+    parser.add_argument("--ids", default="", help="Comma-separated delivery ids")
+    parser.add_argument("--departure", help="HH:MM departure (default: solver departure, else now)")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--backend-url", default="http://localhost:1050")
+    parser.add_argument("--token", default=os.environ.get("WAKAMATE_TOKEN"), help="Backend bearer token (default $WAKAMATE_TOKEN)")
+    parser.add_argument("--road-network", default="", help="Preprocessed road network directory")
+    parser.add_argument("--geocode-cache", default="~/.wakamate/geocode.sqlite3", help="Empty disables the cache")
+    parser.add_argument("--geocode-rate", type=float, default=1.0)
+    parser.add_argument("--archive-dir", default="", help="Also save the solve as a route archive under this directory")
+    parser.add_argument("--output", "-o", help="Write the plan here instead of stdout")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+
+    config = DeliveryDispatchConfig(backend_url=args.backend_url, auth_token=args.token,
+                                    road_network_dir=args.road_network, geocode_cache_path=args.geocode_cache,
+                                    geocode_rate=args.geocode_rate, archive_dir=args.archive_dir)
+    settings, network = _solver(config)
+    cache = GeocodeCache(config.geocode_cache_path, config.geocode_cache_days) if config.geocode_cache_path else None
+    body = {"ids": args.ids, "date": args.date, "departure": args.departure, "seed": args.seed}
+    try:
+        plan = run_dispatch(parse_request(json.dumps(body)), config.backend_url, config.auth_token,
+                            config.backend_timeout, config.max_deliveries, cache,
+                            config.geocode_workers, config.geocode_rate, config.archive_dir, settings, network)
+    except DispatchError as e:
+        sys.exit(f"dispatch failed: {e}")
+    finally:
+        if cache is not None:
+            cache.close()
+
+    text = json.dumps(plan, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        print(f"{plan['stops']} stops planned, {len(plan['unlocated'])} unlocated -> {args.output}")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+import math
+from collections import OrderedDict
+from typing import Any, Iterator, Optional, Sequence, Tuple
+
+# numpy is imported when an oracle is built: registration must stay light
+
+EARTH_RADIUS_KM = 6371.0088
+
+# Average driving speed assumed for straight-line legs
+STRAIGHT_LINE_KMH = 25.0
+
+# Cost weight of a leg's ends, by Location.traffic_complexity
+COMPLEXITY_FACTORS = {"low": 1.0, "moderate": 1.3, "high": 1.7, "very_high": 2.3}
+
+# Road rows kept per oracle (256 rows of a 2000-stop set is about 8 MB), and
+# single road legs kept once their row is evicted (tour walks revisit them)
+CACHE_ROWS = 256
+CACHE_LEGS = 65536
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle km between points given in radians; numpy arrays broadcast"""
+    import numpy as np
+
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class DistanceOracle:
+    """
+    Leg distances and free-flow times for one stop set, computed on demand.
+    Straight-line legs are a haversine over the coordinate arrays and need no
+    storage. With a road network a leg costs a Dijkstra from its origin's
+    road node, so whole rows are computed and the last `cache_rows` of them
+    kept, plus up to `cache_legs` single legs; unroutable legs fall back to
+    straight lines. Memory is O(cache_rows x n), never O(n²), unless
+    free_flow_matrix() computed a small set's full matrices.
+
+    from_matrices() wraps precomputed [n x n] arrays instead (for example
+    memory-mapped from a route archive); legs are then read, not computed.
+    """
+
+    def __init__(self, points: Sequence[Tuple[float, float]], complexities: Sequence[str] = (),
+                 network=None, cache_rows: int = CACHE_ROWS, cache_legs: int = CACHE_LEGS):
+        import numpy as np
+
+        self.n = len(points)
+        coords = np.radians(np.asarray(points, dtype=np.float64).reshape(-1, 2))
+        self._lat, self._lon = coords[:, 0].copy(), coords[:, 1].copy()
+        self._lat_list, self._lon_list = self._lat.tolist(), self._lon.tolist()
+        self._cos_lat = np.cos(self._lat).tolist()
+        self._weight = np.array([COMPLEXITY_FACTORS.get(c, 1.3) for c in complexities] or [1.3] * self.n)
+        self._network = network
+        if network is not None:
+            self._nodes, self._snap_m = network.snap_points(points)
+        self._cache_rows = max(1, cache_rows)
+        self._cache_legs = max(0, cache_legs)
+        self._rows: "OrderedDict[int, Tuple]" = OrderedDict()
+        self._legs: "OrderedDict[Tuple[int, int], Tuple[float, float, bool]]" = OrderedDict()
+        self._matrices = None
+        self.rows_computed = 0
+        # Identifies where the distances come from, for caches keyed on them
+        self.source = "straight_line" if network is None else f"road:{id(network)}"
+
+    @classmethod
+    def from_matrices(cls, points: Sequence[Tuple[float, float]], complexities: Sequence[str], km, hours,
+                      routed=None, source: str = "matrices") -> "DistanceOracle":
+        """
+        Oracle over precomputed [n x n] km and free-flow hours (float32 is
+        enough), with `routed` marking road legs (None: all straight-line).
+        The arrays are used as given, so memory maps stay zero-copy.
+        """
+        oracle = cls(points, complexities)
+        oracle._matrices = (km, hours, routed)
+        oracle.source = source
+        return oracle
+
+    def subset(self, indices: Sequence[int]) -> "DistanceOracle":
+        """Oracle for the stops `indices` (in that order) of a matrix-backed oracle, or a fresh one otherwise"""
+        import numpy as np
+
+        points = np.stack([np.degrees(self._lat[indices]), np.degrees(self._lon[indices])], axis=1)
+        complexities = [_complexity_name(w) for w in self._weight[indices]]
+        if self._matrices is None:
+            return DistanceOracle(points, complexities, self._network, self._cache_rows, self._cache_legs)
+        block = np.ix_(indices, indices)
+        km, hours, routed = self._matrices
+        return DistanceOracle.from_matrices(points, complexities, km[block], hours[block],
+                                            None if routed is None else routed[block], self.source)
+
+    def blocks(self, block_rows: int = CACHE_ROWS) -> Iterator[Tuple[int, Any, Any, Any]]:
+        """(first row, km, hours, routed or None) for consecutive row blocks of the full matrices"""
+        for start in range(0, self.n, block_rows):
+            rows = range(start, min(start + block_rows, self.n))
+            if self._matrices is None:
+                yield (start, *self._compute(rows))
+            else:
+                km, hours, routed = self._matrices
+                yield start, km[rows.start:rows.stop], hours[rows.start:rows.stop], \
+                    None if routed is None else routed[rows.start:rows.stop]
+
+    @property
+    def routed_over_roads(self) -> bool:
+        return self._network is not None or (self._matrices is not None and self._matrices[2] is not None)
+
+    def _straight(self, rows):
+        """[rows x n] straight-line km"""
+        rows = list(rows)
+        return haversine_km(self._lat[rows, None], self._lon[rows, None], self._lat[None, :], self._lon[None, :])
+
+    def _compute(self, rows) -> Tuple:
+        """(km, free-flow hours, routed mask or None) for a block of rows"""
+        import numpy as np
+
+        km = self._straight(rows)
+        hours = km / STRAIGHT_LINE_KMH
+        routed = None
+        if self._network is not None:
+            seconds, metres = self._network.legs(list(rows), self._nodes, self._snap_m)
+            routed = ~np.isnan(seconds)
+            km[routed] = metres[routed] / 1000
+            hours[routed] = seconds[routed] / 3600
+        self.rows_computed += len(km)
+        return km, hours, routed
+
+    def _straight_km(self, i: int, j: int) -> float:
+        dlat = self._lat_list[j] - self._lat_list[i]
+        dlon = self._lon_list[j] - self._lon_list[i]
+        a = math.sin(dlat / 2) ** 2 + self._cos_lat[i] * self._cos_lat[j] * math.sin(dlon / 2) ** 2
+        return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(a, 1.0)))
+
+    def leg(self, i: int, j: int) -> Tuple[float, float, bool]:
+        """(km, free-flow hours, routed over roads) for one leg"""
+        if self._matrices is not None:
+            km, hours, routed = self._matrices
+            return float(km[i, j]), float(hours[i, j]), routed is not None and bool(routed[i, j])
+        if self._network is None:
+            km = self._straight_km(i, j)
+            return km, km / STRAIGHT_LINE_KMH, False
+        leg = self._legs.get((i, j))
+        if leg is not None:
+            return leg
+        km, hours, routed = self.row(i)
+        leg = (float(km[j]), float(hours[j]), bool(routed[j]))
+        if self._cache_legs:
+            self._legs[(i, j)] = leg
+            if len(self._legs) > self._cache_legs:
+                self._legs.popitem(last=False)
+        return leg
+
+    def row(self, i: int) -> Tuple:
+        """(km, free-flow hours, routed mask or None) from stop i to every stop"""
+        if self._matrices is not None:
+            km, hours, routed = self._matrices
+            return km[i], hours[i], None if routed is None else routed[i]
+        cached = self._rows.get(i)
+        if cached is not None:
+            self._rows.move_to_end(i)
+            return cached
+        km, hours, routed = self._compute([i])
+        cached = (km[0], hours[0], None if routed is None else routed[0])
+        self._rows[i] = cached
+        if len(self._rows) > self._cache_rows:
+            self._rows.popitem(last=False)
+        return cached
+
+    def km(self, i: int, j: int) -> float:
+        return self.leg(i, j)[0]
+
+    def free_flow_hours(self, i: int, j: int) -> float:
+        return self.leg(i, j)[1]
+
+    def cost(self, i: int, j: int) -> float:
+        """Distance weighted by the complexity of both ends (the optimizer's distance figure)"""
+        return self.km(i, j) * float(self._weight[i] + self._weight[j]) / 2
+
+    def road_leg(self, i: int, j: int) -> Optional[Tuple[float, float]]:
+        """(metres, free-flow seconds) when the leg was routed over the road network"""
+        km, hours, routed = self.leg(i, j)
+        return (km * 1000, hours * 3600) if routed else None
+
+    def path_legs(self, order: Sequence[int], block_rows: int = CACHE_ROWS) -> Tuple[Any, Any]:
+        """
+        (km, free-flow hours) of each consecutive leg of `order`, costed in
+        batches: road origins whose rows are not cached are routed
+        `block_rows` at a time in one network call each, instead of one
+        Dijkstra per leg.
+        """
+        import numpy as np
+
+        order = np.asarray(order, dtype=np.int64)
+        origins, targets = order[:-1], order[1:]
+        if self._matrices is not None:
+            km, hours, _ = self._matrices
+            return np.asarray(km[origins, targets], dtype=np.float64), np.asarray(hours[origins, targets], dtype=np.float64)
+        if self._network is None:
+            km = haversine_km(self._lat[origins], self._lon[origins], self._lat[targets], self._lon[targets])
+            return km, km / STRAIGHT_LINE_KMH
+        km, hours = np.empty(len(origins)), np.empty(len(origins))
+        missing = []
+        for p, (i, j) in enumerate(zip(origins.tolist(), targets.tolist())):
+            row = self._rows.get(i)
+            if row is None:
+                missing.append(p)
+            else:
+                km[p], hours[p] = row[0][j], row[1][j]
+        missing = np.asarray(missing, dtype=np.int64)
+        for start in range(0, len(missing), block_rows):
+            block = missing[start:start + block_rows]
+            block_km, block_hours, _ = self._compute(origins[block])
+            km[block] = block_km[np.arange(len(block)), targets[block]]
+            hours[block] = block_hours[np.arange(len(block)), targets[block]]
+        return km, hours
+
+    def free_flow_matrix(self):
+        """
+        Full [n x n] free-flow hours in one batch (small stop sets only). The
+        computed km, hours and routed blocks are kept and serve every later
+        leg, so each origin is routed once per solve.
+        """
+        if self._matrices is None:
+            self._matrices = self._compute(range(self.n))
+            self._rows.clear()
+            self._legs.clear()
+        return self._matrices[1]
+
+
+def _complexity_name(weight: float) -> str:
+    """Inverse of COMPLEXITY_FACTORS (unknown complexities weigh as moderate)"""
+    return min(COMPLEXITY_FACTORS, key=lambda name: abs(COMPLEXITY_FACTORS[name] - weight))
@@ -0,0 +1,38 @@
+import hashlib
+import json
+from typing import Any, Dict, Iterable, Sequence, Tuple
+
+# Bump whenever the solver can return a different tour for the same inputs
+# (heuristics, traffic profiles, cost model), so stale cached results and
+# benchmark baselines stop matching
+SOLVER_VERSION = 1
+
+# Coordinates are fingerprinted at ~0.1 m, the precision the solver can see
+COORD_DIGITS = 6
+
+
+def _digest(payload: Any) -> str:
+    text = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def input_fingerprint(stops: Iterable[Tuple[float, float, str, str]], departure_minute: int, seed: int,
+                      settings: Dict[str, Any]) -> str:
+    """
+    Identify one solve's inputs: each stop's (lat, lon, district, complexity)
+    in order, the departure minute of day, the seed and every setting that
+    can change the tour. Equal fingerprints mean bit-identical results.
+    """
+    return _digest({
+        "solver": SOLVER_VERSION,
+        "stops": [[round(lat, COORD_DIGITS), round(lon, COORD_DIGITS), district or "", complexity or ""]
+                  for lat, lon, district, complexity in stops],
+        "departure_minute": departure_minute,
+        "seed": seed,
+        "settings": settings,
+    })
+
+
+def result_fingerprint(inputs: str, route: Sequence[int], distance: float) -> str:
+    """Identify a solve's output: its inputs, the visiting order and the distance figure"""
+    return _digest({"inputs": inputs, "route": list(route), "distance": repr(float(distance))})
@@ -0,0 +1,157 @@
+import contextlib
+import contextvars
+import functools
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, Optional
+
+from wakamate_common.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+SPAN_SECONDS = REGISTRY.histogram("wakamate_span_duration_seconds",
+                                  "Duration of instrumented pipeline stages", labels=("span",))
+SPAN_ERRORS = REGISTRY.counter("wakamate_span_errors_total",
+                               "Instrumented stages that raised", labels=("span",))
+
+_enabled = os.getenv("WAKAMATE_INSTRUMENTATION", "").lower() in ("1", "true", "yes")
+_tracer = None
+_collector: contextvars.ContextVar[Optional["SpanTimings"]] = contextvars.ContextVar("wakamate_span_timings",
+                                                                                      default=None)
+
+
+class SpanTimings:
+    """
+    Per-request totals: span name -> (seconds, calls). Worker threads share
+    the request's collector (cluster solves, geocoding), so updates are locked.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans: Dict[str, list] = {}
+        self._lock = threading.Lock()
+
+    def add(self, name: str, seconds: float):
+        with self._lock:
+            entry = self.spans.get(name)
+            if entry is None:
+                self.spans[name] = [seconds, 1]
+            else:
+                entry[0] += seconds
+                entry[1] += 1
+
+    def seconds(self, name: str) -> float:
+        return self.spans.get(name, (0.0, 0))[0]
+
+    def calls(self, name: str) -> int:
+        return self.spans.get(name, (0.0, 0))[1]
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, key: str, value: Any):
+        pass
+
+
+# Returned while instrumentation is off and no collector is active, so a disabled
+# span costs one call and two flag checks
+_NOOP = _NoopSpan()
+
+
+class _Span:
+    __slots__ = ("name", "collector", "start", "otel", "_otel_cm")
+
+    def __init__(self, name: str, collector: Optional[SpanTimings]):
+        self.name = name
+        self.collector = collector
+        self.otel = None
+        self._otel_cm = None
+
+    def __enter__(self):
+        if _tracer is not None:
+            self._otel_cm = _tracer.start_as_current_span(self.name)
+            self.otel = self._otel_cm.__enter__()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self.start
+        if self.collector is not None:
+            self.collector.add(self.name, seconds)
+        if _enabled:
+            SPAN_SECONDS.observe(self.name, value=seconds)
+            if exc_type is not None:
+                SPAN_ERRORS.inc(self.name)
+        if self._otel_cm is not None:
+            self._otel_cm.__exit__(exc_type, exc, tb)
+        return False
+
+    def set(self, key: str, value: Any):
+        """Attach an attribute (exported to OpenTelemetry only)"""
+        if self.otel is not None:
+            self.otel.set_attribute(key, value)
+
+
+def span(name: str):
+    """
+    Time a block under `name`. Durations go to the wakamate_span_duration_seconds
+    histogram when instrumentation is enabled, to an OpenTelemetry span when that
+    is configured, and to the active collect() for per-request reporting.
+    """
+    collector = _collector.get()
+    if not _enabled and collector is None:
+        return _NOOP
+    return _Span(name, collector)
+
+
+def timed(name: str) -> Callable:
+    """Decorator form of span() for functions and methods"""
+    def decorator(fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextlib.contextmanager
+def collect() -> Iterator[SpanTimings]:
+    """Record every span in this context (and tasks/threads started from it) into one SpanTimings"""
+    timings = SpanTimings()
+    token = _collector.set(timings)
+    try:
+        yield timings
+    finally:
+        _collector.reset(token)
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def configure(enabled: bool = True, opentelemetry: bool = False, service_name: str = "wakamate"):
+    """Switch span recording on or off; OpenTelemetry export needs opentelemetry-api installed"""
+    global _enabled, _tracer
+    _enabled = enabled
+    _tracer = None
+    if enabled and opentelemetry:
+        try:
+            from opentelemetry import trace
+        except ImportError:
+            logger.warning("opentelemetry-api is not installed; spans go to Prometheus metrics only")
+        else:
+            _tracer = trace.get_tracer(service_name)
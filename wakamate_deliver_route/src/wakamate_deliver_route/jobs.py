@@ -0,0 +1,289 @@
+import asyncio
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+from wakamate_common.metrics import REGISTRY
+
+from wakamate_deliver_route import progress
+
+logger = logging.getLogger(__name__)
+
+JOBS_FINISHED = REGISTRY.counter("wakamate_route_jobs_total", "Route jobs finished, by kind and status",
+                                 labels=("kind", "status"))
+JOBS_QUEUED = REGISTRY.gauge("wakamate_route_jobs_queued", "Route jobs waiting for a worker")
+JOBS_RUNNING = REGISTRY.gauge("wakamate_route_jobs_running", "Route jobs being solved")
+
+TERMINAL = ("done", "failed", "cancelled")
+
+
+class JobStore:
+    """
+    Jobs on disk (or in memory for path ""), so queued and interrupted jobs
+    survive a restart. Finished jobs are dropped after `keep_days`.
+    """
+
+    def __init__(self, path: str = "", keep_days: float = 7):
+        self.path = os.path.expanduser(path) if path else ":memory:"
+        self.keep = keep_days * 86400
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        if path:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS route_jobs (
+                id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                status TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                progress TEXT,
+                result TEXT,
+                error TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                created REAL NOT NULL,
+                updated REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS route_jobs_status ON route_jobs (status, created)")
+
+    @staticmethod
+    def _row(row) -> Dict[str, Any]:
+        job_id, kind, status, payload, job_progress, result, error, attempts, created, updated = row
+        return {
+            "job_id": job_id,
+            "kind": kind,
+            "status": status,
+            "payload": json.loads(payload),
+            "progress": json.loads(job_progress) if job_progress else {},
+            "result": json.loads(result) if result else None,
+            "error": error,
+            "attempts": attempts,
+            "created": created,
+            "updated": updated,
+        }
+
+    def add(self, kind: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        now = time.time()
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO route_jobs (id, kind, status, payload, created, updated) VALUES (?, ?, 'queued', ?, ?, ?)",
+                (job_id, kind, json.dumps(payload), now, now))
+            self._conn.execute("DELETE FROM route_jobs WHERE status IN (?, ?, ?) AND updated < ?",
+                               (*TERMINAL, now - self.keep))
+        return self.get(job_id)
+
+    def update(self, job_id: str, **fields: Any):
+        """Set columns; progress and result are stored as JSON"""
+        fields["updated"] = time.time()
+        for key in ("progress", "result"):
+            if key in fields and fields[key] is not None:
+                fields[key] = json.dumps(fields[key], ensure_ascii=False)
+        with self._lock:
+            self._conn.execute(f"UPDATE route_jobs SET {', '.join(f'{key} = ?' for key in fields)} WHERE id = ?",
+                               (*fields.values(), job_id))
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM route_jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row(row) if row else None
+
+    def list(self, limit: int = 50) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM route_jobs ORDER BY created DESC LIMIT ?", (limit,)).fetchall()
+        return [self._row(row) for row in rows]
+
+    def unfinished(self) -> List[str]:
+        """Queued jobs and jobs interrupted while running, oldest first"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id FROM route_jobs WHERE status IN ('queued', 'running') ORDER BY created").fetchall()
+        return [row[0] for row in rows]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class JobQueue:
+    """
+    Long optimisations off the request path. Jobs are stored, then solved by
+    `workers` threads with runners[kind](payload) -> result dict. Progress
+    reported by the solver (see progress.report) is kept in memory and written
+    to the store at most every `save_interval` seconds. Cancelling stops a
+    running job at its next progress checkpoint. Jobs still queued or running
+    at shutdown are picked up again by the next queue on the same store; a
+    job whose run was cut short `max_attempts` times (the process died while
+    solving it) is marked failed instead of being retried forever.
+    """
+
+    def __init__(self, store: JobStore, runners: Dict[str, Callable[[Dict[str, Any]], Dict[str, Any]]],
+                 workers: int = 2, save_interval: float = 1.0, max_attempts: int = 3):
+        self.store = store
+        self.runners = runners
+        self.workers = max(1, workers)
+        self.save_interval = save_interval
+        self.max_attempts = max(1, max_attempts)
+        self._queue: "queue.Queue[Optional[str]]" = queue.Queue()
+        self._threads: List[threading.Thread] = []
+        self._running: Dict[str, threading.Event] = {}
+        self._live: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._stopping = False
+
+    def start(self) -> "JobQueue":
+        resumed = self.store.unfinished()
+        for job_id in resumed:
+            self.store.update(job_id, status="queued")
+            self._queue.put(job_id)
+        if resumed:
+            logger.info(f"Resuming {len(resumed)} unfinished route jobs")
+        JOBS_QUEUED.set(value=self._queue.qsize())
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"route-job-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def submit(self, kind: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        if kind not in self.runners:
+            raise ValueError(f"Unknown job kind '{kind}' (expected {', '.join(sorted(self.runners))})")
+        job = self.store.add(kind, payload)
+        self._queue.put(job["job_id"])
+        JOBS_QUEUED.inc()
+        return self._public(job)
+
+    def get(self, job_id: str, with_result: bool = True) -> Optional[Dict[str, Any]]:
+        job = self.store.get(job_id)
+        if job is None:
+            return None
+        with self._lock:
+            live = self._live.get(job_id)
+            if live is not None:
+                job["progress"] = dict(live)
+        return self._public(job, with_result)
+
+    def list(self, limit: int = 50) -> List[Dict[str, Any]]:
+        return [self._public(job, with_result=False) for job in self.store.list(limit)]
+
+    def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Cancel a queued job now, or a running one at its next checkpoint"""
+        with self._lock:
+            job = self.store.get(job_id)
+            if job is None:
+                return None
+            event = self._running.get(job_id)
+            if event is not None:
+                event.set()
+            elif job["status"] == "queued":
+                self.store.update(job_id, status="cancelled")
+        return self.get(job_id, with_result=False)
+
+    async def watch(self, job_id: str, interval: float = 1.0) -> AsyncIterator[Dict[str, Any]]:
+        """Job snapshots whenever status or progress changes, ending with the finished job"""
+        last = None
+        while True:
+            job = await asyncio.to_thread(self.get, job_id)
+            if job is None:
+                return
+            terminal = job["status"] in TERMINAL
+            state = (job["status"], json.dumps(job["progress"], sort_keys=True))
+            if state != last or terminal:
+                last = state
+                yield job
+            if terminal:
+                return
+            await asyncio.sleep(interval)
+
+    def close(self, timeout: float = 10.0):
+        """Stop the workers; jobs they were solving stay queued for the next start"""
+        self._stopping = True
+        with self._lock:
+            for event in self._running.values():
+                event.set()
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    @staticmethod
+    def _public(job: Dict[str, Any], with_result: bool = True) -> Dict[str, Any]:
+        job = {key: value for key, value in job.items() if key != "payload"}
+        if not with_result:
+            job.pop("result", None)
+        return job
+
+    def _work(self):
+        while True:
+            job_id = self._queue.get()
+            if job_id is None:
+                return
+            JOBS_QUEUED.set(value=self._queue.qsize())
+            cancelled = threading.Event()
+            # Claimed under the lock so a concurrent cancel() sees either a
+            # queued job or a running one
+            with self._lock:
+                job = self.store.get(job_id)
+                if job is None or job["status"] != "queued" or self._stopping:
+                    continue
+                if job["attempts"] >= self.max_attempts:
+                    error = f"gave up after {job['attempts']} interrupted attempts"
+                    self.store.update(job_id, status="failed", error=error)
+                    JOBS_FINISHED.inc(job["kind"], "failed")
+                    logger.error(f"Route job {job_id} ({job['kind']}) {error}")
+                    continue
+                self._running[job_id] = cancelled
+                self._live[job_id] = {}
+                self.store.update(job_id, status="running", attempts=job["attempts"] + 1, progress={})
+            self._run(job, cancelled)
+
+    def _run(self, job: Dict[str, Any], cancelled: threading.Event):
+        job_id, kind = job["job_id"], job["kind"]
+        started = time.perf_counter()
+        saved = [0.0]
+        JOBS_RUNNING.inc()
+
+        def on_progress(stage: str, fields: Dict[str, Any]):
+            now = time.perf_counter()
+            snapshot = {"stage": stage, **fields, "elapsed_s": round(now - started, 2)}
+            with self._lock:
+                self._live[job_id] = snapshot
+                due = now - saved[0] >= self.save_interval
+                if due:
+                    saved[0] = now
+            if due:
+                self.store.update(job_id, progress=snapshot)
+
+        status, result, error = "done", None, None
+        try:
+            with progress.reporting(on_progress, cancelled):
+                result = self.runners[kind](job["payload"])
+        except progress.SolveCancelled:
+            # Interrupted by shutdown rather than a user: run again on restart
+            status = "queued" if self._stopping else "cancelled"
+        except Exception as e:
+            logger.exception(f"Route job {job_id} ({kind}) failed")
+            status, error = "failed", str(e)
+        finally:
+            with self._lock:
+                self._running.pop(job_id, None)
+                final = self._live.pop(job_id, {})
+            JOBS_RUNNING.dec()
+        fields: Dict[str, Any] = {}
+        if status == "queued":
+            # A clean shutdown is not the job's fault: don't count the attempt
+            fields["attempts"] = job["attempts"]
+        else:
+            final = {**final, "stage": status, "elapsed_s": round(time.perf_counter() - started, 2)}
+            JOBS_FINISHED.inc(kind, status)
+        self.store.update(job_id, status=status, progress=final, result=result, error=error, **fields)
+        logger.info(f"Route job {job_id} ({kind}) {status} after {time.perf_counter() - started:.1f}s")
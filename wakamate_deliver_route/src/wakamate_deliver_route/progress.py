@@ -0,0 +1,68 @@
+import contextlib
+import contextvars
+import threading
+from typing import Any, Callable, Dict, Iterator, Optional
+
+# Progress hooks for long solves. The solver calls report() at natural
+# checkpoints (each geocode, construction start, 2-opt pass, solved cluster);
+# outside a reporting() block that is one context-variable lookup. Inside
+# one, the callback sees the stage and figures such as best_hours and
+# iteration, and a cancelled block stops at the next checkpoint.
+
+
+class SolveCancelled(Exception):
+    """Raised at a progress checkpoint once the surrounding reporting() block is cancelled"""
+
+
+class _Reporter:
+    __slots__ = ("callback", "cancelled", "quiet")
+
+    def __init__(self, callback: Callable[[str, Dict[str, Any]], None], cancelled: threading.Event,
+                 quiet: bool = False):
+        self.callback = callback
+        self.cancelled = cancelled
+        self.quiet = quiet
+
+
+_reporter: contextvars.ContextVar[Optional[_Reporter]] = contextvars.ContextVar("wakamate_progress", default=None)
+
+
+def report(stage: str, **fields: Any):
+    """Checkpoint: raise SolveCancelled if cancelled, else pass `fields` to the active callback"""
+    reporter = _reporter.get()
+    if reporter is None:
+        return
+    if reporter.cancelled.is_set():
+        raise SolveCancelled(stage)
+    if not reporter.quiet:
+        reporter.callback(stage, fields)
+
+
+@contextlib.contextmanager
+def reporting(callback: Callable[[str, Dict[str, Any]], None],
+              cancelled: Optional[threading.Event] = None) -> Iterator[threading.Event]:
+    """
+    Send report() calls in this context (and threads started with a copy of
+    it) to `callback(stage, fields)`; setting the yielded event cancels.
+    The callback may be called from several threads.
+    """
+    cancelled = cancelled or threading.Event()
+    token = _reporter.set(_Reporter(callback, cancelled))
+    try:
+        yield cancelled
+    finally:
+        _reporter.reset(token)
+
+
+@contextlib.contextmanager
+def quiet() -> Iterator[None]:
+    """Keep cancellation checks but drop reports, for sub-solves whose figures would mislead"""
+    reporter = _reporter.get()
+    if reporter is None or reporter.quiet:
+        yield
+        return
+    token = _reporter.set(_Reporter(reporter.callback, reporter.cancelled, quiet=True))
+    try:
+        yield
+    finally:
+        _reporter.reset(token)
@@ -0,0 +1,106 @@
+import functools
+import logging
+import threading
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Bump the suffix whenever the bundled template changes
+REACT_PROMPT_VERSION = "hwchase17/react+wakamate.1"
+
+REQUIRED_VARIABLES = frozenset({"tools", "tool_names", "input", "agent_scratchpad"})
+
+HUB_FINAL_ANSWER = "Final Answer: the final answer to the original input question"
+FINAL_ANSWER = (
+    "Final Answer: Provide a complete response to the user's question. This should be the actual "
+    "answer they're looking for, not just a summary."
+)
+
+# hwchase17/react from the LangChain hub, with the Final Answer instruction made explicit
+REACT_TEMPLATE = f"""Answer the following questions as best you can. You have access to the following tools:
+
+{{tools}}
+
+Use the following format:
+
+Question: the input question you must answer
+Thought: you should always think about what to do
+Action: the action to take, should be one of [{{tool_names}}]
+Action Input: the input to the action
+Observation: the result of the action
+... (this Thought/Action/Action Input/Observation can repeat N times)
+Thought: I now know the final answer
+{FINAL_ANSWER}
+
+Begin!
+
+Question: {{input}}
+Thought:{{agent_scratchpad}}"""
+
+_lock = threading.Lock()
+_active_template = REACT_TEMPLATE
+_active_version = REACT_PROMPT_VERSION
+_refresh_thread: Optional[threading.Thread] = None
+
+
+@functools.lru_cache(maxsize=4)
+def _compile(template: str):
+    from langchain_core.prompts import PromptTemplate
+
+    return PromptTemplate.from_template(template)
+
+
+def get_react_prompt():
+    """
+    The ReAct prompt for create_react_agent. Compiled once per template and
+    shared by every workflow instance in the process; no network access.
+    """
+    with _lock:
+        template = _active_template
+    return _compile(template)
+
+
+def react_prompt_version() -> str:
+    with _lock:
+        return _active_version
+
+
+def _apply_hub_template(template: str, ref: str) -> bool:
+    """Adopt a hub template if the agent can still fill it; False when it is rejected or unchanged"""
+    global _active_template, _active_version
+    template = template.replace(HUB_FINAL_ANSWER, FINAL_ANSWER)
+    missing = REQUIRED_VARIABLES - set(_compile(template).input_variables)
+    if missing:
+        logger.warning(f"Ignoring hub prompt {ref}: missing variables {sorted(missing)}")
+        return False
+    with _lock:
+        if template == _active_template:
+            return False
+        _active_template = template
+        _active_version = f"{ref}@hub"
+    logger.info(f"ReAct prompt refreshed from hub ({ref}); applies to agents built from now on")
+    return True
+
+
+def refresh_from_hub(ref: str = "hwchase17/react") -> bool:
+    """Pull `ref` from the LangChain hub and use it for later builds. Blocking."""
+    try:
+        from langchain import hub
+
+        prompt = hub.pull(ref)
+        return _apply_hub_template(prompt.template, ref)
+    except Exception as e:
+        logger.info(f"Hub refresh of {ref} skipped, keeping {react_prompt_version()}: {e}")
+        return False
+
+
+def start_background_refresh(ref: str = "hwchase17/react") -> Optional[threading.Thread]:
+    """Refresh from the hub in a daemon thread, at most once per process"""
+    global _refresh_thread
+    with _lock:
+        if _refresh_thread is not None:
+            return None
+        _refresh_thread = threading.Thread(target=refresh_from_hub, args=(ref,),
+                                           name="react-prompt-refresh", daemon=True)
+    _refresh_thread.start()
+    return _refresh_thread
@@ -2,4 +2,5 @@
 # flake8: noqa
 
 # Import any tools which need to be automatically registered here
-from wakamate_deliver_route import wakamate_deliver_route_function
\ No newline at end of file
+from wakamate_deliver_route import wakamate_deliver_route_function
+from wakamate_deliver_route import dispatch
@@ -0,0 +1,496 @@
+import argparse
+import bz2
+import gzip
+import heapq
+import json
+import logging
+import math
+import os
+import re
+import threading
+import time
+import xml.etree.ElementTree as ET
+from array import array
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Bump when the on-disk layout changes; load() refuses other versions
+FORMAT_VERSION = 1
+
+# Free-flow speeds (km/h) per OSM highway class. Posted limits in Lagos are far
+# above what traffic allows, so a way's maxspeed can only lower these.
+DEFAULT_SPEEDS_KMH: Dict[str, float] = {
+    "motorway": 60, "motorway_link": 40,
+    "trunk": 50, "trunk_link": 35,
+    "primary": 40, "primary_link": 30,
+    "secondary": 32, "secondary_link": 25,
+    "tertiary": 28, "tertiary_link": 22,
+    "unclassified": 22, "residential": 18, "living_street": 10,
+    "service": 12, "road": 20,
+}
+
+# Speed between a stop and the road node it snaps to (gates, estates, side streets)
+ACCESS_SPEED_KMH = 15.0
+
+# Grid cell size in degrees for the node snapping index (~550 m around Lagos)
+CELL_DEGREES = 0.005
+
+EARTH_RADIUS_M = 6371008.8
+
+ONEWAY_FORWARD = {"yes", "true", "1"}
+ACCESS_DENIED = {"no", "private"}
+
+ARRAYS = ("indptr", "indices", "length_m", "time_s", "lat", "lon", "cell_keys")
+
+
+def haversine_m(lat1, lon1, lat2, lon2):
+    """Great-circle distance in metres; broadcasts over numpy arrays"""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(x, dtype=np.float64)) for x in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(a))
+
+
+@dataclass
+class RoadMatrix:
+    """Stop-to-stop fastest road paths; NaN where a stop could not be routed"""
+    seconds: np.ndarray
+    metres: np.ndarray
+    snap_m: np.ndarray
+
+    def leg(self, i: int, j: int) -> Optional[Tuple[float, float]]:
+        """(metres, seconds) from stop i to stop j, or None when unroutable"""
+        metres = float(self.metres[i, j])
+        if math.isnan(metres):
+            return None
+        return metres, float(self.seconds[i, j])
+
+
+class RoadNetwork:
+    """
+    Directed road graph in CSR form, loaded from the .npy files written by
+    build_road_network(). Arrays are memory-mapped, so a cold load only reads
+    the pages that queries touch. Nodes are stored in grid-cell order, which
+    keeps a neighbourhood's nodes and edges close together on disk and lets
+    `cell_keys` double as the snapping index.
+    """
+
+    def __init__(self, arrays: Dict[str, np.ndarray], meta: Dict, max_snap_m: float = 1500.0):
+        self.indptr = arrays["indptr"]
+        self.indices = arrays["indices"]
+        self.length_m = arrays["length_m"]
+        self.time_s = arrays["time_s"]
+        self.lat = arrays["lat"]
+        self.lon = arrays["lon"]
+        self.cell_keys = arrays["cell_keys"]
+        self.meta = meta
+        self.max_snap_m = max_snap_m
+        self._lat0 = meta["grid"]["lat0"]
+        self._lon0 = meta["grid"]["lon0"]
+        self._rows = meta["grid"]["rows"]
+        self._cols = meta["grid"]["cols"]
+        self._cell = meta["grid"]["cell_degrees"]
+        # Lower bound on the width of a cell, for the snapping search radius
+        self._cell_m = self._cell * math.pi / 180 * EARTH_RADIUS_M * math.cos(
+            math.radians(max(abs(self._lat0), abs(self._lat0 + self._rows * self._cell))))
+        self._lock = threading.Lock()
+        self._graph = None
+        self._edge_keys = None
+        self._lists = None
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True, max_snap_m: float = 1500.0) -> "RoadNetwork":
+        path = os.path.expanduser(path)
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("format") != FORMAT_VERSION:
+            raise ValueError(f"{path} has road network format {meta.get('format')}, expected {FORMAT_VERSION}; rebuild it")
+        started = time.perf_counter()
+        arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r" if mmap else None)
+                  for name in ARRAYS}
+        network = cls(arrays, meta, max_snap_m=max_snap_m)
+        logger.info(f"Road network {path}: {network.n_nodes} nodes, {network.n_edges} edges "
+                    f"loaded in {(time.perf_counter() - started) * 1000:.1f} ms")
+        return network
+
+    @property
+    def n_nodes(self) -> int:
+        return len(self.lat)
+
+    @property
+    def n_edges(self) -> int:
+        return len(self.indices)
+
+    def snap(self, lat: float, lon: float) -> Tuple[int, float]:
+        """Nearest road node and its distance in metres; (-1, inf) when none is within max_snap_m"""
+        row = math.floor((lat - self._lat0) / self._cell)
+        col = math.floor((lon - self._lon0) / self._cell)
+        radius = max(1, math.ceil(self.max_snap_m / self._cell_m))
+        for r in range(radius + 1):
+            rows = np.arange(max(row - r, 0), min(row + r, self._rows - 1) + 1)
+            cols = np.arange(max(col - r, 0), min(col + r, self._cols - 1) + 1)
+            if not len(rows) or not len(cols):
+                continue
+            keys = (rows[:, None] * self._cols + cols[None, :]).ravel()
+            lo = np.searchsorted(self.cell_keys, keys, side="left")
+            hi = np.searchsorted(self.cell_keys, keys, side="right")
+            spans = [np.arange(a, b) for a, b in zip(lo, hi) if b > a]
+            if not spans:
+                continue
+            candidates = np.concatenate(spans)
+            distances = haversine_m(lat, lon, self.lat[candidates], self.lon[candidates])
+            best = int(np.argmin(distances))
+            # Anything outside this square is at least r cells away
+            if distances[best] <= r * self._cell_m or r == radius:
+                if distances[best] > self.max_snap_m:
+                    break
+                return int(candidates[best]), float(distances[best])
+        return -1, math.inf
+
+    def shortest_paths(self, sources: Sequence[int], targets: Sequence[int]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Fastest paths from every source node to every target node as
+        ([sources x targets] seconds, metres along the same paths); inf when
+        unreachable. Uses scipy's multi-source Dijkstra when scipy is
+        installed, else a heap Dijkstra that stops once every target is settled.
+        """
+        sources = np.asarray(sources, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+        try:
+            from scipy.sparse.csgraph import dijkstra
+        except ImportError:
+            return self._python_paths(sources, targets)
+        return self._scipy_paths(dijkstra, sources, targets)
+
+    def snap_points(self, points: Sequence[Tuple[float, float]]) -> Tuple[np.ndarray, np.ndarray]:
+        """Road node and snap distance for each (lat, lon); node -1 and distance inf when off the network"""
+        snapped = [self.snap(lat, lon) for lat, lon in points]
+        nodes = np.array([node for node, _ in snapped], dtype=np.int64)
+        snap_m = np.array([metres for _, metres in snapped], dtype=np.float64)
+        return nodes, snap_m
+
+    def legs(self, sources: Sequence[int], nodes: np.ndarray, snap_m: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Road legs from the stops at `sources` to every stop, given
+        snap_points() output: ([sources x stops] seconds, metres) including
+        the access distance at both ends; NaN where either end is unroutable.
+        """
+        sources = np.asarray(sources, dtype=np.int64)
+        seconds = np.full((len(sources), len(nodes)), np.nan)
+        metres = np.full((len(sources), len(nodes)), np.nan)
+
+        rows = np.flatnonzero(nodes[sources] >= 0)
+        cols = np.flatnonzero(nodes >= 0)
+        if len(rows) and len(cols):
+            source_nodes = np.unique(nodes[sources[rows]])
+            target_nodes = np.unique(nodes[cols])
+            path_s, path_m = self.shortest_paths(source_nodes, target_nodes)
+            paths = np.ix_(np.searchsorted(source_nodes, nodes[sources[rows]]), np.searchsorted(target_nodes, nodes[cols]))
+            from_snap, to_snap = snap_m[sources[rows]][:, None], snap_m[cols][None, :]
+            block = np.ix_(rows, cols)
+            seconds[block] = path_s[paths] + (from_snap + to_snap) / (ACCESS_SPEED_KMH / 3.6)
+            metres[block] = path_m[paths] + from_snap + to_snap
+            unreachable = ~np.isfinite(seconds)
+            seconds[unreachable] = np.nan
+            metres[unreachable] = np.nan
+        seconds[np.arange(len(sources)), sources] = 0.0
+        metres[np.arange(len(sources)), sources] = 0.0
+        return seconds, metres
+
+    def matrix(self, points: Sequence[Tuple[float, float]]) -> RoadMatrix:
+        """Stop-to-stop road matrix for (lat, lon) points, including the walk to and from the road"""
+        nodes, snap_m = self.snap_points(points)
+        seconds, metres = self.legs(np.arange(len(points)), nodes, snap_m)
+        snap_m[nodes < 0] = np.nan
+        return RoadMatrix(seconds=seconds, metres=metres, snap_m=snap_m)
+
+    def _scipy_paths(self, dijkstra, sources: np.ndarray, targets: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        graph, edge_keys = self._csgraph()
+        seconds = np.empty((len(sources), len(targets)))
+        metres = np.zeros((len(sources), len(targets)))
+        # Each source row costs ~12 bytes per node; keep a chunk around 64 MB
+        chunk = max(1, int(64e6 // (12 * max(self.n_nodes, 1))))
+        for start in range(0, len(sources), chunk):
+            block = sources[start:start + chunk]
+            dist, pred = dijkstra(graph, directed=True, indices=block, return_predecessors=True)
+            for k, source in enumerate(block):
+                row = start + k
+                seconds[row] = dist[k, targets]
+                # Walk every target back to the source at once, adding edge lengths
+                current = targets.copy()
+                active = (current != source) & np.isfinite(seconds[row])
+                while active.any():
+                    child = current[active]
+                    parent = pred[k, child].astype(np.int64)
+                    edge = np.searchsorted(edge_keys, parent * self.n_nodes + child)
+                    metres[row, active] += self.length_m[edge]
+                    current[active] = parent
+                    active &= current != source
+        metres[~np.isfinite(seconds)] = np.inf
+        return seconds, metres
+
+    def _csgraph(self):
+        with self._lock:
+            if self._graph is None:
+                from scipy.sparse import csr_matrix
+
+                n = self.n_nodes
+                self._graph = csr_matrix((np.asarray(self.time_s, dtype=np.float64), self.indices, self.indptr),
+                                         shape=(n, n))
+                # Edges are sorted by (tail, head), so tail * n + head is sorted too
+                tails = np.repeat(np.arange(n, dtype=np.int64), np.diff(self.indptr))
+                self._edge_keys = tails * n + self.indices
+            return self._graph, self._edge_keys
+
+    def _python_paths(self, sources: np.ndarray, targets: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        with self._lock:
+            if self._lists is None:
+                self._lists = (self.indptr.tolist(), self.indices.tolist(),
+                               self.time_s.tolist(), self.length_m.tolist())
+            indptr, indices, time_s, length_m = self._lists
+        wanted = set(targets.tolist())
+        seconds = np.full((len(sources), len(targets)), np.inf)
+        metres = np.full((len(sources), len(targets)), np.inf)
+        for row, source in enumerate(sources.tolist()):
+            best = {source: 0.0}
+            along = {source: 0.0}
+            settled = set()
+            remaining = set(wanted)
+            heap = [(0.0, source)]
+            while heap and remaining:
+                cost, node = heapq.heappop(heap)
+                if node in settled:
+                    continue
+                settled.add(node)
+                remaining.discard(node)
+                for e in range(indptr[node], indptr[node + 1]):
+                    head = indices[e]
+                    candidate = cost + time_s[e]
+                    if candidate < best.get(head, math.inf):
+                        best[head] = candidate
+                        along[head] = along[node] + length_m[e]
+                        heapq.heappush(heap, (candidate, head))
+            for col, target in enumerate(targets.tolist()):
+                if target in settled:
+                    seconds[row, col] = best[target]
+                    metres[row, col] = along[target]
+        return seconds, metres
+
+
+def _open_osm(path: str):
+    if path.endswith(".bz2"):
+        return bz2.open(path, "rb")
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    return open(path, "rb")
+
+
+def _parse_maxspeed(value: Optional[str]) -> Optional[float]:
+    match = re.match(r"\s*(\d+(?:\.\d+)?)\s*(mph)?", value or "")
+    if not match:
+        return None
+    speed = float(match.group(1))
+    return speed * 1.609 if match.group(2) else speed
+
+
+def _way_directions(tags: Dict[str, str]) -> Tuple[bool, bool]:
+    """(forward, backward) travel allowed along the way's node order"""
+    oneway = tags.get("oneway", "").lower()
+    implied = tags.get("junction") in ("roundabout", "circular") or tags.get("highway") == "motorway"
+    if oneway == "-1":
+        return False, True
+    if oneway in ONEWAY_FORWARD or (implied and oneway != "no"):
+        return True, False
+    return True, True
+
+
+def _largest_component(n: int, tails: np.ndarray, heads: np.ndarray) -> np.ndarray:
+    """
+    Mask of the nodes in the largest strongly connected component (weakly
+    connected without scipy), so every snapped stop can reach every other.
+    """
+    try:
+        from scipy.sparse import csr_matrix
+        from scipy.sparse.csgraph import connected_components
+
+        graph = csr_matrix((np.ones(len(tails)), (tails, heads)), shape=(n, n))
+        _, labels = connected_components(graph, directed=True, connection="strong")
+    except ImportError:
+        parent = list(range(n))
+
+        def find(x):
+            while parent[x] != x:
+                parent[x] = parent[parent[x]]
+                x = parent[x]
+            return x
+
+        for a, b in zip(tails.tolist(), heads.tolist()):
+            ra, rb = find(a), find(b)
+            if ra != rb:
+                parent[ra] = rb
+        labels = np.array([find(x) for x in range(n)])
+    return labels == np.bincount(labels).argmax()
+
+
+def build_road_network(osm_path: str, out_dir: str, speeds: Optional[Dict[str, float]] = None) -> RoadNetwork:
+    """
+    Preprocess an OpenStreetMap XML extract (.osm, .osm.bz2 or .osm.gz) into
+    the memory-mappable layout RoadNetwork.load() reads. Keeps drivable ways,
+    honours one-ways, and drops nodes outside the largest connected component.
+    """
+    speeds = {**DEFAULT_SPEEDS_KMH, **(speeds or {})}
+    started = time.perf_counter()
+    node_ids, node_lat, node_lon = array("q"), array("d"), array("d")
+    tail_ids, head_ids, edge_kmh = array("q"), array("q"), array("d")
+
+    with _open_osm(osm_path) as f:
+        root = None
+        for event, elem in ET.iterparse(f, events=("start", "end")):
+            if root is None:
+                root = elem
+            if event != "end":
+                continue
+            if elem.tag == "node":
+                node_ids.append(int(elem.get("id")))
+                node_lat.append(float(elem.get("lat")))
+                node_lon.append(float(elem.get("lon")))
+                root.clear()
+            elif elem.tag == "way":
+                tags = {tag.get("k"): tag.get("v") for tag in elem.iter("tag")}
+                kmh = speeds.get(tags.get("highway"))
+                refs = [int(nd.get("ref")) for nd in elem.iter("nd")]
+                drivable = (kmh is not None and len(refs) > 1 and tags.get("area") != "yes"
+                            and tags.get("access") not in ACCESS_DENIED
+                            and tags.get("motor_vehicle") not in ACCESS_DENIED)
+                if drivable:
+                    posted = _parse_maxspeed(tags.get("maxspeed"))
+                    if posted:
+                        kmh = min(kmh, posted)
+                    forward, backward = _way_directions(tags)
+                    for a, b in zip(refs, refs[1:]):
+                        if forward:
+                            tail_ids.append(a)
+                            head_ids.append(b)
+                            edge_kmh.append(kmh)
+                        if backward:
+                            tail_ids.append(b)
+                            head_ids.append(a)
+                            edge_kmh.append(kmh)
+                root.clear()
+            elif elem.tag == "relation":
+                root.clear()
+
+    ids = np.frombuffer(node_ids, dtype=np.int64)
+    order = np.argsort(ids)
+    ids, lat, lon = ids[order], np.frombuffer(node_lat)[order], np.frombuffer(node_lon)[order]
+    tail_osm, head_osm = np.frombuffer(tail_ids, dtype=np.int64), np.frombuffer(head_ids, dtype=np.int64)
+    kmh = np.frombuffer(edge_kmh)
+    if not len(tail_osm) or not len(ids):
+        raise ValueError(f"No drivable ways in {osm_path}")
+
+    # Ways clipped at the extract boundary reference nodes that are not in the file
+    tails = np.minimum(np.searchsorted(ids, tail_osm), len(ids) - 1)
+    heads = np.minimum(np.searchsorted(ids, head_osm), len(ids) - 1)
+    present = (ids[tails] == tail_osm) & (ids[heads] == head_osm) & (tails != heads)
+    tails, heads, kmh = tails[present], heads[present], kmh[present]
+
+    used, inverse = np.unique(np.concatenate([tails, heads]), return_inverse=True)
+    tails, heads = inverse[:len(tails)], inverse[len(tails):]
+    lat, lon = lat[used], lon[used]
+
+    keep = _largest_component(len(used), tails, heads)
+    renumber = np.cumsum(keep) - 1
+    edges = keep[tails] & keep[heads]
+    tails, heads, kmh = renumber[tails[edges]], renumber[heads[edges]], kmh[edges]
+    lat, lon = lat[keep], lon[keep]
+
+    # Number nodes in grid-cell order so a cell's nodes are contiguous
+    lat0, lon0 = float(lat.min()), float(lon.min())
+    rows = int((lat.max() - lat0) // CELL_DEGREES) + 1
+    cols = int((lon.max() - lon0) // CELL_DEGREES) + 1
+    cell_keys = ((lat - lat0) // CELL_DEGREES).astype(np.int64) * cols + ((lon - lon0) // CELL_DEGREES).astype(np.int64)
+    spatial = np.argsort(cell_keys, kind="stable")
+    rank = np.empty_like(spatial)
+    rank[spatial] = np.arange(len(spatial))
+    tails, heads = rank[tails], rank[heads]
+    lat, lon, cell_keys = lat[spatial], lon[spatial], cell_keys[spatial]
+
+    length_m = haversine_m(lat[tails], lon[tails], lat[heads], lon[heads])
+    # csgraph ignores zero weights, so duplicate-coordinate edges get a floor
+    time_s = np.maximum(length_m / (kmh / 3.6), 1e-3)
+
+    # Sort by (tail, head, time) and keep the fastest of any parallel edges
+    order = np.lexsort((time_s, heads, tails))
+    tails, heads, length_m, time_s = tails[order], heads[order], length_m[order], time_s[order]
+    first = np.ones(len(tails), dtype=bool)
+    first[1:] = (tails[1:] != tails[:-1]) | (heads[1:] != heads[:-1])
+    tails, heads, length_m, time_s = tails[first], heads[first], length_m[first], time_s[first]
+
+    n = len(lat)
+    if len(tails) >= 2 ** 31:
+        raise ValueError("Road network too large for 32-bit edge indices")
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum(np.bincount(tails, minlength=n))
+
+    out_dir = os.path.expanduser(out_dir)
+    os.makedirs(out_dir, exist_ok=True)
+    arrays = {
+        "indptr": indptr.astype(np.int32),
+        "indices": heads.astype(np.int32),
+        "length_m": length_m.astype(np.float32),
+        "time_s": time_s.astype(np.float32),
+        "lat": lat,
+        "lon": lon,
+        "cell_keys": cell_keys,
+    }
+    for name, values in arrays.items():
+        np.save(os.path.join(out_dir, f"{name}.npy"), values)
+    meta = {
+        "format": FORMAT_VERSION,
+        "source": os.path.basename(osm_path),
+        "built": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "nodes": n,
+        "edges": int(len(tails)),
+        "dropped_nodes": int(len(keep) - keep.sum()),
+        "speeds_kmh": speeds,
+        "grid": {"lat0": lat0, "lon0": lon0, "rows": rows, "cols": cols, "cell_degrees": CELL_DEGREES},
+    }
+    # Written last: a directory without meta.json is an unfinished build
+    with open(os.path.join(out_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    logger.info(f"Built road network from {osm_path}: {n} nodes, {len(tails)} edges, "
+                f"{meta['dropped_nodes']} disconnected nodes dropped, {time.perf_counter() - started:.1f}s")
+    return RoadNetwork.load(out_dir)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Offline road network for the delivery route optimizer")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="Preprocess an OSM XML extract (e.g. a Lagos export, optionally .bz2)")
+    build.add_argument("osm_path")
+    build.add_argument("out_dir")
+    info = commands.add_parser("info", help="Load a preprocessed network and route between points")
+    info.add_argument("path")
+    info.add_argument("points", nargs="*", help="lat,lon pairs")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    if args.command == "build":
+        build_road_network(args.osm_path, args.out_dir)
+        return
+    network = RoadNetwork.load(args.path)
+    print(json.dumps(network.meta, indent=2))
+    if len(args.points) > 1:
+        points = [tuple(float(x) for x in point.split(",")) for point in args.points]
+        started = time.perf_counter()
+        road = network.matrix(points)
+        print(f"{len(points)}x{len(points)} matrix in {(time.perf_counter() - started) * 1000:.1f} ms")
+        for i in range(len(points)):
+            print("  ".join(f"{m / 1000:7.2f}km/{s / 60:5.1f}min" for m, s in zip(road.metres[i], road.seconds[i])))
+
+
+if __name__ == "__main__":
+    main()
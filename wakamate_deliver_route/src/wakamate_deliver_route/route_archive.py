@@ -0,0 +1,225 @@
+import argparse
+import json
+import logging
+import os
+import shutil
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence, Tuple
+
+from wakamate_deliver_route.distance_oracle import DistanceOracle
+
+if TYPE_CHECKING:
+    from wakamate_deliver_route.wakamate_deliver_route_function import Location
+
+# numpy and msgpack are imported when an archive is written or read:
+# registration must stay light
+
+logger = logging.getLogger(__name__)
+
+# Bump when the on-disk layout changes; load_route() refuses other versions
+FORMAT_VERSION = 1
+
+# Leg matrices are archived up to this many stops (km and hours together
+# take 8 n² bytes: 200 MB at 5000), written this many rows at a time
+MATRIX_MAX_STOPS = 5000
+MATRIX_BLOCK_ROWS = 256
+
+
+def _msgpack():
+    try:
+        import msgpack
+    except ImportError as e:
+        raise ImportError("route archives require the msgpack package: pip install msgpack") from e
+    return msgpack
+
+
+def _plain(value: Any) -> Any:
+    """msgpack fallback for numpy scalars and arrays in solve metadata"""
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    raise TypeError(f"cannot archive {type(value).__name__}")
+
+
+@dataclass
+class RouteArchive:
+    """
+    A solved route on disk: stop coordinates (float64 [n x 2]), the tour
+    (int32), optional leg matrices (float32 [n x n] km and free-flow hours,
+    bool `routed` for road legs) and msgpack metadata. Arrays are memory-mapped
+    when loaded, so processes reading one archive share its pages.
+    """
+    path: str
+    points: Any
+    tour: Any
+    km: Optional[Any]
+    hours: Optional[Any]
+    routed: Optional[Any]
+    meta: Dict[str, Any]
+
+    @property
+    def n(self) -> int:
+        return len(self.points)
+
+    def locations(self) -> List["Location"]:
+        """The archived stops, with their archived district and complexity"""
+        from wakamate_deliver_route.wakamate_deliver_route_function import Location
+
+        locations = []
+        for (lat, lon), stop in zip(self.points.tolist(), self.meta["stops"]):
+            loc = Location(name=stop["name"], address=stop["address"], latitude=lat, longitude=lon,
+                           delivery_notes=stop.get("notes", ""))
+            loc.district, loc.traffic_complexity = stop["district"], stop["complexity"]
+            locations.append(loc)
+        return locations
+
+    def oracle(self) -> Optional[DistanceOracle]:
+        """Leg costs read from the archived matrices; None when none were archived"""
+        if self.km is None:
+            return None
+        return DistanceOracle.from_matrices(self.points, [stop["complexity"] for stop in self.meta["stops"]],
+                                            self.km, self.hours, self.routed,
+                                            source=f"archive:{self.meta['matrix_fingerprint']}")
+
+
+def save_route(path: str, locations: Sequence["Location"], route: Sequence[int], solve: Dict[str, Any],
+               distance: float, oracle: Optional[DistanceOracle] = None,
+               matrices: Optional[bool] = None, network=None) -> str:
+    """
+    Write a solved route to the directory `path` (replacing any archive
+    there). `solve` is the optimizer's last_solve. Leg matrices are written
+    when `matrices` is true (default: up to MATRIX_MAX_STOPS stops) from
+    `oracle`, or from a fresh oracle over the road `network` (None:
+    straight lines) the route was solved on; they are
+    filled block by block straight into the files, so the full matrices are
+    never held in memory.
+    """
+    import numpy as np
+    from numpy.lib.format import open_memmap
+
+    msgpack = _msgpack()
+    n = len(locations)
+    path = os.path.expanduser(path)
+    matrices = n <= MATRIX_MAX_STOPS if matrices is None else matrices
+    started = time.perf_counter()
+
+    tmp = f"{path}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    points = np.array([(loc.latitude, loc.longitude) for loc in locations], dtype=np.float64).reshape(-1, 2)
+    np.save(os.path.join(tmp, "points.npy"), points)
+    np.save(os.path.join(tmp, "tour.npy"), np.asarray(route, dtype=np.int32))
+
+    matrix_source = None
+    if matrices and n:
+        if oracle is None:
+            from wakamate_deliver_route.wakamate_deliver_route_function import _distance_oracle
+
+            oracle = _distance_oracle(list(locations), points.tolist(), network)
+        km = open_memmap(os.path.join(tmp, "km.npy"), mode="w+", dtype=np.float32, shape=(n, n))
+        hours = open_memmap(os.path.join(tmp, "hours.npy"), mode="w+", dtype=np.float32, shape=(n, n))
+        routed = None
+        if oracle.routed_over_roads:
+            routed = open_memmap(os.path.join(tmp, "routed.npy"), mode="w+", dtype=np.bool_, shape=(n, n))
+        for start, km_rows, hour_rows, routed_rows in oracle.blocks(MATRIX_BLOCK_ROWS):
+            stop = start + len(km_rows)
+            km[start:stop] = km_rows
+            hours[start:stop] = hour_rows
+            if routed is not None:
+                routed[start:stop] = routed_rows if routed_rows is not None else False
+        for array in (km, hours, routed):
+            if array is not None:
+                array.flush()
+        del km, hours, routed
+        matrix_source = "road" if oracle.routed_over_roads else "straight_line"
+
+    meta = {
+        "format": FORMAT_VERSION,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "stops": [{"name": loc.name, "address": loc.address, "district": loc.district,
+                   "complexity": loc.traffic_complexity, "notes": loc.delivery_notes} for loc in locations],
+        "distance": float(distance),
+        "solve": solve,
+        "matrices": matrix_source,
+        # Matrices keep the identity of the solve that built them, also when re-optimised
+        "matrix_fingerprint": solve.get("input_fingerprint") if matrix_source else None,
+    }
+    if oracle is not None and oracle.source.startswith("archive:"):
+        meta["matrix_fingerprint"] = oracle.source.split(":", 1)[1]
+    # Written last: a directory without meta.msgpack is an unfinished archive
+    with open(os.path.join(tmp, "meta.msgpack"), "wb") as f:
+        f.write(msgpack.packb(meta, use_bin_type=True, default=_plain))
+
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp, path)
+    logger.info(f"Archived {n}-stop route to {path} in {(time.perf_counter() - started) * 1000:.0f} ms")
+    return path
+
+
+def load_route(path: str, mmap: bool = True) -> RouteArchive:
+    """Open an archive written by save_route(); arrays are memory-mapped read-only unless `mmap` is false"""
+    import numpy as np
+
+    msgpack = _msgpack()
+    path = os.path.expanduser(path)
+    with open(os.path.join(path, "meta.msgpack"), "rb") as f:
+        meta = msgpack.unpackb(f.read(), raw=False)
+    if meta.get("format") != FORMAT_VERSION:
+        raise ValueError(f"{path} has route archive format {meta.get('format')}, expected {FORMAT_VERSION}")
+    mode = "r" if mmap else None
+
+    def array(name: str):
+        file = os.path.join(path, f"{name}.npy")
+        return np.load(file, mmap_mode=mode) if os.path.exists(file) else None
+
+    return RouteArchive(path=path, points=array("points"), tour=array("tour"), km=array("km"),
+                        hours=array("hours"), routed=array("routed"), meta=meta)
+
+
+def reoptimize(archive: RouteArchive, departure=None, seed: Optional[int] = None,
+               optimizer=None) -> Tuple[List[int], float, List[Dict]]:
+    """Solve an archived stop set again (another departure or seed) over its archived leg costs"""
+    from wakamate_deliver_route.wakamate_deliver_route_function import EnhancedRouteOptimizer
+
+    optimizer = optimizer or EnhancedRouteOptimizer()
+    return optimizer.advanced_tsp_optimization(archive.locations(), departure, seed, oracle=archive.oracle())
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Inspect and re-optimise archived delivery routes")
+    commands = parser.add_subparsers(dest="command", required=True)
+    info = commands.add_parser("info", help="Show an archive's metadata")
+    info.add_argument("path")
+    again = commands.add_parser("reoptimize", help="Solve an archived stop set again from its matrices")
+    again.add_argument("path")
+    again.add_argument("--departure", help="HH:MM departure (default: the archived one)")
+    again.add_argument("--seed", type=int, help="Solver seed (default: the archived one)")
+    again.add_argument("--save", help="Archive the new solve here")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    archive = load_route(args.path)
+    solve = archive.meta["solve"]
+    if args.command == "info":
+        print(json.dumps({key: value for key, value in archive.meta.items() if key != "stops"}, indent=2))
+        print(f"{archive.n} stops, matrices: {archive.meta['matrices'] or 'none'}")
+        return
+
+    from datetime import datetime
+
+    from wakamate_deliver_route.wakamate_deliver_route_function import EnhancedRouteOptimizer
+
+    clock = args.departure or solve.get("departure") or "08:00"
+    departure = datetime.combine(datetime.now().date(), datetime.strptime(clock, "%H:%M").time())
+    seed = solve.get("seed") if args.seed is None else args.seed
+    optimizer = EnhancedRouteOptimizer()
+    started = time.perf_counter()
+    route, distance, _ = reoptimize(archive, departure, seed, optimizer)
+    print(f"{archive.n} stops re-optimised in {time.perf_counter() - started:.2f}s: "
+          f"{distance:.1f} (archived {archive.meta['distance']:.1f}), fingerprint {optimizer.last_solve['fingerprint']}")
+    if args.save:
+        save_route(args.save, archive.locations(), route, optimizer.last_solve, distance, archive.oracle())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+from typing import Optional, Sequence, Tuple
+
+from wakamate_deliver_route.distance_oracle import EARTH_RADIUS_KM
+
+# numpy is imported inside the bound: registration must stay light
+
+# Subgradient rounds for the bound, and the pair evaluations (rounds x n²)
+# allowed per request: small manifests get every round, large ones fewer
+BOUND_ROUNDS = 30
+BOUND_MAX_PAIRS = 10_000_000
+
+
+def _spanning_tree(lat, lon, cos_lat, weight, pi) -> Tuple[float, "object"]:
+    """
+    Prim's minimum spanning tree over penalised costs
+    km(i, j) x (w_i + w_j) / 2 + pi_i + pi_j, one vectorised row per added
+    stop, so no n x n matrix is held. Returns (weight, degree per stop).
+    """
+    import numpy as np
+
+    n = len(lat)
+    half_weight = weight / 2
+    in_tree = np.zeros(n, dtype=bool)
+    best = np.full(n, np.inf)
+    parent = np.full(n, -1, dtype=np.int64)
+    degree = np.zeros(n, dtype=np.int64)
+    total = 0.0
+    v = 0
+    for _ in range(n - 1):
+        in_tree[v] = True
+        # Haversine with the cosines precomputed
+        a = np.sin((lat - lat[v]) / 2) ** 2 + cos_lat[v] * cos_lat * np.sin((lon - lon[v]) / 2) ** 2
+        km = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+        row = km * (half_weight[v] + half_weight) + (pi[v] + pi)
+        closer = (row < best) & ~in_tree
+        best[closer] = row[closer]
+        parent[closer] = v
+        v = int(np.argmin(np.where(in_tree, np.inf, best)))
+        total += float(best[v])
+        degree[v] += 1
+        degree[parent[v]] += 1
+    return total, degree
+
+
+def path_lower_bound(points: Sequence[Tuple[float, float]], weights: Sequence[float],
+                     upper_bound: Optional[float] = None, rounds: Optional[int] = None) -> Tuple[float, int]:
+    """
+    Held–Karp style lower bound on the cheapest open path through `points`
+    (any start and end) with leg cost km x (w_i + w_j) / 2. A path is a
+    spanning tree with degrees of at most 2, so for penalties pi >= 0,
+    MST(c + pi_i + pi_j) - 2 sum(pi) never exceeds it; subgradient steps
+    on the degree excess tighten the bound. Road legs are never shorter
+    than the great circle, so the bound holds for road distances too.
+    Returns (bound, rounds used).
+    """
+    import numpy as np
+
+    n = len(points)
+    if n < 2:
+        return 0.0, 0
+    coords = np.radians(np.asarray(points, dtype=np.float64))
+    lat, lon = coords[:, 0], coords[:, 1]
+    cos_lat = np.cos(lat)
+    weight = np.asarray(weights, dtype=np.float64)
+    if rounds is None:
+        rounds = max(1, min(BOUND_ROUNDS, BOUND_MAX_PAIRS // (n * n)))
+
+    pi = np.zeros(n)
+    best = 0.0
+    step_scale = 2.0
+    stalled = 0
+    used = 0
+    for used in range(1, rounds + 1):
+        tree, degree = _spanning_tree(lat, lon, cos_lat, weight, pi)
+        bound = tree - 2 * float(pi.sum())
+        if bound > best:
+            best, stalled = bound, 0
+        else:
+            stalled += 1
+            if stalled >= 3:
+                step_scale, stalled = step_scale / 2, 0
+        excess = degree - 2
+        # Only degrees above 2 violate a path; penalties stay non-negative
+        subgradient = np.where((excess > 0) | (pi > 0), excess, 0)
+        norm = float((subgradient ** 2).sum())
+        if norm == 0 or upper_bound is None or upper_bound <= bound:
+            break  # the tree is a path (optimal), or nothing to steer toward
+        pi = np.maximum(0.0, pi + step_scale * (upper_bound - bound) / norm * subgradient)
+    return max(best, 0.0), used
@@ -0,0 +1,147 @@
+import heapq
+import math
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+EARTH_RADIUS_M = 6371008.8
+
+# Average live points per grid cell; ~2 keeps a k-nearest query to a few cells
+POINTS_PER_CELL = 2.0
+
+
+class SpatialIndex:
+    """
+    Uniform grid over (lat, lon) points with k-nearest queries and deletions.
+    Points are projected equirectangularly around the set's mean latitude,
+    which is exact enough for ranking stops within a city. When deletions
+    leave the grid sparse it is rebuilt with larger cells, so a greedy tour
+    that removes every point stays O(n k) overall.
+    """
+
+    def __init__(self, points: Sequence[Tuple[float, float]], ids: Optional[Iterable[int]] = None):
+        ids = list(range(len(points))) if ids is None else list(ids)
+        if len(ids) != len(points):
+            raise ValueError("ids and points must have the same length")
+        lat0 = sum(lat for lat, _ in points) / len(points) if points else 0.0
+        self._kx = math.radians(1) * EARTH_RADIUS_M * math.cos(math.radians(lat0))
+        self._ky = math.radians(1) * EARTH_RADIUS_M
+        self._xy: Dict[int, Tuple[float, float]] = {
+            point_id: (lon * self._kx, lat * self._ky) for point_id, (lat, lon) in zip(ids, points)
+        }
+        self._build(self._xy.keys())
+
+    def _build(self, live: Iterable[int]):
+        live = list(live)
+        self._live = len(live)
+        self._built_with = len(live)
+        xs = [self._xy[i][0] for i in live] or [0.0]
+        ys = [self._xy[i][1] for i in live] or [0.0]
+        self._x0, self._y0 = min(xs), min(ys)
+        area = max(max(xs) - self._x0, 1.0) * max(max(ys) - self._y0, 1.0)
+        self._cell = max(math.sqrt(area * POINTS_PER_CELL / max(len(live), 1)), 1.0)
+        self._cols = int((max(xs) - self._x0) // self._cell) + 1
+        self._rows = int((max(ys) - self._y0) // self._cell) + 1
+        self._cells: Dict[Tuple[int, int], Dict[int, None]] = {}
+        self._where: Dict[int, Tuple[int, int]] = {}
+        for i in live:
+            cell = self._cell_of(*self._xy[i])
+            self._cells.setdefault(cell, {})[i] = None
+            self._where[i] = cell
+
+    def _cell_of(self, x: float, y: float) -> Tuple[int, int]:
+        return (min(max(int((x - self._x0) // self._cell), 0), self._cols - 1),
+                min(max(int((y - self._y0) // self._cell), 0), self._rows - 1))
+
+    def __len__(self) -> int:
+        return self._live
+
+    def __contains__(self, point_id: int) -> bool:
+        return point_id in self._where
+
+    def remove(self, point_id: int):
+        cell = self._where.pop(point_id, None)
+        if cell is None:
+            return
+        members = self._cells[cell]
+        del members[point_id]
+        if not members:
+            del self._cells[cell]
+        self._live -= 1
+        if 0 < self._live < self._built_with // 4:
+            self._build(self._where.keys())
+
+    def distance(self, a: int, b: int) -> float:
+        """Approximate metres between two indexed (or removed) points"""
+        ax, ay = self._xy[a]
+        bx, by = self._xy[b]
+        return math.hypot(ax - bx, ay - by)
+
+    def nearest(self, lat: float, lon: float, k: int = 1) -> List[Tuple[float, int]]:
+        """Up to k live points closest to (lat, lon) as (metres, id), nearest first"""
+        return self._nearest(lon * self._kx, lat * self._ky, k)
+
+    def nearest_to(self, point_id: int, k: int = 1) -> List[Tuple[float, int]]:
+        """Up to k live points closest to an indexed point, excluding the point itself"""
+        x, y = self._xy[point_id]
+        found = self._nearest(x, y, k + (point_id in self._where))
+        return [(d, i) for d, i in found if i != point_id][:k]
+
+    def _nearest(self, x: float, y: float, k: int) -> List[Tuple[float, int]]:
+        if k <= 0 or not self._live:
+            return []
+        cx, cy = self._cell_of(x, y)
+        # Max-heap of the best k as (-distance, id)
+        best: List[Tuple[float, int]] = []
+        max_ring = max(cx, self._cols - 1 - cx, cy, self._rows - 1 - cy)
+        for ring in range(max_ring + 1):
+            for cell in self._ring(cx, cy, ring):
+                members = self._cells.get(cell)
+                if not members:
+                    continue
+                for i in members:
+                    px, py = self._xy[i]
+                    d = math.hypot(px - x, py - y)
+                    if len(best) < k:
+                        heapq.heappush(best, (-d, i))
+                    elif d < -best[0][0]:
+                        heapq.heapreplace(best, (-d, i))
+            # Cells beyond this ring are at least `ring` cells away
+            if len(best) == k and -best[0][0] <= ring * self._cell:
+                break
+        return sorted((-d, i) for d, i in best)
+
+    def _ring(self, cx: int, cy: int, ring: int):
+        if ring == 0:
+            yield cx, cy
+            return
+        x_lo, x_hi = cx - ring, cx + ring
+        y_lo, y_hi = cy - ring, cy + ring
+        for gx in range(max(x_lo, 0), min(x_hi, self._cols - 1) + 1):
+            if y_lo >= 0:
+                yield gx, y_lo
+            if y_hi < self._rows:
+                yield gx, y_hi
+        for gy in range(max(y_lo + 1, 0), min(y_hi - 1, self._rows - 1) + 1):
+            if x_lo >= 0:
+                yield x_lo, gy
+            if x_hi < self._cols:
+                yield x_hi, gy
+
+
+def candidate_lists(points: Sequence[Tuple[float, float]], k: int = 8) -> List[List[int]]:
+    """The k nearest other points of every point, nearest first (2-opt neighbour lists)"""
+    index = SpatialIndex(points)
+    return [[i for _, i in index.nearest_to(p, k)] for p in range(len(points))]
+
+
+def greedy_tour(points: Sequence[Tuple[float, float]], start: int = 0) -> List[int]:
+    """Nearest-neighbour tour by straight-line distance, in O(n k) grid queries"""
+    if not points:
+        return []
+    index = SpatialIndex(points)
+    tour = [start]
+    index.remove(start)
+    while len(index):
+        _, nearest = index.nearest_to(tour[-1], 1)[0]
+        tour.append(nearest)
+        index.remove(nearest)
+    return tour
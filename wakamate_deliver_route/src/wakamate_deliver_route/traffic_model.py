@@ -0,0 +1,222 @@
+import abc
+import functools
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# numpy is imported where the tensor is built: registration must stay light
+
+BUCKET_MINUTES = 15
+MINUTES_PER_DAY = 24 * 60
+
+# Time spent at each stop (parking, handover), in minutes
+SERVICE_MINUTES = 30
+
+# Travel time / free-flow time across Lagos on a weekday, one value per hour
+CITY_PROFILE = (
+    1.0, 1.0, 1.0, 1.0, 1.0, 1.1,   # 00-05
+    1.4, 2.0, 2.3, 2.1, 1.6, 1.4,   # 06-11 morning rush
+    1.3, 1.3, 1.4, 1.6, 2.2, 2.6,   # 12-17
+    2.8, 2.4, 1.8, 1.4, 1.2, 1.1,   # 18-23 evening rush
+)
+
+# How strongly a stop's area follows the city curve, by Location.traffic_complexity
+COMPLEXITY_INTENSITY = {"low": 0.6, "moderate": 0.85, "high": 1.1, "very_high": 1.4}
+
+# Area-specific overrides: intensity and a floor that holds all day
+DISTRICT_PROFILES: Dict[str, Dict[str, float]] = {
+    "apapa": {"intensity": 1.4, "floor": 1.6},   # port trucks queue around the clock
+    "vi": {"intensity": 1.4, "floor": 1.2},
+    "ikeja": {"intensity": 1.1},
+    "yaba": {"intensity": 1.1},
+    "surulere": {"intensity": 1.1},
+    "ikoyi": {"intensity": 1.1},
+    "lekki": {"intensity": 0.85},
+    "ajah": {"intensity": 0.85},
+}
+
+# Multiplier thresholds for the levels shown to users
+LEVELS = ((1.15, "light"), (1.6, "moderate"), (2.4, "heavy"), (float("inf"), "severe"))
+
+# Budget for one cached tensor (about 400 stops at 15-minute buckets); larger
+# stop sets are costed leg by leg from the distance oracle instead
+MAX_TENSOR_BYTES = 64 * 1024 * 1024
+
+
+def minute_of_day(when: Optional[datetime] = None) -> int:
+    when = when or datetime.now()
+    return when.hour * 60 + when.minute
+
+
+def _interpolate(hourly: Sequence[float], bucket_minutes: int) -> List[float]:
+    """Hourly values (taken at each hour's midpoint) resampled to buckets, wrapping at midnight"""
+    values = []
+    for bucket in range(MINUTES_PER_DAY // bucket_minutes):
+        hour = (bucket * bucket_minutes + bucket_minutes / 2) / 60 - 0.5
+        lower = int(hour // 1) % 24
+        weight = hour - hour // 1
+        values.append(hourly[lower] * (1 - weight) + hourly[(lower + 1) % 24] * weight)
+    return values
+
+
+@functools.lru_cache(maxsize=256)
+def stop_profile(district: str = "", complexity: str = "moderate",
+                 bucket_minutes: int = BUCKET_MINUTES) -> Tuple[float, ...]:
+    """Congestion multiplier per time bucket for one stop's area"""
+    overrides = DISTRICT_PROFILES.get((district or "").lower(), {})
+    intensity = overrides.get("intensity", COMPLEXITY_INTENSITY.get(complexity, 0.85))
+    floor = overrides.get("floor", 1.0)
+    return tuple(max(floor, 1.0 + (value - 1.0) * intensity) for value in _interpolate(CITY_PROFILE, bucket_minutes))
+
+
+def leg_multiplier(origin: Tuple[str, str], destination: Tuple[str, str], minute: float) -> float:
+    """Congestion for one leg leaving at `minute`, from each end's (district, complexity); matches travel_times()"""
+    bucket = int(minute % MINUTES_PER_DAY) // BUCKET_MINUTES
+    return (stop_profile(*origin)[bucket] + stop_profile(*destination)[bucket]) / 2
+
+
+def multiplier_at(minute: int, districts: Sequence[str] = ()) -> float:
+    """Congestion at `minute` of the day, averaged over `districts` (city-wide when empty)"""
+    bucket = (minute % MINUTES_PER_DAY) // BUCKET_MINUTES
+    if not districts:
+        return round(_interpolate(CITY_PROFILE, BUCKET_MINUTES)[bucket], 2)
+    profiles = [stop_profile(district) for district in districts]
+    return round(sum(profile[bucket] for profile in profiles) / len(profiles), 2)
+
+
+def level_for(multiplier: float) -> str:
+    for limit, level in LEVELS:
+        if multiplier < limit:
+            return level
+    return LEVELS[-1][1]
+
+
+def conditions(when: Optional[datetime] = None, districts: Sequence[str] = ()) -> Tuple[str, float]:
+    """(level, multiplier) for a departure time; the one source for every traffic summary"""
+    multiplier = multiplier_at(minute_of_day(when), districts)
+    return level_for(multiplier), multiplier
+
+
+def next_window(minute: int, max_multiplier: float = 1.45, min_minutes: int = 60) -> Optional[Tuple[int, int]]:
+    """
+    Next stretch of at least `min_minutes` with city congestion at or below
+    `max_multiplier`, as (start, end) minutes from midnight. Starts at `minute`
+    when the current time already qualifies; None when no such window exists.
+    """
+    profile = _interpolate(CITY_PROFILE, BUCKET_MINUTES)
+    buckets = len(profile)
+    first = (minute % MINUTES_PER_DAY) // BUCKET_MINUTES
+    step = 0
+    while step < buckets:
+        if profile[(first + step) % buckets] > max_multiplier:
+            step += 1
+            continue
+        run_start = step
+        while step < buckets and profile[(first + step) % buckets] <= max_multiplier:
+            step += 1
+        if (step - run_start) * BUCKET_MINUTES >= min_minutes:
+            begin = minute if run_start == 0 else (first + run_start) * BUCKET_MINUTES
+            return begin % MINUTES_PER_DAY, ((first + step) * BUCKET_MINUTES) % MINUTES_PER_DAY
+    return None
+
+
+class LegTimes(abc.ABC):
+    """Tour timing on top of a leg(i, j, minute) lookup"""
+
+    @abc.abstractmethod
+    def leg(self, i: int, j: int, minute: float) -> float:
+        """Driving hours of leg i -> j departing at `minute`"""
+
+    def schedule(self, route: Sequence[int], start_minute: float,
+                 service_minutes: float = SERVICE_MINUTES) -> List[Tuple[float, float]]:
+        """(departure minute, leg hours) for each leg, serving every stop after the first"""
+        legs = []
+        clock = start_minute
+        for a, b in zip(route, route[1:]):
+            hours = self.leg(a, b, clock)
+            legs.append((clock, hours))
+            clock += hours * 60 + service_minutes
+        return legs
+
+    def tour_hours(self, route: Sequence[int], start_minute: float,
+                   service_minutes: float = SERVICE_MINUTES) -> float:
+        """Driving hours for `route` leaving at `start_minute`"""
+        return sum(hours for _, hours in self.schedule(route, start_minute, service_minutes))
+
+
+@dataclass
+class TravelTimes(LegTimes):
+    """
+    Time-dependent leg times for one stop set: `hours[bucket, i, j]` is the
+    travel time from stop i to stop j when leaving during that bucket.
+    """
+    hours: Any  # float32 numpy array [bucket x n x n]
+    bucket_minutes: int
+
+    def leg(self, i: int, j: int, minute: float) -> float:
+        return float(self.hours[int(minute % MINUTES_PER_DAY) // self.bucket_minutes, i, j])
+
+
+@dataclass
+class LazyTravelTimes(LegTimes):
+    """
+    The same leg times as TravelTimes without the tensor: free-flow hours come
+    from a callable (a DistanceOracle) and are scaled by the per-stop profiles
+    at lookup, so memory is O(buckets x n).
+    """
+    free_flow_hours: Callable[[int, int], float]
+    profiles: Sequence[Tuple[float, ...]]  # per stop, per bucket
+    bucket_minutes: int
+
+    def leg(self, i: int, j: int, minute: float) -> float:
+        bucket = int(minute % MINUTES_PER_DAY) // self.bucket_minutes
+        return self.free_flow_hours(i, j) * (self.profiles[i][bucket] + self.profiles[j][bucket]) / 2
+
+
+_cache: "OrderedDict[Hashable, TravelTimes]" = OrderedDict()
+_cache_lock = threading.Lock()
+_CACHE_SIZE = 32
+# Cached tensors together stay within this many bytes
+_CACHE_BYTES = 2 * MAX_TENSOR_BYTES
+
+
+def travel_times(key: Hashable, oracle, stops: Sequence[Tuple[str, str]]) -> LegTimes:
+    """
+    Leg times for a stop set. `oracle` supplies free-flow hours (a
+    DistanceOracle: free_flow_matrix() and free_flow_hours(i, j)); `stops`
+    gives each stop's (district, complexity) and `key` must identify both. A
+    leg's congestion is the mean of its two ends. Stop sets whose tensor fits
+    MAX_TENSOR_BYTES get a cached [bucket x n x n] tensor; larger ones get
+    LazyTravelTimes.
+    """
+    profiles = [stop_profile(district, complexity) for district, complexity in stops]
+    n = len(profiles)
+    if (MINUTES_PER_DAY // BUCKET_MINUTES) * n * n * 4 > MAX_TENSOR_BYTES:
+        return LazyTravelTimes(free_flow_hours=oracle.free_flow_hours, profiles=profiles,
+                               bucket_minutes=BUCKET_MINUTES)
+
+    with _cache_lock:
+        cached = _cache.get(key)
+        if cached is not None:
+            _cache.move_to_end(key)
+            return cached
+
+    import numpy as np
+
+    free = np.asarray(oracle.free_flow_matrix(), dtype=np.float32)
+    per_bucket = np.array(profiles, dtype=np.float32).reshape(n, -1).T  # [bucket x n]
+    hours = (per_bucket[:, :, None] + per_bucket[:, None, :]) * 0.5 * free[None, :, :]
+    result = TravelTimes(hours=hours, bucket_minutes=BUCKET_MINUTES)
+
+    with _cache_lock:
+        _cache[key] = result
+        _cache.move_to_end(key)
+        while len(_cache) > 1 and (len(_cache) > _CACHE_SIZE or
+                                   sum(entry.hours.nbytes for entry in _cache.values()) > _CACHE_BYTES):
+            _cache.popitem(last=False)
+    return result
@@ -1,6 +1,7 @@
 import { Sparkles, Truck, Package, TrendingUp, CheckCircle, MessageSquare, Loader2, AlertCircle, RefreshCw } from 'lucide-react';
 import { useState, useEffect } from 'react';
 import { useNavigate } from 'react-router-dom';
+import { getChatSessionId } from '../api/chatSession';
 
 export default function AIDashboard() {
   // Simulate user data (in a real app, you'd get this from localStorage or an API)
@@ -66,7 +67,8 @@ export default function AIDashboard() {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
-          'Accept': 'application/json'
+          'Accept': 'application/json',
+          'X-Session-Id': getChatSessionId()
         },
         body: JSON.stringify({
           messages: [{ role: 'user', content: message }]
@@ -105,7 +107,8 @@ export default function AIDashboard() {
           method: 'POST',
           headers: {
             'Content-Type': 'application/json',
-            'Accept': 'application/json'
+            'Accept': 'application/json',
+            'X-Session-Id': getChatSessionId()
           },
           body: JSON.stringify({ input_message: message })
         });
@@ -1,5 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import { Send, MapPin, Banknote, CheckCircle, Plus, Calendar, Trash2, Phone, Navigation, MessageSquare, Route, TrendingUp, Zap, Clock, AlertCircle, RefreshCw } from 'lucide-react';
+import { getChatSessionId } from '../api/chatSession';
 
 export default function DeliveryAss() {
   const [showAddForm, setShowAddForm] = useState(false);
@@ -211,7 +212,8 @@ export default function DeliveryAss() {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
-          'Accept': 'application/json'
+          'Accept': 'application/json',
+          'X-Session-Id': getChatSessionId()
         },
         body: JSON.stringify({
           messages: [{ role: 'user', content: message }]
@@ -253,7 +255,8 @@ export default function DeliveryAss() {
           method: 'POST',
           headers: {
             'Content-Type': 'application/json',
-            'Accept': 'application/json'
+            'Accept': 'application/json',
+            'X-Session-Id': getChatSessionId()
           },
           body: JSON.stringify({ input_message: message })
         });
@@ -1,4 +1,5 @@
 import React, { useState, useEffect, useRef } from 'react';
+import { getChatSessionId } from '../api/chatSession';
 import { 
   Send, 
   Bot, 
@@ -94,7 +95,8 @@ export default function CaptionChatbot() {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
-          'Accept': 'application/json'
+          'Accept': 'application/json',
+          'X-Session-Id': getChatSessionId()
         },
         body: JSON.stringify({
           messages: [{ role: 'user', content: message }]
@@ -133,7 +135,8 @@ export default function CaptionChatbot() {
           method: 'POST',
           headers: {
             'Content-Type': 'application/json',
-            'Accept': 'application/json'
+            'Accept': 'application/json',
+            'X-Session-Id': getChatSessionId()
           },
           body: JSON.stringify({ input_message: message })
         });
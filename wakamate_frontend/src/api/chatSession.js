@@ -0,0 +1,27 @@
+// src/api/chatSession.js
+// Random per-browser id the agents use to keep conversation history when no auth token is sent.
+const STORAGE_KEY = 'wakamateChatSessionId';
+
+const randomId = () => {
+  if (window.crypto?.randomUUID) {
+    return window.crypto.randomUUID();
+  }
+  const bytes = new Uint8Array(16);
+  window.crypto.getRandomValues(bytes);
+  return Array.from(bytes, (b) => b.toString(16).padStart(2, '0')).join('');
+};
+
+export const getChatSessionId = () => {
+  try {
+    let id = localStorage.getItem(STORAGE_KEY);
+    if (!id) {
+      id = randomId();
+      localStorage.setItem(STORAGE_KEY, id);
+    }
+    return id;
+  } catch (e) {
+    // Storage disabled: keep one id for this page load
+    window.__wakamateChatSessionId ??= randomId();
+    return window.__wakamateChatSessionId;
+  }
+};
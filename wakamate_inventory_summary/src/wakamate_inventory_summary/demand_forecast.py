@@ -0,0 +1,323 @@
+import logging
+import math
+import threading
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Average demand interval above which a product is treated as intermittent
+# and forecast with Croston's method instead of plain exponential smoothing
+INTERMITTENT_ADI = 1.32
+
+# Per-product arrays carried through each state transition
+STATE_FIELDS = ("level", "variance", "size", "interval", "since", "demand_days", "total_days", "last_day")
+
+
+@dataclass
+class DemandForecast:
+    """Forecast and reorder policy for a single product"""
+    product_id: str
+    daily_demand: float
+    demand_std: float
+    reorder_point: float
+    order_up_to: float
+    method: str
+    history_days: int
+
+
+def product_key(product: Dict[str, Any]) -> str:
+    """Stable identifier for a backend product record"""
+    return str(product.get("_id") or product.get("name", ""))
+
+
+def _sale_day(value: Any) -> Optional[int]:
+    """Convert a sale date (ISO string, datetime or date) to a day ordinal"""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.date().toordinal()
+    if isinstance(value, date):
+        return value.toordinal()
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00")).date().toordinal()
+    except ValueError:
+        return None
+
+
+class DemandForecaster:
+    """
+    Incremental demand forecaster built from each product's dated `sales` array.
+
+    Daily demand is tracked with exponential smoothing (level and error variance)
+    and Croston's method (demand size and inter-demand interval) side by side.
+    State lives in flat NumPy arrays indexed by product, so the first snapshot is
+    fitted in one vectorised pass and every later sale is folded in O(1).
+    """
+
+    def __init__(self,
+                 alpha: float = 0.2,
+                 lead_time_days: int = 7,
+                 review_days: int = 14,
+                 service_level_z: float = 1.65,
+                 history_days: int = 365):
+        self.alpha = alpha
+        self.lead_time_days = lead_time_days
+        self.review_days = review_days
+        self.service_level_z = service_level_z
+        self.history_days = history_days
+
+        self._index: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._allocate(0)
+
+    def _allocate(self, capacity: int):
+        self.level = np.zeros(capacity)
+        self.variance = np.zeros(capacity)
+        self.size = np.zeros(capacity)
+        self.interval = np.zeros(capacity)
+        self.since = np.zeros(capacity)
+        self.demand_days = np.zeros(capacity, dtype=np.int64)
+        self.total_days = np.zeros(capacity, dtype=np.int64)
+        self.last_day = np.full(capacity, -1, dtype=np.int64)
+        self.open_day = np.full(capacity, -1, dtype=np.int64)
+        self.open_qty = np.zeros(capacity)
+        self.seen = np.zeros(capacity, dtype=np.int64)
+
+    def _grow(self, needed: int):
+        capacity = len(self.level)
+        if needed <= capacity:
+            return
+        new_capacity = max(needed, capacity * 2, 16)
+        for name in ("level", "variance", "size", "interval", "since", "demand_days",
+                     "total_days", "last_day", "open_day", "open_qty", "seen"):
+            old = getattr(self, name)
+            fill = -1 if name in ("last_day", "open_day") else 0
+            grown = np.full(new_capacity, fill, dtype=old.dtype)
+            grown[:capacity] = old
+            setattr(self, name, grown)
+
+    def _slot(self, product_id: str) -> int:
+        slot = self._index.get(product_id)
+        if slot is None:
+            slot = len(self._index)
+            self._grow(slot + 1)
+            self._index[product_id] = slot
+        return slot
+
+    def _snapshot(self, slots: np.ndarray) -> Dict[str, np.ndarray]:
+        return {name: getattr(self, name)[slots].copy() for name in STATE_FIELDS}
+
+    def _reset(self, slots: np.ndarray):
+        for name in ("level", "variance", "size", "interval", "since", "open_qty"):
+            getattr(self, name)[slots] = 0
+        for name in ("demand_days", "total_days", "seen"):
+            getattr(self, name)[slots] = 0
+        self.last_day[slots] = -1
+        self.open_day[slots] = -1
+
+    # ------------------------------------------------------------------
+    # Core state transitions (vectorised over any set of product slots)
+    # ------------------------------------------------------------------
+
+    def _advance(self, slots: np.ndarray, day: np.ndarray, qty: np.ndarray,
+                 state: Optional[Dict[str, np.ndarray]] = None) -> Dict[str, np.ndarray]:
+        """
+        Close `day` with demand `qty` for each slot, first decaying over any
+        zero-demand days since the slot's last closed day. Zero runs use the
+        closed-form geometric decay so the cost is O(1) per slot regardless of gap.
+        """
+        a = self.alpha
+        s = state if state is not None else self._snapshot(slots)
+        level, variance = s["level"], s["variance"]
+
+        started = s["last_day"] >= 0
+        gap = np.where(started, day - s["last_day"] - 1, 0).clip(min=0)
+        decay = (1 - a) ** gap
+        # Each zero day contributes a squared error of the current level
+        variance = decay * variance + np.where(
+            gap > 0, level ** 2 * (1 - a) ** np.maximum(gap - 1, 0) * (1 - decay), 0.0)
+        level = level * decay
+
+        err = qty - level
+        variance = (1 - a) * variance + a * err ** 2
+        level = level + a * err
+
+        since = s["since"] + gap + 1
+        has_demand = qty > 0
+        first = has_demand & (s["demand_days"] == 0)
+        size = np.where(first, qty, np.where(has_demand, s["size"] + a * (qty - s["size"]), s["size"]))
+        interval = np.where(first, since,
+                            np.where(has_demand, s["interval"] + a * (since - s["interval"]), s["interval"]))
+
+        return {
+            "level": level, "variance": variance, "size": size, "interval": interval,
+            "since": np.where(has_demand, 0.0, since),
+            "demand_days": s["demand_days"] + has_demand,
+            "total_days": s["total_days"] + gap + 1,
+            "last_day": day.astype(np.int64),
+        }
+
+    def _store(self, slots: np.ndarray, state: Dict[str, np.ndarray]):
+        for name, values in state.items():
+            getattr(self, name)[slots] = values
+
+    # ------------------------------------------------------------------
+    # Ingestion
+    # ------------------------------------------------------------------
+
+    def fit(self, products: List[Dict[str, Any]], today: Optional[date] = None):
+        """Fit state for a batch of products from their full sales history"""
+        if not products:
+            return
+        today_ord = (today or date.today()).toordinal()
+        window_start = today_ord - self.history_days
+
+        slots = np.array([self._slot(product_key(p)) for p in products], dtype=np.int64)
+        self._reset(slots)
+
+        rows, days, qtys = [], [], []
+        for row, product in enumerate(products):
+            sales = product.get("sales") or []
+            self.seen[slots[row]] = len(sales)
+            for sale in sales:
+                day = _sale_day(sale.get("date"))
+                if day is None or day < window_start:
+                    continue
+                rows.append(row)
+                days.append(min(day, today_ord))
+                qtys.append(float(sale.get("quantity", 0) or 0))
+
+        if not rows:
+            return
+
+        rows = np.asarray(rows, dtype=np.int64)
+        days = np.asarray(days, dtype=np.int64)
+        qtys = np.asarray(qtys)
+
+        # Today's sales stay in the open bucket; earlier days form the series
+        today_mask = days == today_ord
+        np.add.at(self.open_qty, slots[rows[today_mask]], qtys[today_mask])
+        self.open_day[slots[np.unique(rows[today_mask])]] = today_ord
+
+        hist = ~today_mask
+        if not hist.any():
+            return
+        first_day = np.full(len(products), today_ord, dtype=np.int64)
+        np.minimum.at(first_day, rows[hist], days[hist])
+        start = int(first_day.min())
+        series = np.zeros((len(products), today_ord - start))
+        np.add.at(series, (rows[hist], days[hist] - start), qtys[hist])
+
+        active_rows = np.flatnonzero(first_day < today_ord)
+        active_slots = slots[active_rows]
+        state = self._snapshot(active_slots)
+        for offset in range(series.shape[1]):
+            day_ord = start + offset
+            live = first_day[active_rows] <= day_ord
+            stepped = self._advance(active_slots, np.full(len(active_slots), day_ord),
+                                    series[active_rows, offset], state)
+            state = {k: np.where(live, stepped[k], state[k]) for k in state}
+        self._store(active_slots, state)
+
+    def observe(self, product_id: str, quantity: float, when: Any = None):
+        """Fold a single new sale into the product's state in O(1)"""
+        day = _sale_day(when) if when is not None else date.today().toordinal()
+        if day is None:
+            return
+        slot = self._slot(product_id)
+        open_day = self.open_day[slot]
+
+        if open_day < 0:
+            self.open_day[slot] = max(day, self.last_day[slot] + 1)
+            self.open_qty[slot] = quantity
+        elif day <= open_day:
+            # Late or same-day sales are folded into the open day
+            self.open_qty[slot] += quantity
+        else:
+            slots = np.array([slot])
+            self._store(slots, self._advance(slots, np.array([open_day]), np.array([self.open_qty[slot]])))
+            self.open_day[slot] = day
+            self.open_qty[slot] = quantity
+
+    def sync(self, products: List[Dict[str, Any]], today: Optional[date] = None):
+        """
+        Bring state up to date with a backend product snapshot. Unknown products
+        are fitted in one batch; known products only consume sales appended since
+        the previous snapshot.
+        """
+        with self._lock:
+            to_fit = []
+            for product in products:
+                product_id = product_key(product)
+                sales = product.get("sales") or []
+                slot = self._index.get(product_id)
+                if slot is None or len(sales) < self.seen[slot]:
+                    to_fit.append(product)
+                    continue
+                for sale in sales[self.seen[slot]:]:
+                    self.observe(product_id, float(sale.get("quantity", 0) or 0), sale.get("date"))
+                self.seen[slot] = len(sales)
+
+            if to_fit:
+                logger.debug(f"Fitting demand history for {len(to_fit)} products")
+                self.fit(to_fit, today)
+
+    # ------------------------------------------------------------------
+    # Forecasting
+    # ------------------------------------------------------------------
+
+    def forecast(self, product_ids: List[str], today: Optional[date] = None) -> Dict[str, DemandForecast]:
+        """Forecast daily demand and reorder points for products as of `today`"""
+        today_ord = (today or date.today()).toordinal()
+        with self._lock:
+            known = [pid for pid in product_ids if pid in self._index]
+            if not known:
+                return {}
+            slots = np.array([self._index[pid] for pid in known], dtype=np.int64)
+            state = self._snapshot(slots)
+            open_day = self.open_day[slots].copy()
+            open_qty = self.open_qty[slots].copy()
+
+        # Close any open bucket from a previous day, then decay to yesterday
+        closable = (open_day >= 0) & (open_day < today_ord)
+        if closable.any():
+            closed = self._advance(slots, open_day, open_qty, state)
+            state = {k: np.where(closable, closed[k], state[k]) for k in state}
+        pending = (state["last_day"] >= 0) & (state["last_day"] < today_ord - 1)
+        if pending.any():
+            decayed = self._advance(slots, np.full(len(slots), today_ord - 1), np.zeros(len(slots)), state)
+            state = {k: np.where(pending, decayed[k], state[k]) for k in state}
+
+        demand_days = state["demand_days"]
+        total_days = state["total_days"]
+        adi = np.where(demand_days > 0, total_days / np.maximum(demand_days, 1), np.inf)
+        intermittent = adi > INTERMITTENT_ADI
+        # Syntetos-Boylan correction removes Croston's positive bias
+        croston = np.where(state["interval"] > 0,
+                           (1 - self.alpha / 2) * state["size"] / np.maximum(state["interval"], 1e-9), 0.0)
+        rate = np.where(intermittent, croston, state["level"])
+        std = np.sqrt(state["variance"])
+
+        lead = self.lead_time_days
+        horizon = self.lead_time_days + self.review_days
+        reorder_point = rate * lead + self.service_level_z * std * math.sqrt(lead)
+        order_up_to = rate * horizon + self.service_level_z * std * math.sqrt(horizon)
+
+        results = {}
+        for i, pid in enumerate(known):
+            if total_days[i] == 0:
+                continue
+            results[pid] = DemandForecast(
+                product_id=pid,
+                daily_demand=float(rate[i]),
+                demand_std=float(std[i]),
+                reorder_point=float(reorder_point[i]),
+                order_up_to=float(order_up_to[i]),
+                method="croston" if intermittent[i] else "ewma",
+                history_days=int(total_days[i]),
+            )
+        return results